@@ -0,0 +1,136 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Measure the message throughput and latency of the ESI runtime API
+(`WritePort`, `ReadPort`, and `ReadWritePort`) for int, struct, and void
+messages.
+
+The ports run against the in-process `Loopback` backend rather than a
+simulation so the numbers reflect the host side cost of the API: type checking,
+dispatch, and queueing. Messages are written in batches then read back, so the
+latency of a message includes the time it waits behind the rest of its batch:
+
+  python esi_runtime.py --batches 1 16 256 --messages 100000
+"""
+
+import argparse
+import json
+import time
+
+MODES = ["write", "read", "roundtrip"]
+
+
+def message_types():
+  from pycde.esi_runtime_common import IntType, StructType, VoidType
+
+  i32 = IntType(32, False)
+  return {
+      "int": (i32, lambda i: i % 2**32),
+      "struct": (StructType([("a", i32), ("b", IntType(16, False)),
+                             ("c", IntType(1, False))]), lambda i: {
+                                 "a": i % 2**32,
+                                 "b": i % 2**16,
+                                 "c": i % 2
+                             }),
+      "void": (VoidType(), lambda i: None),
+  }
+
+
+def percentile(sorted_values, pct: float) -> float:
+  if len(sorted_values) == 0:
+    return float("nan")
+  idx = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+  return sorted_values[idx]
+
+
+def measure(mode: str, type_name: str, batch: int, num_msgs: int) -> dict:
+  from pycde.esi_runtime_common import (Loopback, ReadPort, ReadWritePort,
+                                        WritePort)
+
+  esi_type, make_msg = message_types()[type_name]
+  backend = Loopback()
+  if mode == "write":
+    port = WritePort(["bench"], backend, "cosim", write_type=esi_type)
+  elif mode == "read":
+    port = ReadPort(["bench"], backend, "cosim", read_type=esi_type)
+  else:
+    port = ReadWritePort(["bench"],
+                         backend,
+                         "cosim",
+                         read_type=esi_type,
+                         write_type=esi_type)
+  msgs = [make_msg(i) for i in range(batch)]
+  num_batches = max(num_msgs // batch, 1)
+
+  latencies = []
+  perf_counter = time.perf_counter
+  start = perf_counter()
+  for _ in range(num_batches):
+    if mode == "read":
+      for msg in msgs:
+        backend.inject(port, msg)
+    sent = []
+    if mode != "read":
+      for msg in msgs:
+        sent.append(perf_counter())
+        port.write(msg)
+    else:
+      sent = [perf_counter()] * batch
+    if mode != "write":
+      for sent_time in sent:
+        if port.read(None) is None:
+          raise RuntimeError("Message lost")
+        latencies.append(perf_counter() - sent_time)
+    else:
+      done = perf_counter()
+      latencies.extend(done - t for t in sent)
+  elapsed = perf_counter() - start
+
+  latencies.sort()
+  total = num_batches * batch
+  return {
+      "mode": mode,
+      "type": type_name,
+      "batch": batch,
+      "messages": total,
+      "seconds": elapsed,
+      "msgs_per_sec": total / elapsed if elapsed > 0 else float("inf"),
+      "p50_us": percentile(latencies, 50) * 1e6,
+      "p99_us": percentile(latencies, 99) * 1e6,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+  parser.add_argument("--types",
+                      nargs="+",
+                      choices=list(message_types().keys()),
+                      default=list(message_types().keys()))
+  parser.add_argument("--batches", type=int, nargs="+", default=[1, 16, 256])
+  parser.add_argument("--messages",
+                      type=int,
+                      default=100000,
+                      help="Messages per measurement.")
+  parser.add_argument("--output", help="Write the results to this JSON file.")
+  args = parser.parse_args()
+
+  results = []
+  print(f"{'mode':<10} {'type':<7} {'batch':>6} {'msgs/s':>12} "
+        f"{'p50 us':>9} {'p99 us':>9}")
+  for mode in args.modes:
+    for type_name in args.types:
+      for batch in args.batches:
+        r = measure(mode, type_name, batch, args.messages)
+        results.append(r)
+        print(f"{mode:<10} {type_name:<7} {batch:>6} "
+              f"{r['msgs_per_sec']:>12.0f} {r['p50_us']:>9.2f} "
+              f"{r['p99_us']:>9.2f}")
+
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+  main()
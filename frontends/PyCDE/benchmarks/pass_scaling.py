@@ -0,0 +1,143 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Measure how the lowering pass pipeline scales with the number of cores on a
+design with many distinct modules.
+
+Each measurement runs in its own process whose CPU affinity is limited to the
+given number of cores before PyCDE is imported. (MLIR sizes its thread pool
+from the cores available to the process.) Linux only, since it relies on
+`os.sched_setaffinity`.
+
+  python pass_scaling.py --modules 256 --depth 64 --cores 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def build_design(num_modules: int, depth: int, width: int):
+  from pycde import Input, Output, Module, generator, modparams, types
+
+  @modparams
+  def Mixer(seed: int):
+
+    class Mixer(Module):
+      a = Input(types.int(width))
+      b = Input(types.int(width))
+      y = Output(types.int(width))
+
+      @generator
+      def build(ports):
+        v = ports.a
+        for i in range(depth):
+          v = v ^ types.int(width)((seed * depth + i) % (2**width))
+          v = (v.as_uint() + ports.b.as_uint()).as_bits(width)
+          v = v & (ports.b | types.int(width)(i % (2**width)))
+        ports.y = v
+
+    return Mixer
+
+  class Top(Module):
+    a = Input(types.int(width))
+    b = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      v = ports.a
+      for seed in range(num_modules):
+        v = Mixer(seed)(a=v, b=ports.b).y
+      ports.y = v
+
+  return Top
+
+
+def measure(args) -> dict:
+  """Build and compile the design in this process and return the timings."""
+  from pycde import System
+
+  top = build_design(args.modules, args.depth, args.width)
+  with tempfile.TemporaryDirectory() as out_dir:
+    s = System([top],
+               name="PassScaling",
+               output_directory=out_dir,
+               multithreading=args.cores != 1)
+    start = time.perf_counter()
+    s.generate()
+    generate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    s.run_passes()
+    passes_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    s.emit_outputs()
+    emit_time = time.perf_counter() - start
+
+  return {
+      "cores": args.cores,
+      "generate": generate_time,
+      "passes": passes_time,
+      "emit": emit_time
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--modules", type=int, default=128)
+  parser.add_argument("--depth", type=int, default=64)
+  parser.add_argument("--width", type=int, default=32)
+  parser.add_argument("--cores",
+                      type=int,
+                      nargs="+",
+                      default=[1, 2, 4, 8],
+                      help="Core counts to measure.")
+  parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.worker:
+    # Restrict the cores before MLIR creates its thread pool.
+    args.cores = args.cores[0]
+    # The cores we may use aren't necessarily numbered from 0.
+    allowed = sorted(os.sched_getaffinity(0))
+    if args.cores > len(allowed):
+      parser.error(f"--cores {args.cores} requested but only {len(allowed)} "
+                   "cores are available")
+    os.sched_setaffinity(0, allowed[:args.cores])
+    print(json.dumps(measure(args)))
+    return
+
+  available = len(os.sched_getaffinity(0))
+  results = []
+  for cores in args.cores:
+    if cores > available:
+      sys.stderr.write(f"Skipping {cores} cores: only {available} available\n")
+      continue
+    out = subprocess.run([
+        sys.executable, __file__, "--worker", "--modules",
+        str(args.modules), "--depth",
+        str(args.depth), "--width",
+        str(args.width), "--cores",
+        str(cores)
+    ],
+                         check=True,
+                         capture_output=True,
+                         text=True)
+    results.append(json.loads(out.stdout.strip().split("\n")[-1]))
+
+  base = results[0]["passes"] if len(results) > 0 else 0
+  print(f"{'cores':>5}  {'generate':>9}  {'passes':>9}  {'emit':>9}  "
+        f"{'speedup':>7}")
+  for r in results:
+    print(f"{r['cores']:>5}  {r['generate']:>9.3f}  {r['passes']:>9.3f}  "
+          f"{r['emit']:>9.3f}  {base / r['passes']:>7.2f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,236 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Time the placement database operations on a synthetic device grid and an
+instance hierarchy of 'clusters' x 'leaves' leaf instances, each containing a
+register.
+
+The operations measured are: building the primitive grid (`PrimitiveDB`),
+creating the placement DB, walking and indexing the instance hierarchy,
+placing every leaf (`Instance.place`) and register (`RegInstance.place`),
+location queries (`get_instance_at`), walking the placements (all and
+bounded), and exporting the TCL. Each size runs in its own process. To see how
+the operations scale:
+
+  python placement_db.py --leaves 100 --clusters 10 100 1000
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REG_WIDTH = 4
+
+
+def build_design(num_clusters: int, num_leaves: int):
+  from pycde import AppID, Clock, Input, Output, Module, generator, types
+
+  class Leaf(Module):
+    clk = Clock()
+    x = Input(types.int(REG_WIDTH))
+    y = Output(types.int(REG_WIDTH))
+
+    @generator
+    def build(ports):
+      ports.y = ports.x.reg(ports.clk, appid=AppID("reg", 0))
+
+  class Cluster(Module):
+    clk = Clock()
+    x = Input(types.int(REG_WIDTH))
+    y = Output(types.int(REG_WIDTH))
+
+    @generator
+    def build(ports):
+      v = ports.x
+      for i in range(num_leaves):
+        v = Leaf(clk=ports.clk, x=v, instance_name=f"leaf{i}").y
+      ports.y = v
+
+  class Top(Module):
+    clk = Clock()
+    x = Input(types.int(REG_WIDTH))
+    y = Output(types.int(REG_WIDTH))
+
+    @generator
+    def build(ports):
+      v = ports.x
+      for i in range(num_clusters):
+        v = Cluster(clk=ports.clk, x=v, instance_name=f"cluster{i}").y
+      ports.y = v
+
+  return Top
+
+
+class Timer:
+  """Accumulates named timings."""
+
+  def __init__(self):
+    self.times = {}
+
+  @contextlib.contextmanager
+  def __call__(self, name):
+    start = time.perf_counter()
+    yield
+    self.times[name] = time.perf_counter() - start
+
+
+def measure(num_clusters: int, num_leaves: int, num_queries: int) -> dict:
+  from pycde import System
+  from pycde.devicedb import PhysLocation, PrimitiveDB, PrimitiveType
+  from pycde.instance import RegInstance
+
+  num_insts = num_clusters * num_leaves
+  # A square grid with enough M20Ks for every leaf and FFs for every register
+  # bit.
+  side = math.ceil(math.sqrt(num_insts))
+  timer = Timer()
+  rand = random.Random(0)
+
+  with tempfile.TemporaryDirectory() as out_dir:
+    s = System([build_design(num_clusters, num_leaves)],
+               name="PlacementBench",
+               output_directory=out_dir)
+    with timer("generate"):
+      s.generate()
+
+    with timer("primitive_db"):
+      primdb = PrimitiveDB()
+      for x in range(side):
+        for y in range(side):
+          primdb.add_coords(PrimitiveType.M20K, x, y, 0)
+          for num in range(REG_WIDTH):
+            primdb.add_coords(PrimitiveType.FF, x, y, num)
+    with timer("create_db"):
+      s.createdb(primdb)
+
+    top = s.get_instance(s.top_modules[0])
+    with timer("walk_hierarchy"):
+      leaves = []
+      regs = []
+
+      def collect(inst):
+        if isinstance(inst, RegInstance):
+          regs.append(inst)
+        elif inst.name.startswith("leaf"):
+          leaves.append(inst)
+
+      top.walk(collect)
+    assert len(leaves) == num_insts, f"{len(leaves)} != {num_insts}"
+
+    with timer("lookup_by_name"):
+      for _ in range(num_queries):
+        c = rand.randrange(num_clusters)
+        l = rand.randrange(num_leaves)
+        top[f"cluster{c}"][f"leaf{l}"]
+
+    with timer("place_instances"):
+      for idx, leaf in enumerate(leaves):
+        leaf.place(PrimitiveType.M20K, idx % side, idx // side, 0)
+    with timer("place_registers"):
+      for idx, reg in enumerate(regs):
+        reg.place([(idx % side, idx // side, n) for n in range(REG_WIDTH)])
+
+    placedb = s.placedb
+    with timer("get_instance_at"):
+      hits = 0
+      for _ in range(num_queries):
+        idx = rand.randrange(side * side)
+        loc = PhysLocation(PrimitiveType.M20K, idx % side, idx // side, 0)
+        if placedb.get_instance_at(loc) is not None:
+          hits += 1
+
+    count = [0]
+
+    def count_placement(*args):
+      count[0] += 1
+
+    with timer("walk_placements"):
+      placedb._db.walk_placements(count_placement)
+    num_placements = count[0]
+    count[0] = 0
+    quarter = max(side // 2 - 1, 0)
+    with timer("walk_placements_bounded"):
+      placedb._db.walk_placements(count_placement, (0, quarter, 0, quarter))
+
+    with timer("run_passes"):
+      s.run_passes()
+    tcl_phases = [t for phase, t in s.phase_times if "export-tcl" in phase]
+    timer.times["export_tcl"] = sum(tcl_phases)
+    with timer("emit"):
+      s.emit_outputs()
+
+  return {
+      "clusters": num_clusters,
+      "leaves": num_leaves,
+      "instances": num_insts,
+      "placements": num_placements,
+      "queries": num_queries,
+      "query_hits": hits,
+      "times": timer.times,
+      "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--clusters",
+                      type=int,
+                      nargs="+",
+                      default=[10, 100, 1000],
+                      help="Numbers of clusters to measure.")
+  parser.add_argument("--leaves",
+                      type=int,
+                      default=100,
+                      help="Leaf instances per cluster.")
+  parser.add_argument("--queries",
+                      type=int,
+                      default=10000,
+                      help="Number of lookups and location queries.")
+  parser.add_argument("--output", help="Write the results to this JSON file.")
+  parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.worker:
+    print(json.dumps(measure(args.clusters[0], args.leaves, args.queries)))
+    return
+
+  results = []
+  for clusters in args.clusters:
+    out = subprocess.run([
+        sys.executable, __file__, "--worker", "--clusters",
+        str(clusters), "--leaves",
+        str(args.leaves), "--queries",
+        str(args.queries)
+    ],
+                         check=True,
+                         capture_output=True,
+                         text=True)
+    results.append(json.loads(out.stdout.strip().split("\n")[-1]))
+
+  ops = list(results[0]["times"].keys()) if len(results) > 0 else []
+  print(f"{'operation':<24}" +
+        "".join(f"{r['instances']:>12}" for r in results))
+  for op in ops:
+    print(f"{op:<24}" + "".join(f"{r['times'][op]:>12.4f}" for r in results))
+  # Per-item cost shows whether an operation scales linearly.
+  print()
+  print(f"{'us per instance':<24}" +
+        "".join(f"{r['instances']:>12}" for r in results))
+  for op in ops:
+    print(f"{op:<24}" + "".join(
+        f"{r['times'][op] / r['instances'] * 1e6:>12.2f}" for r in results))
+
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+  main()
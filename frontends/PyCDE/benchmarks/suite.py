@@ -0,0 +1,399 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Time generation, each pass phase, and output emission on families of
+synthetic designs whose size scales with a parameter.
+
+Each (family, scale) point is built in its own process so that the measurements
+(including the peak RSS) don't depend on what ran before. Results are written as
+JSON which can be compared against an earlier run:
+
+  python suite.py --output new.json
+  python suite.py --families flat deep --scales 64 256 --output new.json
+  python suite.py --compare old.json new.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_SCALES = [16, 64, 256]
+
+
+def flat(n: int):
+  """'n' distinct small modules instantiated side by side in the top."""
+  from pycde import Input, Output, Module, generator, modparams, types
+
+  @modparams
+  def Leaf(seed: int):
+
+    class Leaf(Module):
+      a = Input(types.i32)
+      y = Output(types.i32)
+
+      @generator
+      def build(ports):
+        v = ports.a ^ types.i32(seed)
+        ports.y = (v.as_uint() + types.ui32(seed)).as_bits(32)
+
+    return Leaf
+
+  class Top(Module):
+    a = Input(types.i32)
+    y = Output(types.i32)
+
+    @generator
+    def build(ports):
+      v = ports.a
+      for seed in range(n):
+        v = v ^ Leaf(seed)(a=ports.a).y
+      ports.y = v
+
+  return Top
+
+
+def deep(n: int):
+  """A hierarchy 'n' levels deep with a register at each level."""
+  from pycde import Clock, Input, Output, Module, generator, modparams, types
+
+  @modparams
+  def Level(depth: int):
+
+    class Level(Module):
+      clk = Clock()
+      a = Input(types.i16)
+      y = Output(types.i16)
+
+      @generator
+      def build(ports):
+        v = (ports.a ^ types.i16(depth)).reg(ports.clk)
+        if depth > 0:
+          v = Level(depth - 1)(clk=ports.clk, a=v).y
+        ports.y = v
+
+    return Level
+
+  class Top(Module):
+    clk = Clock()
+    a = Input(types.i16)
+    y = Output(types.i16)
+
+    @generator
+    def build(ports):
+      ports.y = Level(n - 1)(clk=ports.clk, a=ports.a).y
+
+  return Top
+
+
+def wide(n: int):
+  """Buses 'n' * 64 bits wide, operated on whole and in 64 bit slices."""
+  from pycde import Input, Output, Module, generator, types
+  from pycde.value import BitsSignal
+
+  width = n * 64
+
+  class Top(Module):
+    a = Input(types.int(width))
+    b = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      v = (ports.a ^ ports.b) & (ports.a | ports.b)
+      chunks = [v[i * 64:(i + 1) * 64] for i in range(n)]
+      ports.y = BitsSignal.concat(list(reversed(chunks)))
+
+  return Top
+
+
+def params(n: int):
+  """A `modparams` family with 'n' parameterizations, each requested twice
+  (the second time from the module cache)."""
+  from pycde import Input, Output, Module, generator, modparams, types
+
+  @modparams
+  def Param(width: int, seed: int):
+
+    class Param(Module):
+      a = Input(types.int(width))
+      y = Output(types.int(width))
+
+      @generator
+      def build(ports):
+        ports.y = ports.a ^ types.int(width)(seed % (2**width))
+
+    return Param
+
+  class Top(Module):
+    a = Input(types.i32)
+    y = Output(types.i32)
+
+    @generator
+    def build(ports):
+      v = ports.a
+      for i in range(n):
+        width = 8 + i % 25
+        Param(width, i)(a=ports.a[0:width])
+        v = v ^ Param(32, i)(a=v).y
+      ports.y = v
+
+  return Top
+
+
+def ndarray(n: int):
+  """An 'n' x 'n' NDArray of bytes which is filled element-wise, transposed,
+  and materialized."""
+  from pycde import Input, Output, Module, generator, types
+  from pycde.ndarray import NDArray
+  from pycde.pycde_types import dim
+
+  class Top(Module):
+    a = Input(dim(types.i8, n))
+    y = Output(dim(types.i8, n, n))
+
+    @generator
+    def build(ports):
+      m = NDArray((n, n), dtype=types.i8, name="m")
+      for i in range(n):
+        for j in range(n):
+          m[i, j] = ports.a[(i + j) % n]
+      ports.y = m.transpose((1, 0)).to_circt()
+
+  return Top
+
+
+def fsm(n: int):
+  """A ring FSM with 'n' states, each with a guarded skip transition."""
+  from pycde import Clock, Input, Output, Module, generator, types
+  from pycde.fsm import gen_fsm
+
+  transitions = {
+      f"s{i}": [(f"s{(i + 2) % n}", f"skip{i % 8}"), f"s{(i + 1) % n}"]
+      for i in range(n)
+  }
+  FSM = gen_fsm(transitions, name="Ring")
+
+  class Top(Module):
+    clk = Clock()
+    rst = Input(types.i1)
+    skip = Input(types.i8)
+    y = Output(types.i1)
+
+    @generator
+    def build(ports):
+      guards = {f"skip{i}": ports.skip[i] for i in range(8)}
+      ring = FSM(clk=ports.clk, rst=ports.rst, **guards)
+      ports.y = ring.is_s0
+
+  return Top
+
+
+def esi_services(n: int):
+  """'n' producer/consumer pairs which talk through an ESI service implemented
+  via cosim."""
+  from pycde import (Clock, Input, InputChannel, OutputChannel, Module,
+                     generator, types)
+  from pycde import esi
+
+  @esi.ServiceDecl
+  class HostComms:
+    to_host = esi.ToServer(types.any)
+    from_host = esi.FromServer(types.any)
+
+  class Producer(Module):
+    clk = Clock()
+    out = OutputChannel(types.i32)
+
+    @generator
+    def build(ports):
+      ports.out = HostComms.from_host("in", types.i32)
+
+  class Consumer(Module):
+    clk = Clock()
+    inp = InputChannel(types.i32)
+
+    @generator
+    def build(ports):
+      HostComms.to_host(ports.inp, "out")
+
+  class Top(Module):
+    clk = Clock()
+    rst = Input(types.i1)
+
+    @generator
+    def build(ports):
+      for i in range(n):
+        p = Producer(clk=ports.clk, instance_name=f"producer{i}")
+        Consumer(clk=ports.clk, inp=p.out, instance_name=f"consumer{i}")
+      esi.Cosim(HostComms, ports.clk, ports.rst)
+
+  return Top
+
+
+FAMILIES = {
+    "flat": flat,
+    "deep": deep,
+    "wide": wide,
+    "params": params,
+    "ndarray": ndarray,
+    "fsm": fsm,
+    "esi": esi_services,
+}
+
+
+def measure(family: str, scale: int) -> dict:
+  """Build and compile one design in this process and return the timings."""
+  from pycde import System
+
+  start = time.perf_counter()
+  top = FAMILIES[family](scale)
+  define_time = time.perf_counter() - start
+  with tempfile.TemporaryDirectory() as out_dir:
+    s = System([top], name=f"{family}{scale}", output_directory=out_dir)
+    start = time.perf_counter()
+    s.generate()
+    generate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    s.run_passes()
+    passes_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    s.emit_outputs()
+    emit_time = time.perf_counter() - start
+
+  return {
+      "family": family,
+      "scale": scale,
+      "define": define_time,
+      "generate": generate_time,
+      "passes": passes_time,
+      "phases": [{
+          "phase": phase,
+          "seconds": secs
+      } for phase, secs in s.phase_times],
+      "emit": emit_time,
+      "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+  }
+
+
+def run_point(family: str, scale: int, timeout: float) -> dict:
+  """Measure one point in a fresh process."""
+  try:
+    out = subprocess.run([
+        sys.executable, __file__, "--worker", "--families", family, "--scales",
+        str(scale)
+    ],
+                         capture_output=True,
+                         text=True,
+                         timeout=timeout)
+  except subprocess.TimeoutExpired:
+    return {"family": family, "scale": scale, "error": "timeout"}
+  if out.returncode != 0:
+    err = out.stderr.strip().split("\n")[-1] if out.stderr else ""
+    return {"family": family, "scale": scale, "error": err}
+  return json.loads(out.stdout.strip().split("\n")[-1])
+
+
+def git_revision() -> str:
+  try:
+    return subprocess.run(["git", "rev-parse", "HEAD"],
+                          cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True,
+                          text=True,
+                          check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return "unknown"
+
+
+def print_results(results):
+  print(f"{'family':<8} {'scale':>6} {'generate':>9} {'passes':>9} "
+        f"{'emit':>9} {'rss MiB':>8}")
+  for r in results:
+    if "error" in r:
+      print(f"{r['family']:<8} {r['scale']:>6} error: {r['error']}")
+      continue
+    print(f"{r['family']:<8} {r['scale']:>6} {r['generate']:>9.3f} "
+          f"{r['passes']:>9.3f} {r['emit']:>9.3f} "
+          f"{r['peak_rss_kb'] / 1024:>8.1f}")
+
+
+def compare(old_path: str, new_path: str):
+  """Print the ratio (new / old) of each measurement present in both."""
+  old = {
+      (r["family"], r["scale"]): r
+      for r in json.load(open(old_path))["results"]
+      if "error" not in r
+  }
+  new = json.load(open(new_path))["results"]
+  print(f"{'family':<8} {'scale':>6} {'generate':>9} {'passes':>9} "
+        f"{'emit':>9} {'rss':>9}")
+  for r in new:
+    key = (r["family"], r["scale"])
+    if "error" in r or key not in old:
+      continue
+    o = old[key]
+    ratios = [
+        r[k] / o[k] if o[k] > 0 else float("nan")
+        for k in ["generate", "passes", "emit", "peak_rss_kb"]
+    ]
+    print(f"{r['family']:<8} {r['scale']:>6} " +
+          " ".join(f"{ratio:>8.2f}x" for ratio in ratios))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--families",
+                      nargs="+",
+                      choices=list(FAMILIES.keys()),
+                      default=list(FAMILIES.keys()))
+  parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+  parser.add_argument("--timeout",
+                      type=float,
+                      default=600,
+                      help="Seconds allowed per design.")
+  parser.add_argument("--output", help="Write the results to this JSON file.")
+  parser.add_argument("--compare",
+                      nargs=2,
+                      metavar=("OLD", "NEW"),
+                      help="Compare two result files instead of running.")
+  parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.compare:
+    compare(*args.compare)
+    return
+  if args.worker:
+    print(json.dumps(measure(args.families[0], args.scales[0])))
+    return
+
+  results = []
+  for family in args.families:
+    for scale in args.scales:
+      results.append(run_point(family, scale, args.timeout))
+  print_results(results)
+
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(
+          {
+              "revision": git_revision(),
+              "date": datetime.datetime.now().isoformat(),
+              "python": platform.python_version(),
+              "machine": platform.machine(),
+              "cpus": os.cpu_count(),
+              "results": results,
+          },
+          f,
+          indent=2)
+
+
+if __name__ == "__main__":
+  main()
@@ -20,7 +20,8 @@ def __exit_ctxt():
 
 from .common import (AppID, Clock, Input, InputChannel, Output, OutputChannel)
 from .module import (generator, modparams, Module)
-from .system import (System)
+from .system import (System, reset)
+from .sweep import (sweep)
 from .pycde_types import (dim, types)
 from .value import (Value)
 
@@ -0,0 +1,47 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import argparse
+import sys
+
+
+def main(args=None):
+  parser = argparse.ArgumentParser(prog="python -m pycde",
+                                   description="PyCDE utilities.")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+
+  watch_parser = subparsers.add_parser(
+      "watch",
+      help="Rerun a build script whenever it (or the modules it imports) "
+      "changes, rewriting only the changed output files.")
+  watch_parser.add_argument("script", help="The PyCDE build script.")
+  watch_parser.add_argument("--watch-dir",
+                            action="append",
+                            dest="watch_dirs",
+                            help="Directory containing sources to watch. May "
+                            "be repeated. Defaults to the script's directory.")
+  watch_parser.add_argument("--interval",
+                            type=float,
+                            default=0.5,
+                            help="Seconds between checks for changes.")
+  watch_parser.add_argument("--once",
+                            action="store_true",
+                            help="Build once and exit.")
+  watch_parser.add_argument("script_args",
+                            nargs=argparse.REMAINDER,
+                            help="Arguments passed to the script.")
+
+  args = parser.parse_args(args)
+  if args.command == "watch":
+    from .watch import watch
+    ok = watch(args.script,
+               args.script_args,
+               watch_dirs=args.watch_dirs,
+               interval=args.interval,
+               once=args.once)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -3,12 +3,13 @@
 #  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from __future__ import annotations
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from .circt.dialects import msft
 from .circt.support import attribute_to_var
 
-from .circt.ir import Attribute, StringAttr, ArrayAttr, FlatSymbolRefAttr
+from .circt.ir import (Attribute, Context, StringAttr, ArrayAttr,
+                       FlatSymbolRefAttr)
 from .support import get_user_loc
 
 from functools import singledispatchmethod
@@ -92,19 +93,24 @@ class LocationVector:
 
 
 class PhysicalRegion:
-  _counter = 0
-  _used_names = set([])
+  # Region names are unique per MLIR context.
+  _counter: Dict[Context, int] = {}
+  _used_names: Dict[Context, Set[str]] = {}
 
   __slots__ = ["_physical_region"]
 
   def __init__(self, name: str = None, bounds: list = None):
-    if name is None or name in PhysicalRegion._used_names:
+    ctxt = Context.current
+    used_names = PhysicalRegion._used_names.setdefault(ctxt, set())
+    if name is None or name in used_names:
       prefix = name if name is not None else "region"
-      name = f"{prefix}_{PhysicalRegion._counter}"
-      while name in PhysicalRegion._used_names:
-        PhysicalRegion._counter += 1
-        name = f"{prefix}_{PhysicalRegion._counter}"
-    PhysicalRegion._used_names.add(name)
+      counter = PhysicalRegion._counter.get(ctxt, 0)
+      name = f"{prefix}_{counter}"
+      while name in used_names:
+        counter += 1
+        name = f"{prefix}_{counter}"
+      PhysicalRegion._counter[ctxt] = counter
+    used_names.add(name)
 
     if bounds is None:
       bounds = []
@@ -113,6 +119,16 @@ class PhysicalRegion:
     bounds_attr = ArrayAttr.get(bounds)
     self._physical_region = msft.PhysicalRegionOp(name_attr, bounds_attr)
 
+  @staticmethod
+  def _reset(ctxt: Optional[Context] = None):
+    """Forget the region names used in 'ctxt' (or in all contexts)."""
+    if ctxt is None:
+      PhysicalRegion._counter.clear()
+      PhysicalRegion._used_names.clear()
+    else:
+      PhysicalRegion._counter.pop(ctxt, None)
+      PhysicalRegion._used_names.pop(ctxt, None)
+
   def add_bounds(self, x_bounds: tuple, y_bounds: tuple):
     """Add a new bounding box to the region."""
     if (len(x_bounds) != 2):
@@ -14,7 +14,8 @@ from .circt import ir
 
 from pathlib import Path
 import shutil
-from typing import Dict, List, Optional, Type
+import threading
+from typing import Dict, List, Optional, Tuple, Type
 
 __dir__ = Path(__file__).parent
 
@@ -308,7 +309,7 @@ class ServiceImplementationModuleBuilder(ModuleLikeBuilderBase):
     return raw_esi.ServiceInstanceOp(
         result=[t for _, t in self.outputs],
         service_symbol=decl_sym,
-        impl_type=_ServiceGeneratorRegistry._impl_type_name,
+        impl_type=ir.StringAttr.get(_ServiceGeneratorRegistry._impl_type_name),
         inputs=[inputs[pn].value for pn, _ in self.inputs],
         impl_opts=opts,
         loc=self.loc)
@@ -319,8 +320,11 @@ class ServiceImplementationModuleBuilder(ModuleLikeBuilderBase):
 
     assert len(self.generators) == 1
     generator: Generator = list(self.generators.values())[0]
+    from .profiling import profile_generator
     ports = self.generator_port_proxy(serviceReq.operation.operands, self)
-    with self.GeneratorCtxt(self, ports, serviceReq, generator.loc):
+    ctxt = self.GeneratorCtxt(self, ports, serviceReq, generator.loc)
+    with profile_generator(self.name, "service", serviceReq.operation.parent,
+                           ctxt.bb), ctxt:
 
       # Run the generator.
       channels = _ServiceGeneratorChannels(self, serviceReq)
@@ -367,17 +371,20 @@ class _ServiceGeneratorRegistry:
   """Class to register individual service instance generators. Should be a
   singleton."""
   _registered = False
-  _impl_type_name = ir.StringAttr.get("pycde")
+  _impl_type_name = "pycde"
 
   def __init__(self):
-    self._registry: Dict[str, ServiceImplementation] = {}
+    # Keyed by MLIR context and instance name since Systems in different
+    # contexts may be built concurrently.
+    self._registry: Dict[Tuple[ir.Context, str], Tuple[ServiceImplementation,
+                                                       System]] = {}
+    self._lock = threading.Lock()
 
     # Register myself with ESI so I can dispatch to my internal registry.
     assert _ServiceGeneratorRegistry._registered is False, \
       "Cannot instantiate more than one _ServiceGeneratorRegistry"
-    raw_esi.registerServiceGenerator(
-        _ServiceGeneratorRegistry._impl_type_name.value,
-        self._implement_service)
+    raw_esi.registerServiceGenerator(_ServiceGeneratorRegistry._impl_type_name,
+                                     self._implement_service)
     _ServiceGeneratorRegistry._registered = True
 
   def register(self,
@@ -386,25 +393,37 @@ class _ServiceGeneratorRegistry:
     Called when the ServiceImplamentation is defined."""
 
     # Create unique name for the service instance.
+    ctxt = ir.Context.current
     basename = service_implementation.name
     name = basename
     ctr = 0
-    while name in self._registry:
-      ctr += 1
-      name = basename + "_" + str(ctr)
-    name_attr = ir.StringAttr.get(name)
-    self._registry[name_attr] = (service_implementation, System.current())
-    return ir.DictAttr.get({"name": name_attr})
+    with self._lock:
+      while (ctxt, name) in self._registry:
+        ctr += 1
+        name = basename + "_" + str(ctr)
+      self._registry[(ctxt, name)] = (service_implementation, System.current())
+    return ir.DictAttr.get({"name": ir.StringAttr.get(name)})
+
+  def _reset(self, ctxt: Optional[ir.Context] = None):
+    """Forget the service implementations registered in 'ctxt' (or in all
+    contexts)."""
+    with self._lock:
+      if ctxt is None:
+        self._registry.clear()
+      else:
+        for key in [k for k in self._registry if k[0] == ctxt]:
+          del self._registry[key]
 
   def _implement_service(self, req: ir.Operation):
     """This is the callback which the ESI connect-services pass calls. Dispatch
     to the op-specified generator."""
     assert isinstance(req.opview, raw_esi.ServiceImplementReqOp)
     opts = ir.DictAttr(req.attributes["impl_opts"])
-    impl_name = opts["name"]
-    if impl_name not in self._registry:
-      return False
-    (impl, sys) = self._registry[impl_name]
+    key = (req.context, ir.StringAttr(opts["name"]).value)
+    with self._lock:
+      if key not in self._registry:
+        return False
+      (impl, sys) = self._registry[key]
     with sys:
       return impl._builder.generate_svc_impl(serviceReq=req.opview)
 
@@ -2,9 +2,10 @@
 #  See https://llvm.org/LICENSE.txt for license information.
 #  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
-import capnp
+from collections import defaultdict
 import os
 from pathlib import Path
+import queue
 import time
 import typing
 
@@ -177,6 +178,7 @@ class Cosim(_CosimNode):
 
   def __init__(self, schemaPath, hostPort):
     """Load the schema and connect to the RPC server"""
+    import capnp
     self._schema = capnp.load(schemaPath)
     self._rpc_client = capnp.TwoPartyClient(hostPort)
     self._cosim = self._rpc_client.bootstrap().cast_as(
@@ -322,3 +324,84 @@ class _CosimPort:
       return None
     assert recvResp.resp is not None
     return self._read_convert.read(recvResp.resp)
+
+
+class _LoopbackNode:
+  """Provides an in-process backend with no simulator behind it."""
+
+  def __init__(self, root, prefix: typing.List[str]):
+    self._root: Loopback = root
+    self._endpoint_prefix = prefix
+
+  def supports_impl(self, impl_type: str) -> bool:
+    """The loopback backend stands in for any implementation."""
+    return True
+
+  def get_child(self, child_name: str):
+    child_path = self._endpoint_prefix + [child_name]
+    return _LoopbackNode(self._root, child_path)
+
+  def get_port(self,
+               client_path: typing.List[str],
+               read_type: typing.Optional[Type] = None,
+               write_type: typing.Optional[Type] = None):
+    path = ".".join(self._endpoint_prefix) + "." + "_".join(client_path)
+    return _LoopbackPort(self._root, path, read_type)
+
+
+class Loopback(_LoopbackNode):
+  """An in-process backend which doesn't talk to a simulation. Messages written
+  to a port are passed to 'responder' (along with the endpoint path) and the
+  result is queued to be read from the same port. By default, messages are
+  echoed back. Use `inject` to queue messages for ports which are only read.
+
+  Intended for testing and benchmarking the host side of the runtime API."""
+
+  def __init__(self,
+               responder: typing.Optional[typing.Callable[[str, typing.Any],
+                                                          typing.Any]] = None):
+    self._responder = responder
+    self._queues: typing.Dict[str, queue.SimpleQueue] = defaultdict(
+        queue.SimpleQueue)
+    super().__init__(self, [])
+
+  def inject(self, port: Port, msg=None):
+    """Queue 'msg' to be read from 'port'."""
+    if port._backend is None:
+      raise ValueError("Backend does not support implementation of port")
+    port._backend._queue.put(msg)
+
+
+class _LoopbackPort:
+  """Loopback backend for service ports. Since a void message reads as None,
+  which also means that no message was available, void messages are read as
+  an empty tuple."""
+
+  def __init__(self, root: Loopback, path: str,
+               read_type: typing.Optional[Type]):
+    self._root = root
+    self._path = path
+    self._queue = root._queues[path]
+    self._read_void = isinstance(read_type, VoidType)
+
+  def write(self, msg) -> bool:
+    """Write a message to this port."""
+    if self._root._responder is not None:
+      msg = self._root._responder(self._path, msg)
+    self._queue.put(msg)
+    return True
+
+  def read(self, blocking_time: typing.Optional[float]):
+    """Read a message from this port. If 'blocking_timeout' is None, return
+    immediately. Otherwise, wait up to 'blocking_timeout' for a message. Returns
+    the message if found, None if no message was read."""
+    try:
+      if blocking_time is None:
+        msg = self._queue.get_nowait()
+      else:
+        msg = self._queue.get(timeout=blocking_time)
+    except queue.Empty:
+      return None
+    if msg is None and self._read_void:
+      return ()
+    return msg
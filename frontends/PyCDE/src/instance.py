@@ -3,7 +3,7 @@
 #  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from __future__ import annotations
-from typing import Dict, Iterator, List, Optional, Tuple, Union
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from .circt.dialects import msft, seq
 from .circt import ir
@@ -11,30 +11,323 @@ from .circt import ir
 from pycde.devicedb import LocationVector
 from pycde.module import AppID
 
+from array import array
+from collections.abc import Mapping
+import fnmatch
+import math
+import weakref
+
+
+class _ModuleChildren:
+  """The ops with symbols inside of one module, i.e. the children of each of
+  its instances. A 'slot' is the position of a child in these lists. Also, the
+  AppID names which instances of the module have accessors for."""
+
+  __slots__ = [
+      "syms", "names", "kinds", "modules", "module_syms", "appids", "reg_types",
+      "by_name", "by_sym", "by_appid", "appid_names"
+  ]
+
+  def __init__(self, module, op_cache):
+    from .pycde_types import Type
+    self.syms: List[ir.StringAttr] = []
+    self.names: List[str] = []
+    self.kinds: List[str] = []
+    # For instances, the module instantiated and its symbol. Otherwise None.
+    self.modules: List[Optional[object]] = []
+    self.module_syms: List[Optional[str]] = []
+    self.appids: List[Optional[Tuple[str, int]]] = []
+    # For registers, their type. Otherwise None.
+    self.reg_types: List[Optional[Type]] = []
+    self.by_name: Dict[str, int] = {}
+    self.by_sym: Dict[ir.StringAttr, int] = {}
+    self.by_appid: Dict[str, List[Tuple[int, int]]] = {}
+    self.appid_names: List[str] = []
+
+    sym_ops = op_cache.get_sym_ops_in_module(module)
+    for slot, (sym, op) in enumerate(sym_ops.items()):
+      name = ir.StringAttr(sym).value
+      self.syms.append(sym)
+      self.names.append(name)
+      self.kinds.append(op.operation.name)
+      mod_sym = None
+      if isinstance(op, msft.InstanceOp):
+        mod_sym = ir.FlatSymbolRefAttr(op.moduleName).value
+      self.modules.append(None if mod_sym is
+                          None else op_cache.get_symbol_pyproxy(mod_sym))
+      self.module_syms.append(mod_sym)
+      self.reg_types.append(
+          Type(op.operation.operands[0].type) if isinstance(op, seq.CompRegOp
+                                                           ) else None)
+      appid = None
+      if AppID.AttributeName in op.attributes:
+        try:
+          # This is the only way to test that a certain attribute is a certain
+          # attribute type. *Sigh*.
+          attr = msft.AppIDAttr(op.attributes[AppID.AttributeName])
+          appid = (attr.name, attr.index)
+          self.by_appid.setdefault(attr.name, []).append((attr.index, slot))
+        except ValueError:
+          pass
+      self.appids.append(appid)
+      self.by_name[name] = slot
+      self.by_sym[sym] = slot
+
+    if module is not None:
+      circt_mod = module.circt_mod
+      if isinstance(circt_mod, msft.MSFTModuleOp) and \
+         circt_mod.childAppIDBases is not None:
+        self.appid_names = [n.value for n in circt_mod.childAppIDBases]
+
+
+class _InstanceNodes:
+  """The instances in one instance hierarchy, stored as arrays indexed by node
+  id. The root is node 0. The children of a node are allocated (contiguously,
+  from `first_child[node]`) the first time they're needed. Since all the
+  instances of a module have the same children, those are described once per
+  module (`_ModuleChildren`) and a node only records its parent, its position
+  ('slot') amongst its parent's children, and the module it instantiates (-1
+  if it's not a module instance).
+
+  `Instance` objects are views of a node. They are weakly cached, so only the
+  ones in use are kept around. Everything below the root is dropped by `reset`
+  when the hierarchy may have changed."""
+
+  __slots__ = [
+      "root", "parent", "slot", "module", "first_child", "_modules",
+      "_module_ids", "_module_children", "_views", "_path_names",
+      "_appid_indices"
+  ]
+
+  def __init__(self, root: InstanceHierarchyRoot, module):
+    self.root = root
+    self._init(module)
+
+  def _init(self, module):
+    self._modules: List[object] = []
+    self._module_ids: Dict[object, int] = {}
+    self._module_children: List[Optional[_ModuleChildren]] = []
+    self.parent = array("q", [-1])
+    self.slot = array("q", [-1])
+    self.module = array("q", [self._module_id(module)])
+    self.first_child = array("q", [-1])
+    self._views: weakref.WeakValueDictionary[int, Instance] = \
+      weakref.WeakValueDictionary()
+    self._path_names: Dict[int, Tuple[str, ...]] = {0: ()}
+    self._appid_indices: Dict[int, Dict[str, _AppIDEntries]] = {}
+
+  def reset(self):
+    """Forget the nodes below the root and what was looked up about them, since
+    the modules (e.g. after more generation, `dedup_modules` or
+    `outline_repeated`) may have changed. `Instance`s other than the root which
+    were obtained before the reset must not be used after it."""
+    self._init(self.module_of(0))
+
+  def __len__(self) -> int:
+    """The number of nodes allocated so far."""
+    return len(self.parent)
+
+  def _module_id(self, module) -> int:
+    if module is None:
+      return -1
+    if module not in self._module_ids:
+      self._module_ids[module] = len(self._modules)
+      self._modules.append(module)
+      self._module_children.append(None)
+    return self._module_ids[module]
+
+  def module_of(self, node: int):
+    """The module which 'node' instantiates. None if it isn't a module
+    instance."""
+    mod_id = self.module[node]
+    return None if mod_id < 0 else self._modules[mod_id]
+
+  def children(self, node: int) -> Optional[_ModuleChildren]:
+    """Describes the children of 'node'. None if it isn't a module instance."""
+    mod_id = self.module[node]
+    if mod_id < 0:
+      return None
+    children = self._module_children[mod_id]
+    if children is None:
+      with self.root.system:
+        children = _ModuleChildren(self._modules[mod_id],
+                                   self.root.system._op_cache)
+      self._module_children[mod_id] = children
+    return children
+
+  def parent_children(self, node: int) -> Optional[_ModuleChildren]:
+    """Describes 'node' (at `self.slot[node]`) and its siblings. None for the
+    root."""
+    parent = self.parent[node]
+    return None if parent < 0 else self.children(parent)
+
+  def child_nodes(self, node: int) -> range:
+    """The ids of the children of 'node', allocating them if necessary."""
+    first = self.first_child[node]
+    if first < 0:
+      first = len(self.parent)
+      self.first_child[node] = first
+      children = self.children(node)
+      if children is not None:
+        for slot, mod in enumerate(children.modules):
+          self.parent.append(node)
+          self.slot.append(slot)
+          self.module.append(self._module_id(mod))
+          self.first_child.append(-1)
+    children = self.children(node)
+    num = 0 if children is None else len(children.names)
+    return range(first, first + num)
+
+  def child(self, node: int, slot: int) -> int:
+    return self.child_nodes(node)[slot]
+
+  def find(self, node: int, names: List[str]) -> int:
+    """The node at the path of instance 'names' below 'node'."""
+    for name in names:
+      children = self.children(node)
+      if children is None or name not in children.by_name:
+        raise KeyError(f"No instance '{name}' in {self.view(node)}")
+      node = self.child(node, children.by_name[name])
+    return node
+
+  def name(self, node: int) -> str:
+    return self.parent_children(node).names[self.slot[node]]
+
+  def symbol(self, node: int) -> Optional[ir.StringAttr]:
+    parent_children = self.parent_children(node)
+    if parent_children is None:
+      return None
+    return parent_children.syms[self.slot[node]]
+
+  def path_names(self, node: int) -> Tuple[str, ...]:
+    """The instance names from the root to 'node'. Cached."""
+    path = self._path_names.get(node)
+    if path is not None:
+      return path
+    # Find the closest ancestor with a cached path then fill in the rest.
+    uncached = []
+    while path is None:
+      uncached.append(node)
+      node = self.parent[node]
+      path = self._path_names.get(node)
+    for n in reversed(uncached):
+      path = path + (self.name(n),)
+      self._path_names[n] = path
+    return path
+
+  def path_nodes(self, node: int) -> List[int]:
+    """The nodes from the root (exclusive) to 'node' (inclusive)."""
+    nodes = []
+    while node > 0:
+      nodes.append(node)
+      node = self.parent[node]
+    return list(reversed(nodes))
+
+  def view(self, node: int) -> Instance:
+    """The `Instance` for 'node'."""
+    if node == 0:
+      return self.root
+    inst = self._views.get(node)
+    if inst is not None:
+      return inst
+    inst = self.view_class(node)(self, node)
+    self._views[node] = inst
+    return inst
+
+  def view_class(self, node: int) -> type:
+    """The `Instance` class 'node' is viewed as."""
+    if node == 0:
+      return InstanceHierarchyRoot
+    if self.module[node] >= 0:
+      return ModuleInstance
+    if self.parent_children(node).reg_types[self.slot[node]] is not None:
+      return RegInstance
+    return Instance
+
+  def kind(self, node: int) -> Optional[str]:
+    """The name of the op which 'node' is an instance of. None for the
+    root."""
+    parent_children = self.parent_children(node)
+    if parent_children is None:
+      return None
+    return parent_children.kinds[self.slot[node]]
+
+  def appid_index(self, node: int) -> Dict[str, _AppIDEntries]:
+    """Index the AppIDs at or below (through the child instances which have
+    accessors for them) the children of 'node'. Cached."""
+    index = self._appid_indices.get(node)
+    if index is not None:
+      return index
+
+    index = {}
+
+    def add(appid_name: str, appid_index: int, inst_node: int):
+      if appid_name not in index:
+        index[appid_name] = _AppIDEntries()
+      index[appid_name].add(appid_index, inst_node)
+
+    children = self.children(node)
+    for child in self.child_nodes(node):
+      # "Look through" instance hierarchy levels if the child has an AppID
+      # accessor for a name.
+      child_children = self.children(child)
+      if child_children is not None and len(child_children.appid_names) > 0:
+        child_index = self.appid_index(child)
+        for appid_name in child_children.appid_names:
+          if appid_name in child_index:
+            for appid_index, inst_node in child_index[appid_name].entries:
+              add(appid_name, appid_index, inst_node)
+
+      # Add the AppID if it is local.
+      appid = children.appids[self.slot[child]]
+      if appid is not None:
+        add(appid[0], appid[1], child)
+
+    self._appid_indices[node] = index
+    return index
+
 
 class Instance:
   """Represents a _specific_ instance, unique in a design. This is in contrast
-  to a module instantiation within another module."""
+  to a module instantiation within another module. Instances are views of a
+  node in their hierarchy, so two `Instance`s of the same node are equal."""
   from .module import Module
 
-  __slots__ = ["parent", "inside_of", "root", "symbol", "_op_cache"]
+  __slots__ = ["_nodes", "_node", "__weakref__"]
 
-  def __init__(self, parent: Instance, inside_of: Module,
-               symbol: Optional[ir.Attribute]):
-    """
-    Construct a new instance. Since the terminology can be confusing:
-    - inside_of: the module which contains this instance (e.g. the instantiation
-      site).
-    - tgt_mod: if the instance is an instantation, `tgt_mod` is the module being
-      instantiated. Examples of things which aren't instantiations:
-      `seq.compreg`s.
-    """
+  def __init__(self, nodes: _InstanceNodes, node: int):
+    self._nodes = nodes
+    self._node = node
+
+  def __eq__(self, other) -> bool:
+    return isinstance(other, Instance) and self._nodes is other._nodes and \
+      self._node == other._node
 
-    self.inside_of = inside_of
-    self.parent = parent
-    self.root = parent.root
-    self.symbol = symbol
-    self._op_cache = parent.root.system._op_cache
+  def __hash__(self) -> int:
+    return hash((id(self._nodes), self._node))
+
+  @property
+  def root(self) -> InstanceHierarchyRoot:
+    return self._nodes.root
+
+  @property
+  def parent(self) -> Instance:
+    parent = self._nodes.parent[self._node]
+    return self.root if parent < 0 else self._nodes.view(parent)
+
+  @property
+  def inside_of(self) -> Module:
+    """The module which contains this instance (e.g. the instantiation
+    site)."""
+    return self._nodes.module_of(self._nodes.parent[self._node])
+
+  @property
+  def symbol(self) -> Optional[ir.StringAttr]:
+    return self._nodes.symbol(self._node)
+
+  @property
+  def _op_cache(self):
+    return self._nodes.root.system._op_cache
 
   def _get_ip(self) -> ir.InsertionPoint:
     return ir.InsertionPoint(self._dyn_inst.body.blocks[0])
@@ -49,29 +342,20 @@ class Instance:
     return self._op_cache.get_pyproxy_symbol(self.inside_of)
 
   def __repr__(self) -> str:
-    path_names = [i.name for i in self.path]
-    return "<instance: [" + ", ".join(path_names) + "]>"
+    return "<instance: [" + ", ".join(self.path_names) + "]>"
 
   @property
   def path_names(self):
     """A list of instance names representing the instance path."""
-    return [i.name for i in self.path]
+    return list(self._nodes.path_names(self._node))
 
   def add_named_attribute(self,
                           name: str,
                           value: str,
                           subpath: Union[str, list[str]] = None):
     """Add an arbitrary named attribute to this instance."""
-    if isinstance(subpath, list):
-      subpath = "|".join(subpath)
-    if subpath:
-      subpath = "|" + subpath
-    with self._get_ip():
-      msft.DynamicInstanceVerbatimAttrOp(
-          name=ir.StringAttr.get(name),
-          value=ir.StringAttr.get(value),
-          subPath=None if subpath is None else ir.StringAttr.get(subpath),
-          ref=None)
+    with self.root.system, self._get_ip():
+      _create_named_attribute(name, value, subpath)
 
   @property
   def _dyn_inst(self) -> msft.DynamicInstanceOp:
@@ -83,13 +367,11 @@ class Instance:
 
   @property
   def path(self) -> list[Instance]:
-    return self.parent.path + [self]
+    return [self._nodes.view(n) for n in self._nodes.path_nodes(self._node)]
 
   @property
   def name(self) -> str:
-    assert self.symbol is not None, \
-           "If symbol is None, name() needs to be overridden"
-    return ir.StringAttr(self.symbol).value
+    return self._nodes.name(self._node)
 
   @property
   def appid(self) -> Optional[AppID]:
@@ -102,77 +384,209 @@ class Instance:
     return None
 
 
+def _create_named_attribute(name: str, value: str, subpath: Union[None, str,
+                                                                  list[str]]):
+  if isinstance(subpath, list):
+    subpath = "|".join(subpath)
+  if subpath:
+    subpath = "|" + subpath
+  msft.DynamicInstanceVerbatimAttrOp(
+      name=ir.StringAttr.get(name),
+      value=ir.StringAttr.get(value),
+      subPath=None if subpath is None else ir.StringAttr.get(subpath),
+      ref=None)
+
+
+def _attribute_rows(attributes) -> Iterator[tuple]:
+  """Normalize the argument to `add_named_attributes` to an iterator of
+  (target, name, value, subpath) tuples."""
+
+  def subpath_or_none(subpath):
+    # Missing cells in a DataFrame column are NaN.
+    if isinstance(subpath, float) and math.isnan(subpath):
+      return None
+    return subpath
+
+  def from_columns(columns, num_rows: int):
+    target = "instance" if "instance" in columns else "path"
+    subpaths = columns["subpath"] if "subpath" in columns else [None] * num_rows
+    return ((target, name, value, subpath_or_none(subpath))
+            for target, name, value, subpath in zip(
+                columns[target], columns["name"], columns["value"], subpaths))
+
+  def from_row(row):
+    row = tuple(row)
+    if len(row) == 3:
+      return row + (None,)
+    if len(row) == 4:
+      return row[:3] + (subpath_or_none(row[3]),)
+    raise ValueError("Named attribute rows must be (target, name, value) or "
+                     f"(target, name, value, subpath), not {row!r}")
+
+  if hasattr(attributes, "itertuples") and hasattr(attributes, "columns"):
+    # A pandas-style DataFrame.
+    return from_columns(attributes, len(attributes))
+  if isinstance(attributes, Mapping):
+    return from_columns(attributes, len(attributes["name"]))
+  return (from_row(row) for row in attributes)
+
+
 class ModuleInstance(Instance):
   """Instance specialization for modules. Since they are the only thing which
   can contain operations (for now), put all of the children stuff in here."""
 
   from .module import Module
 
-  def __init__(self, parent: Instance, instance_sym: Optional[ir.Attribute],
-               inside_of: Module, tgt_mod: Module):
-    super().__init__(parent, inside_of, instance_sym)
-    self.tgt_mod = tgt_mod
-    self._child_cache: Dict[ir.StringAttr, Instance] = None
-    self._add_appids()
+  __slots__ = []
+
+  @property
+  def tgt_mod(self) -> Module:
+    """The module this instance instantiates."""
+    return self._nodes.module_of(self._node)
 
-  def _add_appids(self):
-    """Implicitly add members for each AppID which is contained by this
+  def __getattr__(self, name: str):
+    """Implicitly provide members for each AppID which is contained by this
     instance."""
-    with self.root.system:
-      circt_mod = self.tgt_mod.circt_mod
-    if not isinstance(circt_mod,
-                      msft.MSFTModuleOp) or circt_mod.childAppIDBases is None:
-      return
-    for name in [n.value for n in circt_mod.childAppIDBases]:
-      if hasattr(self, name):
-        continue
-      self.__slots__.append(name)
-      setattr(self, name, _AppIDInstance(self, name))
-
-  def _create_instance(self, static_op: ir.Operation) -> Instance:
-    """Create a new `Instance` which is a child of `parent` in the instance
-    hierarchy and corresponds to the given static operation. The static
-    operation need not be a module instantiation."""
-
-    sym_name = static_op.attributes["sym_name"]
-    if isinstance(static_op, msft.InstanceOp):
-      tgt_mod = self._op_cache.get_symbol_pyproxy(static_op.moduleName)
-      return ModuleInstance(self,
-                            instance_sym=sym_name,
-                            inside_of=self.tgt_mod,
-                            tgt_mod=tgt_mod)
-    if isinstance(static_op, seq.CompRegOp):
-      return RegInstance(self, self.tgt_mod, sym_name, static_op)
-
-    return Instance(self, self.tgt_mod, sym_name)
+    if not name.startswith("_"):
+      children = self._nodes.children(self._node)
+      if children is not None and name in children.appid_names:
+        return _AppIDInstance(self, name)
+    raise AttributeError(
+        f"'{type(self).__name__}' object has no attribute '{name}'")
+
+  def _child_views(self) -> Iterator[Instance]:
+    nodes = self._nodes
+    for child in nodes.child_nodes(self._node):
+      yield nodes.view(child)
+
+  def _child(self, sym: ir.StringAttr) -> Instance:
+    """Get a child instance by symbol."""
+    children = self._nodes.children(self._node)
+    return self._nodes.view(self._nodes.child(self._node, children.by_sym[sym]))
 
   def _children(self) -> Dict[ir.StringAttr, Instance]:
-    """Return a dict of MLIR StringAttr this instances' children. Cache said
-    list."""
-    if self._child_cache is not None:
-      return self._child_cache
-    symbols_in_mod = self._op_cache.get_sym_ops_in_module(self.tgt_mod)
-    children = {
-        sym: self._create_instance(op) for (sym, op) in symbols_in_mod.items()
-    }
-    # TODO: make these weak refs
-    self._child_cache = children
-    return children
+    """Return a dict of MLIR StringAttr to this instances' children."""
+    return {child.symbol: child for child in self._child_views()}
 
   @property
   def children(self) -> Dict[str, Instance]:
     """Return a dict of python strings to this instances' children."""
-    return {ir.StringAttr(key).value: inst for (key, inst) in self._children()}
+    return {child.name: child for child in self._child_views()}
 
   def __getitem__(self, child_name: str) -> Instance:
     """Get a child instance."""
-    return self._children()[ir.StringAttr.get(child_name)]
+    children = self._nodes.children(self._node)
+    if child_name not in children.by_name:
+      raise KeyError(child_name)
+    return self._nodes.view(
+        self._nodes.child(self._node, children.by_name[child_name]))
 
   def walk(self, callback):
     """Descend the instance hierarchy, calling back on each instance."""
     callback(self)
-    for child in self._children().values():
-      child.walk(callback)
+    for inst in self.iter_descendants():
+      callback(inst)
+
+  def iter_descendants(
+      self,
+      kind: Union[None, str, type] = None,
+      max_depth: Optional[int] = None,
+      prune: Optional[Callable[[ModuleInstance], bool]] = None
+  ) -> Iterator[Instance]:
+    """Lazily iterate (in preorder) over the instances below this one. Only
+    the instances which are yielded (or passed to 'prune') are created.
+
+    - kind: only yield the instances which are of this `Instance` subclass
+      (e.g. `RegInstance`) or are of this op name (a glob, e.g. 'seq.*').
+      Doesn't affect which instances are descended into.
+    - max_depth: don't go more than this many levels below this instance.
+    - prune: called on each module instance reached. If it returns True, the
+      instance is still yielded (if it matches 'kind') but not descended into.
+    """
+    nodes = self._nodes
+    if isinstance(kind, str):
+      pattern = kind
+      matches = lambda n: fnmatch.fnmatchcase(nodes.kind(n), pattern)
+    elif kind is not None:
+      cls = kind
+      matches = lambda n: issubclass(nodes.view_class(n), cls)
+    else:
+      matches = None
+
+    # Children are pushed in reverse so they're popped in order.
+    stack = [(child, 1) for child in reversed(nodes.child_nodes(self._node))]
+    while stack:
+      node, depth = stack.pop()
+      if matches is None or matches(node):
+        yield nodes.view(node)
+      if nodes.module[node] < 0 or (max_depth is not None and
+                                    depth >= max_depth):
+        continue
+      if prune is not None and prune(nodes.view(node)):
+        continue
+      stack.extend(
+          (child, depth + 1) for child in reversed(nodes.child_nodes(node)))
+
+  def add_named_attributes(self, attributes):
+    """Add named attributes to many instances at once. 'attributes' is
+    either a sequence of (target, name, value[, subpath]) tuples or a table
+    with 'instance' (or 'path'), 'name', 'value', and optionally 'subpath'
+    columns: a mapping of column names to sequences or a DataFrame. A target is
+    an `Instance` or the path to one relative to this instance, either as a
+    list of names or a '/' separated string.
+
+    The dynamic instances and attribute ops are created in one pass, grouped
+    by the instances' parents, so the IR is only looked up once per parent
+    rather than once per attribute."""
+    nodes = self._nodes
+
+    # Resolve the targets, grouping the rows by instance node.
+    rows_by_node: Dict[int, List[tuple]] = {}
+    for target, name, value, subpath in _attribute_rows(attributes):
+      if isinstance(target, Instance):
+        if target._nodes is not nodes:
+          raise ValueError(f"{target} is not in this instance hierarchy")
+        node = target._node
+      else:
+        if isinstance(target, str):
+          target = [n for n in target.split("/") if n != ""]
+        node = nodes.find(self._node, target)
+      rows_by_node.setdefault(node, []).append((name, value, subpath))
+
+    # Group the instances by parent. Create the parents' dynamic instances
+    # from the top down so each is created by its own parent's group.
+    by_parent: Dict[int, List[int]] = {}
+    for node in rows_by_node:
+      by_parent.setdefault(nodes.parent[node], []).append(node)
+    parents = sorted(by_parent.keys(),
+                     key=lambda n: len(nodes.path_names(n)) if n >= 0 else -1)
+
+    op_cache = self._op_cache
+    with self.root.system:
+      for parent in parents:
+        children = [nodes.view(n) for n in by_parent[parent]]
+        if parent < 0:
+          # The root.
+          dyn_insts = [self.root._dyn_inst]
+        else:
+          dyn_insts = op_cache.create_or_get_dyn_insts(nodes.view(parent),
+                                                       children)
+        for inst, dyn_inst in zip(children, dyn_insts):
+          if dyn_inst is None:
+            raise InstanceDoesNotExistError(str(inst))
+          with ir.InsertionPoint(dyn_inst.body.blocks[0]):
+            for name, value, subpath in rows_by_node[inst._node]:
+              _create_named_attribute(name, value, subpath)
+
+  def query(self,
+            pattern: str,
+            module=None,
+            kind: Optional[str] = None,
+            appid=None) -> List[Instance]:
+    """Select the instances below this one which match 'pattern' and the
+    filters. See `pycde.query.query` for the syntax."""
+    from .query import query
+    return query(self, pattern, module=module, kind=kind, appid=appid)
 
   def place(self,
             devtype: msft.PrimitiveType,
@@ -185,8 +599,9 @@ class ModuleInstance(Instance):
       subpath = "|".join(subpath)
     if subpath:
       subpath = "|" + subpath
-    loc = devdb.PhysLocation(devtype, x, y, num)
-    self.root.system.placedb.place(self, loc, subpath)
+    with self.root.system:
+      loc = devdb.PhysLocation(devtype, x, y, num)
+      self.root.system.placedb.place(self, loc, subpath)
 
   @property
   def locations(self) -> List[Tuple[object, str]]:
@@ -209,6 +624,21 @@ class ModuleInstance(Instance):
     ]
 
 
+class _AppIDEntries:
+  """The instance nodes with one AppID name, in hierarchy order, and indexed by
+  AppID index. If an index appears more than once, the first is indexed."""
+
+  __slots__ = ["entries", "by_index"]
+
+  def __init__(self):
+    self.entries: List[Tuple[int, int]] = []
+    self.by_index: Dict[int, int] = {}
+
+  def add(self, appid_index: int, node: int):
+    self.entries.append((appid_index, node))
+    self.by_index.setdefault(appid_index, node)
+
+
 class _AppIDInstance:
   """Helper class to provide accessors to AppID'd instances."""
 
@@ -218,56 +648,34 @@ class _AppIDInstance:
     self.owner_instance = owner_instance
     self.appid_name = appid_name
 
-  def _search(self) -> Iterator[AppID, Instance]:
-    inner_sym_ops = self.owner_instance._op_cache.get_sym_ops_in_module(
-        self.owner_instance.tgt_mod)
-    for child in self.owner_instance._children().values():
-      # "Look through" instance hierarchy levels if the child has an AppID
-      # accessor for our name.
-      if hasattr(child, self.appid_name):
-        child_appid_inst = getattr(child, self.appid_name)
-        if not isinstance(child_appid_inst, _AppIDInstance):
-          continue
-        for c in child_appid_inst._search():
-          yield c
-
-      # Check if the AppID is local, then return the instance if it is.
-      instance_op = inner_sym_ops[child.symbol]
-      if AppID.AttributeName in instance_op.attributes:
-        try:
-          # This is the only way to test that a certain attribute is a certain
-          # attribute type. *Sigh*.
-          appid = msft.AppIDAttr(instance_op.attributes[AppID.AttributeName])
-          if appid.name == self.appid_name:
-            yield (appid, child)
-        except ValueError:
-          pass
+  def _entries(self) -> Optional[_AppIDEntries]:
+    owner = self.owner_instance
+    return owner._nodes.appid_index(owner._node).get(self.appid_name)
 
   def __getitem__(self, index: int) -> Instance:
-    for (appid, child) in self._search():
-      if appid.index == index:
-        return child
-
+    entries = self._entries()
+    if entries is not None and index in entries.by_index:
+      return self.owner_instance._nodes.view(entries.by_index[index])
     raise IndexError(f"{self.appid_name}[{index}] not found")
 
   def __iter__(self) -> Iterator[Instance]:
-    for (_, child) in self._search():
-      yield child
+    entries = self._entries()
+    if entries is None:
+      return
+    nodes = self.owner_instance._nodes
+    for (_, node) in entries.entries:
+      yield nodes.view(node)
 
 
 class RegInstance(Instance):
   """Instance specialization for registers."""
 
-  from .module import Module
+  __slots__ = []
 
-  __slots__ = ["type"]
-
-  def __init__(self, parent: Instance, inside_of: Module,
-               symbol: Optional[ir.Attribute], static_op: seq.CompRegOp):
-    super().__init__(parent, inside_of, symbol)
-
-    from .pycde_types import Type
-    self.type = Type(static_op.operation.operands[0].type)
+  @property
+  def type(self):
+    return self._nodes.parent_children(
+        self._node).reg_types[self._nodes.slot[self._node]]
 
   def place(self, locs: Union[LocationVector, List[Optional[Tuple[int, int,
                                                                   int]]]]):
@@ -276,7 +684,8 @@ class RegInstance(Instance):
       vec = locs
     else:
       vec = devdb.LocationVector(self.type, locs)
-    self.root.system.placedb.place(self, vec)
+    with self.root.system:
+      self.root.system.placedb.place(self, vec)
 
 
 class InstanceHierarchyRoot(ModuleInstance):
@@ -288,16 +697,18 @@ class InstanceHierarchyRoot(ModuleInstance):
   import pycde.system as cdesys
   from .module import Module
 
+  __slots__ = ["instance_name", "system"]
+
   def __init__(self, module: Module, instance_name: str, sys: cdesys.System):
     self.instance_name = instance_name
     self.system = sys
-    self.root = self
-    super().__init__(parent=self,
-                     instance_sym=None,
-                     inside_of=module,
-                     tgt_mod=module)
+    super().__init__(_InstanceNodes(self, module), 0)
     sys._op_cache.create_instance_hier_op(self)
 
+  @property
+  def inside_of(self) -> Module:
+    return self.tgt_mod
+
   @property
   def _dyn_inst(self) -> msft.InstanceHierarchyOp:
     """Returns the raw CIRCT op backing this Instance."""
@@ -0,0 +1,238 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Separate compilation of IP blocks. `export_ip` compiles a module (and
+everything under it) into a directory. `import_ip` turns said directory into an
+external module which other Systems can instantiate without generating or
+lowering the IP again. Its Verilog is copied into their output.
+`compile_streaming` uses the same mechanism to compile a design one subtree at
+a time."""
+
+from __future__ import annotations
+
+from .common import Clock, Input, Output
+from .module import Module, ModuleBuilder, ModuleLikeType
+from .circt import ir
+
+from dataclasses import dataclass, field
+import gc
+import json
+import os
+import pathlib
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+  from .system import System
+
+# The IP description file in an IP directory.
+IP_DESCRIPTION = "ip.json"
+# The file extensions which are linked into the Systems which use the IP.
+_HDL_SUFFIXES = [".sv", ".v", ".svh", ".vh"]
+
+
+@dataclass
+class PrebuiltIP:
+  """The contents of a compiled IP directory. Port types are MLIR type
+  strings. File paths are relative to 'directory'."""
+  name: str
+  directory: pathlib.Path
+  inputs: List[Dict[str, str]]
+  outputs: List[Dict[str, str]]
+  # The HDL sources.
+  files: List[str]
+  # The IR after lowering.
+  mlir: Optional[str] = None
+  # ESI service metadata and placements (if any).
+  services: Optional[str] = None
+  tcl: Optional[str] = None
+  metadata: Dict[str, object] = field(default_factory=dict)
+
+  @staticmethod
+  def load(directory: os.PathLike) -> PrebuiltIP:
+    directory = pathlib.Path(directory)
+    desc = json.loads((directory / IP_DESCRIPTION).read_text())
+    return PrebuiltIP(directory=directory, **desc)
+
+  def save(self):
+    desc = {
+        "name": self.name,
+        "inputs": self.inputs,
+        "outputs": self.outputs,
+        "files": self.files,
+        "mlir": self.mlir,
+        "services": self.services,
+        "tcl": self.tcl,
+        "metadata": self.metadata,
+    }
+    (self.directory / IP_DESCRIPTION).write_text(json.dumps(desc, indent=2))
+
+
+def export_ip(module: ModuleLikeType,
+              output_directory: os.PathLike,
+              name: Optional[str] = None) -> PrebuiltIP:
+  """Generate, lower, and emit 'module' in a System of its own (named 'name')
+  and save the results (the Verilog, the lowered IR, the port signature, and the
+  ESI and placement collateral) into 'output_directory' for use with
+  `import_ip`."""
+  from .system import System
+
+  if name is None:
+    name = module.__name__ + "_ip"
+  output_directory = pathlib.Path(output_directory)
+  sys = System([module], name=name, output_directory=str(output_directory))
+  sys.compile()
+
+  hw_dir = sys.hw_output_dir
+  files = sorted(
+      p.relative_to(output_directory).as_posix()
+      for p in hw_dir.rglob("*")
+      if p.is_file() and p.suffix in _HDL_SUFFIXES)
+
+  mlir_file = f"{name}.mlir"
+  with open(output_directory / mlir_file, "w") as f:
+    sys.mod.operation.print(file=f)
+
+  def collateral(path: pathlib.Path) -> Optional[str]:
+    if not path.exists():
+      return None
+    return path.relative_to(output_directory).as_posix()
+
+  builder = module._builder
+  ip = PrebuiltIP(
+      name=sys._op_cache.get_pyproxy_symbol(module),
+      directory=output_directory,
+      inputs=[{
+          "name": n,
+          "type": str(t),
+          "clock": idx in builder.clocks
+      } for idx, (n, t) in enumerate(builder.inputs)],
+      outputs=[{
+          "name": n,
+          "type": str(t)
+      } for n, t in builder.outputs],
+      files=files,
+      mlir=mlir_file,
+      services=collateral(hw_dir / "services.json"),
+      tcl=collateral(hw_dir / f"{name}.tcl"),
+  )
+  ip.save()
+  return ip
+
+
+def _linked_path(file: str) -> str:
+  """Where to link the IP file 'file' (relative to the IP directory) into a
+  System's hardware output directory: the same place, relative to the hardware
+  output directory ('hw', see `System.hw_output_dir`), it was exported to."""
+  path = pathlib.PurePosixPath(file)
+  if path.parts[:1] == ("hw",):
+    path = path.relative_to("hw")
+  return path.as_posix()
+
+
+class PrebuiltIPBuilder(ModuleBuilder):
+  """Instantiates a pre-built IP block as an external module and links its
+  Verilog into the System."""
+
+  def create_op(self, sys, symbol):
+    ip: PrebuiltIP = self.modcls._prebuilt_ip
+    sys._link_files({_linked_path(f): ip.directory / f for f in ip.files})
+    return super().create_op(sys, symbol)
+
+
+def import_ip(directory: os.PathLike) -> ModuleLikeType:
+  """Load an IP directory created by `export_ip`. Returns a Module subclass
+  which instantiates the IP as a black box. Its HDL files are copied into the
+  output of the Systems which use it, so they must not emit modules with the
+  same names."""
+  ip = PrebuiltIP.load(directory)
+
+  modattrs = {}
+  for port in ip.inputs:
+    if port["clock"]:
+      modattrs[port["name"]] = Clock()
+    else:
+      modattrs[port["name"]] = Input(ir.Type.parse(port["type"]))
+  for port in ip.outputs:
+    modattrs[port["name"]] = Output(ir.Type.parse(port["type"]))
+  modattrs["BuilderType"] = PrebuiltIPBuilder
+  modattrs["module_name"] = ip.name
+  modattrs["_prebuilt_ip"] = ip
+  return type(ip.name, (Module,), modattrs)
+
+
+# A module compiled by an earlier System: its Verilog name and the files to link
+# for it (see `System._link_files`).
+_PrebuiltModule = Tuple[str, Dict[str, pathlib.Path]]
+
+
+def compile_streaming(top: ModuleLikeType,
+                      subtrees: List[ModuleLikeType],
+                      output_directory: os.PathLike,
+                      name: str = "PyCDESystem",
+                      **system_kwargs) -> System:
+  """Compile the design under 'top' one subtree at a time so that only one
+  subtree's IR is in memory at once. Each module in 'subtrees' (in order, so
+  list inner subtrees first) is generated, lowered, and emitted by a System of
+  its own (named '<module>_subtree') into 'partitions/<module>' in
+  'output_directory', then freed. Every
+  module it generated is thereafter a black box: later subtrees and the final
+  System for 'top' instantiate it as an external module and link in the Verilog
+  which was already emitted. Peak memory scales with the largest subtree rather
+  than the whole design. 'system_kwargs' are passed through to each System.
+  Returns the (compiled) System for 'top'."""
+  from .system import System
+
+  output_directory = pathlib.Path(output_directory)
+  output_directory.mkdir(parents=True, exist_ok=True)
+  prebuilt: Dict[ModuleLikeType, _PrebuiltModule] = {}
+  for subtree in subtrees:
+    if subtree in prebuilt:
+      continue
+    sub_name = subtree.__name__
+    # The System's own Verilog file must not collide with the subtree's
+    # '<module>.sv'.
+    sub = System([subtree],
+                 name=f"{sub_name}_subtree",
+                 output_directory=str(output_directory / "partitions" /
+                                      sub_name),
+                 **system_kwargs)
+    sub._prebuilt_modules.update(prebuilt)
+    sub.compile()
+    prebuilt.update(_streamed_modules(sub, prebuilt))
+    # Drop the subtree's IR before starting on the next one.
+    del sub
+    gc.collect()
+
+  sys = System([top],
+               name=name,
+               output_directory=str(output_directory),
+               **system_kwargs)
+  sys._prebuilt_modules.update(prebuilt)
+  sys.compile()
+  return sys
+
+
+def _streamed_modules(
+    sys: System, prebuilt: Dict[ModuleLikeType, _PrebuiltModule]
+) -> Dict[ModuleLikeType, _PrebuiltModule]:
+  """The modules which 'sys' generated, each mapped to its Verilog name and
+  the HDL files needed to instantiate it (by path relative to the hardware
+  output directory). Since we don't track the hierarchy below each module,
+  that's all of the files 'sys' emitted or linked."""
+  files = {
+      p.relative_to(sys.hw_output_dir).as_posix(): p
+      for p in sorted(sys.hw_output_dir.rglob("*"))
+      if p.is_file() and p.suffix in _HDL_SUFFIXES
+  }
+  # Point at the original copies of the linked files so that a file is always
+  # linked from the same place.
+  files.update(sys._linked_files)
+
+  modules = {}
+  for builder, symbol in sys._op_cache.pyproxy_symbol_items():
+    if not isinstance(builder, ModuleBuilder) or len(builder.generators) == 0:
+      continue
+    if builder.modcls in prebuilt:
+      continue
+    modules[builder.modcls] = (symbol, files)
+  return modules
@@ -3,7 +3,7 @@
 #  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from __future__ import annotations
-from typing import List, Optional, Tuple, Union, Dict
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union, Dict
 from pycde.pycde_types import ClockType
 
 from pycde.support import _obj_to_value
@@ -18,12 +18,161 @@ from .circt.dialects import hw, msft
 from .circt.support import BackedgeBuilder, attribute_to_var
 
 import builtins
+from collections import OrderedDict
 from contextvars import ContextVar
 import inspect
 import sys
+import threading
+import weakref
+
+if TYPE_CHECKING:
+  from .partition import DesignPartition
+
+
+class ModuleCache:
+  """A memoization table for module parameterization function calls. Maps the
+  parameterization function AND the parameter values to the class which was
+  generated by a previous call. If 'maxsize' is set, the least recently used
+  entries are evicted once the table grows beyond it. Evicted parameterizations
+  get a new (and thus differently named) module if they are used again, so
+  'maxsize' should be larger than the number of distinct parameterizations used
+  in any one System."""
+
+  __slots__ = ["maxsize", "hits", "misses", "_entries", "__weakref__"]
+
+  def __init__(self, maxsize: Optional[int] = None):
+    self.maxsize = maxsize
+    self.hits = 0
+    self.misses = 0
+    self._entries: OrderedDict[Tuple, object] = OrderedDict()
+
+  def get(self, key: Tuple) -> Optional[object]:
+    """Lookup 'key', counting a hit or a miss. None if not found."""
+    cls = self._entries.get(key)
+    if cls is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self._entries.move_to_end(key)
+    return cls
+
+  def put(self, key: Tuple, cls: object):
+    self._entries[key] = cls
+    self._entries.move_to_end(key)
+    if self.maxsize is not None:
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def clear(self):
+    """Drop all the entries and reset the counters."""
+    self._entries.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __str__(self) -> str:
+    return (f"<ModuleCache hits: {self.hits} misses: {self.misses} "
+            f"size: {len(self)} maxsize: {self.maxsize}>")
+
+
+# The process-wide module cache. Used when the scope is "global" or when there
+# is no active System in "system" scope.
+_MODULE_CACHE = ModuleCache()
+# Per-context caches for "context" scope. Also used in "global" scope for
+# anything other than the default context since the cached classes hold types
+# (and thus cannot be shared) from the context they were created in.
+_CONTEXT_MODULE_CACHES: Dict[ir.Context, ModuleCache] = {}
+_CONTEXT_MODULE_CACHES_LOCK = threading.Lock()
+# The number of live Systems using each context other than the default one.
+# That context's cache is dropped when the last of them goes away.
+_CONTEXT_SYSTEM_COUNTS: Dict[ir.Context, int] = {}
+# The per-System caches for "system" scope, so their size can be configured.
+_SYSTEM_MODULE_CACHES: weakref.WeakSet = weakref.WeakSet()
+_module_cache_scope = "global"
+_MODULE_CACHE_SCOPES = ["global", "system", "context"]
+
+
+def configure_module_cache(scope: str = "global",
+                           maxsize: Optional[int] = None):
+  """Set how the module parameterization cache is scoped: one for the whole
+  process ("global"), one per `System` ("system") or one per MLIR context
+  ("context"). Parameterizations done outside of any System (e.g. to get the
+  top module) always go in the global cache (or, for contexts other than the
+  default one, that context's cache). 'maxsize' bounds the size of each
+  cache (None for unbounded). Applies to the existing caches as well."""
+  global _module_cache_scope
+  if scope not in _MODULE_CACHE_SCOPES:
+    raise ValueError(f"Module cache scope must be one of "
+                     f"{_MODULE_CACHE_SCOPES}, not '{scope}'")
+  _module_cache_scope = scope
+  with _CONTEXT_MODULE_CACHES_LOCK:
+    caches = ([_MODULE_CACHE] + list(_CONTEXT_MODULE_CACHES.values()) +
+              list(_SYSTEM_MODULE_CACHES))
+  for cache in caches:
+    cache.maxsize = maxsize
+
+
+def _system_module_cache() -> ModuleCache:
+  """Create a module cache for a System in "system" scope."""
+  cache = ModuleCache(_MODULE_CACHE.maxsize)
+  with _CONTEXT_MODULE_CACHES_LOCK:
+    _SYSTEM_MODULE_CACHES.add(cache)
+  return cache
+
+
+def _reset_module_caches(ctxt: Optional[ir.Context] = None):
+  """Drop the cached parameterizations for 'ctxt' (or all of them)."""
+  from pycde import DefaultContext
+  if ctxt is None:
+    with _CONTEXT_MODULE_CACHES_LOCK:
+      _CONTEXT_MODULE_CACHES.clear()
+  else:
+    _drop_context_module_cache(ctxt)
+  if ctxt is None or ctxt == DefaultContext:
+    _MODULE_CACHE.clear()
+
+
+def _drop_context_module_cache(ctxt: ir.Context):
+  """Drop the cache for a context other than the default one."""
+  with _CONTEXT_MODULE_CACHES_LOCK:
+    _CONTEXT_MODULE_CACHES.pop(ctxt, None)
+
+
+def _context_system_created(ctxt: ir.Context):
+  """Note that a System was created in 'ctxt'."""
+  with _CONTEXT_MODULE_CACHES_LOCK:
+    _CONTEXT_SYSTEM_COUNTS[ctxt] = _CONTEXT_SYSTEM_COUNTS.get(ctxt, 0) + 1
+
+
+def _context_system_released(ctxt: ir.Context):
+  """Note that a System in 'ctxt' went away. Drop the context's cache if it was
+  the last one."""
+  with _CONTEXT_MODULE_CACHES_LOCK:
+    count = _CONTEXT_SYSTEM_COUNTS.pop(ctxt) - 1
+    if count > 0:
+      _CONTEXT_SYSTEM_COUNTS[ctxt] = count
+    else:
+      _CONTEXT_MODULE_CACHES.pop(ctxt, None)
 
-# A memoization table for module parameterization function calls.
-_MODULE_CACHE: Dict[Tuple[builtins.function, ir.DictAttr], object] = {}
+
+def module_cache() -> ModuleCache:
+  """Get the module parameterization cache for the current scope."""
+  if _module_cache_scope == "system":
+    from .system import _current_system
+    sys = _current_system.get(None)
+    if sys is not None:
+      return sys._module_cache
+
+  from pycde import DefaultContext
+  ctxt = ir.Context.current
+  if _module_cache_scope != "context" and ctxt == DefaultContext:
+    return _MODULE_CACHE
+  with _CONTEXT_MODULE_CACHES_LOCK:
+    if ctxt not in _CONTEXT_MODULE_CACHES:
+      _CONTEXT_MODULE_CACHES[ctxt] = ModuleCache(_MODULE_CACHE.maxsize)
+    return _CONTEXT_MODULE_CACHES[ctxt]
 
 
 def _create_module_name(name: str, params: ir.DictAttr):
@@ -53,14 +202,34 @@ def _create_module_name(name: str, params: ir.DictAttr):
   return ret.strip("_")
 
 
+def _hashable_param(obj):
+  """Convert a parameter value to something hashable without going through MLIR
+  (which is comparatively slow). Values which `_obj_to_attribute` would convert
+  to the same attribute map to the same key."""
+  if obj is None or isinstance(obj, (bool, int, str)):
+    # Tag with the type so that 'True' and '1' don't collide.
+    return (obj.__class__, obj)
+  if isinstance(obj, ir.Type):
+    return ir.TypeAttr.get(obj)
+  if isinstance(obj, ir.Attribute):
+    return obj
+  if isinstance(obj, (list, tuple)):
+    return (list, tuple(_hashable_param(x) for x in obj))
+  if isinstance(obj, dict):
+    return (dict, tuple(sorted(
+        (n, _hashable_param(v)) for n, v in obj.items())))
+  if hasattr(obj, "__dict__"):
+    return (obj.__class__, _hashable_param(obj.__dict__))
+  # Let `_obj_to_attribute` produce the error.
+  return _obj_to_attribute(obj)
+
+
 def _get_module_cache_key(func,
-                          params) -> Tuple[builtins.function, ir.DictAttr]:
+                          params: Dict) -> Tuple[builtins.function, Tuple]:
   """The "module" cache is specifically for parameterized modules. It maps the
   module parameterization function AND parameter values to the class which was
   generated by a previous call to said module parameterization function."""
-  if not isinstance(params, ir.DictAttr):
-    params = _obj_to_attribute(params)
-  return (func, params)
+  return (func, _hashable_param(params))
 
 
 _current_block_context = ContextVar("current_block_context")
@@ -222,6 +391,10 @@ class ModuleLikeBuilderBase(_PyProxy):
       if attr_name.startswith("_"):
         continue
 
+      if isinstance(attr, Input) and attr_name == "partition":
+        # Would be shadowed by the `partition` argument to `Module.__init__`.
+        raise PortError(f"'{attr_name}' is reserved and cannot be used as an "
+                        "input port name")
       if isinstance(attr, Clock):
         clock_ports.add(len(input_ports))
         input_ports.append((attr_name, ir.IntegerType.get_signless(1)))
@@ -388,6 +561,11 @@ class ModuleBuilder(ModuleLikeBuilderBase):
           ip=sys._get_ip())
 
     # Modules without generators are implicitly considered to be external.
+    return self.create_extern_op(sys, symbol, self.name)
+
+  def create_extern_op(self, sys, symbol: str, verilog_name: str):
+    """Create an external module op for this module which refers to the
+    Verilog module 'verilog_name'."""
     if self.parameters is None:
       paramdecl_list = []
     else:
@@ -400,7 +578,7 @@ class ModuleBuilder(ModuleLikeBuilderBase):
         self.inputs,
         self.outputs,
         parameters=paramdecl_list,
-        attributes={"verilogName": ir.StringAttr.get(self.name)},
+        attributes={"verilogName": ir.StringAttr.get(verilog_name)},
         loc=self.loc,
         ip=sys._get_ip())
 
@@ -463,9 +641,15 @@ class ModuleBuilder(ModuleLikeBuilderBase):
     assert len(self.generators) == 1
     g: Generator = list(self.generators.values())[0]
 
-    entry_block = self.circt_mod.add_entry_block()
+    from .profiling import profile_generator
+    from .system import System
+
+    circt_mod = self.circt_mod
+    entry_block = circt_mod.add_entry_block()
     ports = self.generator_port_proxy(entry_block.arguments, self)
-    with self.GeneratorCtxt(self, ports, entry_block, g.loc):
+    ctxt = self.GeneratorCtxt(self, ports, entry_block, g.loc)
+    name = System.current()._op_cache.get_pyproxy_symbol(self) or self.name
+    with profile_generator(name, "module", circt_mod, ctxt.bb), ctxt:
       outputs = g.gen_func(ports)
       if outputs is not None:
         raise ValueError("Generators must not return a value")
@@ -491,10 +675,17 @@ class Module(metaclass=ModuleLikeType):
 
   BuilderType = ModuleBuilder
 
-  def __init__(self, instance_name: str = None, appid: AppID = None, **inputs):
+  def __init__(self,
+               instance_name: str = None,
+               appid: AppID = None,
+               partition: Optional[DesignPartition] = None,
+               **inputs):
     """Create an instance of this module. Instance namd and appid are optional.
     All inputs must be specified. If a signal has not been produced yet, use the
-    `Wire` construct and assign the signal to that wire later on."""
+    `Wire` construct and assign the signal to that wire later on. If
+    'partition' (see `System.create_partition`) is specified, the instance is
+    moved into that design partition during lowering. (So no input port may be
+    named 'partition'.)"""
 
     if instance_name is None:
       if hasattr(self, "instance_name"):
@@ -505,25 +696,104 @@ class Module(metaclass=ModuleLikeType):
     self.inst = self._builder.instantiate(self, instance_name, **inputs)
     if appid is not None:
       self.inst.operation.attributes[AppID.AttributeName] = appid._appid
+    if partition is not None:
+      self.inst.operation.attributes[partition.AttributeName] = partition.ref
 
   @classmethod
   def print(cls, out=sys.stdout):
     cls._builder.print(out)
 
 
+class HWParam:
+  """Stands in for a `modparams` argument which was declared as an HW
+  parameter. Use it to create a constant (e.g. `types.i8(param)`) inside the
+  generator. Said constant becomes a reference to the module's SystemVerilog
+  parameter, which each instance sets."""
+
+  __slots__ = ["name", "default"]
+
+  # Attributes on the placeholder constants which get replaced by parameter
+  # references after the modules are lowered to HW.
+  RefAttributeName = "pycde.param_ref"
+  DefaultAttributeName = "pycde.param_default"
+  # Attribute on instances specifying their parameter values.
+  InstanceValuesAttributeName = "pycde.hw_params"
+
+  def __init__(self, name: str, default: Optional[int] = None):
+    self.name = name
+    self.default = default
+
+  def materialize(self, type: ir.Type) -> Signal:
+    """Create the placeholder constant of type 'type'."""
+    from .dialects import hw
+    from .pycde_types import BitsType, Type
+    type = Type(type)
+    if not isinstance(type, BitsType):
+      raise TypeError(f"HW parameter '{self.name}' can only be used as a "
+                      f"signless bits value, not '{type}'")
+    with get_user_loc():
+      const = hw.ConstantOp(type, 0 if self.default is None else self.default)
+    attrs = const.value.owner.attributes
+    attrs[HWParam.RefAttributeName] = ir.StringAttr.get(self.name)
+    if self.default is not None:
+      attrs[HWParam.DefaultAttributeName] = ir.IntegerAttr.get(
+          ir.IntegerType.get_signless(64), self.default)
+    return const
+
+  def __repr__(self) -> str:
+    return f"HWParam({self.name})"
+
+
+class _HWParamBinding:
+  """What a `modparams` function with HW parameters returns: the module class
+  shared by all the HW parameter values along with the values to give the
+  instances created through it. Otherwise acts like the module class."""
+
+  __slots__ = ["module", "hw_param_values"]
+
+  def __init__(self, module: ModuleLikeType, hw_param_values: Dict[str, int]):
+    self.module = module
+    self.hw_param_values = hw_param_values
+
+  def __call__(self, *args, **kwargs):
+    inst = self.module(*args, **kwargs)
+    i64 = ir.IntegerType.get_signless(64)
+    inst.inst.operation.attributes[
+        HWParam.InstanceValuesAttributeName] = ir.DictAttr.get({
+            name: ir.IntegerAttr.get(i64, value)
+            for name, value in self.hw_param_values.items()
+        })
+    return inst
+
+  def __getattr__(self, name: str):
+    return getattr(self.module, name)
+
+
 class modparams:
   """Decorate a function to indicate that it is returning a Module which is
   parameterized by this function. Arguments to this class MUST be convertible to
   a recognizable constant. Ideally, they would be simple since (by default) they
   will be turned into strings and appended to the module name in the resulting
   RTL. Arguments with underscore prefixes are ignored and thus exempt from the
-  previous requirement."""
+  previous requirement.
+
+  Integer arguments listed in 'hw_params' (`@modparams(hw_params=["coeff"])`)
+  become SystemVerilog parameters instead: the function is only called once
+  (per value of the other arguments) with `HWParam` placeholders for them and
+  the instances pass the actual values. They can only be used as constant
+  values, not to determine types or the structure of the module."""
 
   func = None
 
   # When the decorator is attached, this runs.
-  def __init__(self, func: builtins.function):
-
+  def __init__(self,
+               func: builtins.function = None,
+               hw_params: Optional[List[str]] = None):
+    self.hw_params = [] if hw_params is None else list(hw_params)
+    if func is not None:
+      self._set_func(func)
+
+  def _set_func(self, func: builtins.function):
     # If it's a module parameterization function, inspect the arguments to
     # ensure sanity.
     self.func = func
@@ -533,36 +803,71 @@ class modparams:
         raise TypeError("Module parameter definitions cannot have **kwargs")
       if param.kind == param.VAR_POSITIONAL:
         raise TypeError("Module parameter definitions cannot have *args")
+    for name in self.hw_params:
+      if name not in self.sig.parameters:
+        raise TypeError(f"HW parameter '{name}' is not an argument of "
+                        f"'{func.__name__}'")
 
   # This function gets executed in two situations:
   #   - In the case of a module function parameterizer, it is called when the
   #   user wants to apply specific parameters to the module. In this case, we
   #   should call the function, wrap the returned module class, and return it.
-  #   The result is cached in _MODULE_CACHE.
+  #   The result is cached in the `module_cache()`.
   #   - A simple (non-parameterized) module has been wrapped and the user wants
   #   to construct one. Just forward to the module class' constructor.
   def __call__(self, *args, **kwargs):
-    assert self.func is not None
+    if self.func is None:
+      # Used as `@modparams(hw_params=...)`, so this is the decoration.
+      (func,) = args
+      self._set_func(func)
+      return self
+
     param_values = self.sig.bind(*args, **kwargs)
     param_values.apply_defaults()
 
+    # HW parameters are set per-instance rather than elaborated.
+    hw_param_values = {n: param_values.arguments[n] for n in self.hw_params}
+    for name, value in hw_param_values.items():
+      if not isinstance(value, int):
+        raise TypeError(f"HW parameter '{name}' must be an int, not "
+                        f"'{type(value).__name__}'")
+      default = self.sig.parameters[name].default
+      param_values.arguments[name] = HWParam(
+          name, None if default is inspect.Parameter.empty else default)
+    if len(self.hw_params) > 0:
+      args, kwargs = param_values.args, param_values.kwargs
+
     # Function arguments which start with '_' don't become parameters.
     params = {
-        n: v for n, v in param_values.arguments.items() if not n.startswith("_")
+        n: v
+        for n, v in param_values.arguments.items()
+        if not n.startswith("_") and n not in hw_param_values
     }
 
     # Check cache
+    cache = module_cache()
     cache_key = _get_module_cache_key(self.func, params)
-    if cache_key in _MODULE_CACHE:
-      return _MODULE_CACHE[cache_key]
+    cls = cache.get(cache_key)
+    if cls is None:
+      cls = self._elaborate(cache, cache_key, params, args, kwargs)
+    if len(self.hw_params) > 0:
+      return _HWParamBinding(cls, hw_param_values)
+    return cls
 
+  def _elaborate(self, cache: ModuleCache, cache_key: Tuple, params: Dict, args,
+                 kwargs):
+    """Call the parameterization function and cache the resulting class."""
+    param_attr = _obj_to_attribute(params)
     cls = self.func(*args, **kwargs)
     if not issubclass(cls, Module):
       raise ValueError("Parameterization function must return Module class")
 
     if len(cls._builder.generators) > 0:
-      cls._builder.parameters = cache_key[1]
-    _MODULE_CACHE[cache_key] = cls
+      cls._builder.parameters = param_attr
+    elif len(self.hw_params) > 0:
+      raise TypeError("HW parameters are only supported on modules with "
+                      "generators")
+    cache.put(cache_key, cls)
     return cls
 
 
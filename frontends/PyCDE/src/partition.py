@@ -0,0 +1,167 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Design partitions: groups of instances (anywhere in the hierarchy) which get
+moved into a module of their own so that downstream tools can synthesize and
+implement each partition out-of-context, in parallel, and reuse the results
+for partitions which didn't change."""
+
+from __future__ import annotations
+
+from .module import ModuleLikeType
+from .support import walk_operations
+from .circt import ir
+from .circt.dialects import hw, msft
+
+import hashlib
+import json
+import pathlib
+from typing import TYPE_CHECKING, Any, Dict, List, Set
+
+if TYPE_CHECKING:
+  from .system import System
+
+# The per-partition manifest in each bundle directory.
+PARTITION_MANIFEST = "partition.json"
+
+
+class DesignPartition:
+  """A design partition named 'name'. The instances tagged with it (via the
+  `partition` argument when instantiating a module) are moved into a module
+  called 'name' which is instantiated in 'parent'. Create with
+  `System.create_partition`."""
+
+  __slots__ = ["system", "name", "parent"]
+
+  # The instance attribute which tags an instance with its partition.
+  AttributeName = "targetDesignPartition"
+
+  def __init__(self, system: System, name: str, parent: ModuleLikeType):
+    self.system = system
+    self.name = name
+    self.parent = parent
+
+  @property
+  def _parent_symbol(self) -> str:
+    return self.system._op_cache.get_pyproxy_symbol(self.parent)
+
+  @property
+  def ref(self) -> ir.Attribute:
+    """The symbol reference with which instances are tagged."""
+    return ir.Attribute.parse(f"@{self._parent_symbol}::@{self.name}")
+
+  def _create_op(self):
+    """Create the `msft.partition` op in the parent module."""
+    parent_op = self.parent._builder.circt_mod
+    with ir.InsertionPoint.at_block_begin(parent_op.body.blocks[0]):
+      msft.DesignPartitionOp(ir.StringAttr.get(self.name),
+                             ir.StringAttr.get(self.name))
+
+  def __repr__(self) -> str:
+    return f"<DesignPartition {self.name} in {self.parent.__name__}>"
+
+
+def create_partition_ops(sys: System):
+  for part in sys._partitions.values():
+    part._create_op()
+
+
+def _submodules(sys: System) -> Dict[str, Set[str]]:
+  """Map each (lowered) module name to the modules it instantiates."""
+  children: Dict[str, Set[str]] = {}
+  for mod in sys.mod.body:
+    if not isinstance(mod, (hw.HWModuleOp, hw.HWModuleExternOp)):
+      continue
+    name = ir.StringAttr(mod.attributes["sym_name"]).value
+    children[name] = set(
+        ir.FlatSymbolRefAttr(op.attributes["moduleName"]).value
+        for op in walk_operations(mod)
+        if "moduleName" in op.attributes)
+  return children
+
+
+def _partition_tcl(sys: System, part: DesignPartition) -> List[str]:
+  """The placement lines of the System's TCL which target instances inside
+  'part', relative to the partition instance."""
+  tcl_path = sys.hw_output_dir / f"{sys.name}.tcl"
+  if not tcl_path.exists():
+    return []
+  prefix = f"$parent|{part.name}|"
+  return [
+      line.strip().replace(prefix, "$parent|")
+      for line in tcl_path.read_text().splitlines()
+      if prefix in line
+  ]
+
+
+def emit_partition_bundles(sys: System) -> Dict[str, Dict[str, Any]]:
+  """Write a bundle for each partition into 'partitions/<name>' in the output
+  directory: the Verilog for the partition module and everything under it, the
+  placements inside of it (as a TCL proc named '<name>_config'), and a manifest
+  listing the files, their hashes, and a digest of the whole bundle so that
+  flows can skip partitions whose digest didn't change. Returns the
+  manifests."""
+  from .system import _module_decl_re, _update_output_file
+
+  module_files: Dict[str, pathlib.Path] = {}
+  for path in sorted(sys.hw_output_dir.rglob("*")):
+    if path.suffix not in (".sv", ".v"):
+      continue
+    for mod_name in _module_decl_re.findall(path.read_bytes()):
+      module_files[mod_name.decode()] = path
+  children = _submodules(sys)
+
+  manifests = {}
+  for part in sys._partitions.values():
+    bundle_dir = sys.output_directory / "partitions" / part.name
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+    modules: List[str] = []
+    worklist = [part.name]
+    while worklist:
+      mod_name = worklist.pop()
+      if mod_name in modules:
+        continue
+      modules.append(mod_name)
+      worklist.extend(sorted(children.get(mod_name, [])))
+
+    sources = sorted(set(module_files[m] for m in modules if m in module_files))
+    files = {
+        src.name: _update_output_file(src, bundle_dir / "hw" / src.name)
+        for src in sources
+    }
+
+    tcl_lines = _partition_tcl(sys, part)
+    tcl_file = None
+    if len(tcl_lines) > 0:
+      tcl_file = f"{part.name}.tcl"
+      tcl = "".join(f"  {line}\n" for line in tcl_lines)
+      (bundle_dir / tcl_file
+      ).write_text(f"proc {part.name}_config {{ parent }} {{\n{tcl}}}\n")
+
+    digest = hashlib.sha256()
+    for rel, entry in sorted(files.items()):
+      digest.update(f"{rel}:{entry['sha256']}\n".encode())
+    if tcl_file is not None:
+      digest.update((bundle_dir / tcl_file).read_bytes())
+    manifest = {
+        "name": part.name,
+        "top": part.name,
+        "parent": part._parent_symbol,
+        "modules": sorted(modules),
+        "files": {
+            f"hw/{rel}": entry for rel, entry in files.items()
+        },
+        "tcl": tcl_file,
+        "sha256": digest.hexdigest(),
+    }
+    manifest_path = bundle_dir / PARTITION_MANIFEST
+    old_digest = None
+    if manifest_path.exists():
+      try:
+        old_digest = json.loads(manifest_path.read_text())["sha256"]
+      except (ValueError, KeyError):
+        pass
+    manifest["changed"] = old_digest != manifest["sha256"]
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    manifests[part.name] = manifest
+  return manifests
@@ -0,0 +1,250 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Opt-in profiling of generators. Run the generators (e.g. `System.generate`
+or `System.compile`) inside of a `GeneratorProfiler` to find out which ones are
+responsible for long generation times:
+
+  with GeneratorProfiler() as prof:
+    system.generate()
+  print(prof.table())
+  prof.write_collapsed("generators.folded")
+
+This module must not import the rest of PyCDE at the top level since it is used
+by the lowest level modules."""
+
+from __future__ import annotations
+
+from collections import Counter
+import contextlib
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import functools
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+_current_profiler: ContextVar[Optional[GeneratorProfiler]] = ContextVar(
+    "current_profiler", default=None)
+_current_record: ContextVar[Optional[GeneratorRecord]] = ContextVar(
+    "current_generator_record", default=None)
+
+
+@dataclass
+class GeneratorRecord:
+  """The measurements from one generator run. Times are in seconds. The
+  allocation count is the net number of memory blocks the generator allocated
+  (and didn't free). 'alloc_bytes' is only recorded while `tracemalloc` is
+  tracing."""
+  name: str
+  kind: str
+  # The names of the enclosing generators' records, outermost first.
+  stack: List[str]
+  wall_time: float = 0.0
+  ops: Counter = field(default_factory=Counter)
+  backedges: int = 0
+  allocations: int = 0
+  alloc_bytes: Optional[int] = None
+  # Time spent in helper categories (e.g. 'get_user_loc', 'type_conversion').
+  helper_times: Dict[str, float] = field(default_factory=dict)
+  _helper_depth: Dict[str, int] = field(default_factory=dict, repr=False)
+
+  @property
+  def num_ops(self) -> int:
+    return sum(self.ops.values())
+
+  @property
+  def loc_time(self) -> float:
+    return self.helper_times.get("get_user_loc", 0.0)
+
+  @property
+  def type_time(self) -> float:
+    return self.helper_times.get("type_conversion", 0.0)
+
+
+class GeneratorProfiler:
+  """Records a `GeneratorRecord` for each generator which runs (in this
+  thread) while the profiler is entered."""
+
+  # The columns `table` can sort by.
+  SORT_KEYS = [
+      "wall_time", "num_ops", "backedges", "allocations", "loc_time",
+      "type_time", "name"
+  ]
+
+  def __init__(self):
+    self.records: List[GeneratorRecord] = []
+    self._tokens = []
+
+  def __enter__(self):
+    self._tokens.append(_current_profiler.set(self))
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    _current_profiler.reset(self._tokens.pop())
+
+  def table(self,
+            sort_by: str = "wall_time",
+            limit: Optional[int] = None,
+            top_ops: int = 3) -> str:
+    """A text table with one row per generator run, sorted by 'sort_by' (one
+    of `SORT_KEYS`, descending except for 'name'). 'top_ops' of the most common
+    op kinds are listed for each row."""
+    if sort_by not in GeneratorProfiler.SORT_KEYS:
+      raise ValueError(f"Cannot sort by '{sort_by}'. Expected one of: "
+                       f"{', '.join(GeneratorProfiler.SORT_KEYS)}")
+    records = sorted(self.records,
+                     key=lambda r: getattr(r, sort_by),
+                     reverse=sort_by != "name")
+    if limit is not None:
+      records = records[:limit]
+
+    header = [
+        "generator", "kind", "wall ms", "ops", "backedges", "allocs", "loc ms",
+        "type ms", "top ops"
+    ]
+    rows = [header]
+    for r in records:
+      rows.append([
+          r.name, r.kind, f"{r.wall_time * 1000:.2f}",
+          str(r.num_ops),
+          str(r.backedges),
+          str(r.allocations), f"{r.loc_time * 1000:.2f}",
+          f"{r.type_time * 1000:.2f}", ", ".join(
+              f"{name}:{count}" for name, count in r.ops.most_common(top_ops))
+      ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = []
+    for row in rows:
+      cells = [
+          cell.ljust(w) if i in (0, 1, len(header) - 1) else cell.rjust(w)
+          for i, (cell, w) in enumerate(zip(row, widths))
+      ]
+      lines.append("  ".join(cells).rstrip())
+    return "\n".join(lines)
+
+  def collapsed(self) -> List[str]:
+    """Collapsed stack lines ('frame;frame;frame value', with the value in
+    microseconds) as consumed by flamegraph.pl, speedscope, etc. The time each
+    generator spent in the helper categories is split out into child frames."""
+    totals: Counter = Counter()
+    for r in self.records:
+      frames = ["generate"] + r.stack + [r.name]
+      helpers = sum(r.helper_times.values())
+      for category, t in r.helper_times.items():
+        totals[";".join(frames + [category])] += t
+      totals[";".join(frames)] += max(r.wall_time - helpers, 0.0)
+    # Nested generators are accounted for in their own records, so don't count
+    # their time in their parents' self time.
+    for r in self.records:
+      if len(r.stack) > 0:
+        parent = ";".join(["generate"] + r.stack)
+        totals[parent] = max(totals[parent] - r.wall_time, 0.0)
+    return [
+        f"{stack} {int(round(t * 1e6))}" for stack, t in sorted(totals.items())
+    ]
+
+  def write_collapsed(self, path: os.PathLike):
+    with open(path, "w") as f:
+      for line in self.collapsed():
+        f.write(line + "\n")
+
+
+def _direct_ops(op) -> List:
+  """The operations directly (not transitively) inside of 'op'."""
+  return [
+      inner.operation
+      for region in op.operation.regions
+      for block in region.blocks
+      for inner in block
+  ]
+
+
+def _count_new_ops(scope_op, before: List) -> Counter:
+  """Count the ops in 'scope_op' (at any depth) which weren't directly inside
+  of it when 'before' was taken. Only walks the new ops."""
+  from .support import walk_operations
+  # The 'before' list keeps the ops alive, so the ops in it are the same Python
+  # objects as the ones `_direct_ops` returns.
+  old = set(id(op) for op in before)
+  counts: Counter = Counter()
+  for op in _direct_ops(scope_op):
+    if id(op) in old:
+      continue
+    counts[op.name] += 1
+    counts.update(inner.operation.name for inner in walk_operations(op))
+  return counts
+
+
+@contextlib.contextmanager
+def profile_generator(name: str, kind: str, scope_op, backedge_builder):
+  """Measure a generator run named 'name' if a profiler is active. 'scope_op'
+  is the op in which the generator creates its ops (e.g. the module being
+  generated) and 'backedge_builder' is the generator's backedge builder. Only
+  the ops the generator adds to 'scope_op' are counted."""
+  profiler = _current_profiler.get()
+  if profiler is None:
+    yield
+    return
+
+  parent = _current_record.get()
+  stack = [] if parent is None else parent.stack + [parent.name]
+  record = GeneratorRecord(name=name, kind=kind, stack=stack)
+  ops_before = _direct_ops(scope_op)
+
+  # Count the backedges as they're created.
+  create = backedge_builder._create
+
+  def counting_create(*args, **kwargs):
+    record.backedges += 1
+    return create(*args, **kwargs)
+
+  backedge_builder._create = counting_create
+
+  token = _current_record.set(record)
+  tracing = tracemalloc.is_tracing()
+  bytes_before = tracemalloc.get_traced_memory()[0] if tracing else None
+  blocks_before = sys.getallocatedblocks()
+  start = time.perf_counter()
+  try:
+    yield record
+  finally:
+    record.wall_time = time.perf_counter() - start
+    record.allocations = sys.getallocatedblocks() - blocks_before
+    if tracing:
+      record.alloc_bytes = tracemalloc.get_traced_memory()[0] - bytes_before
+    _current_record.reset(token)
+    del backedge_builder._create
+    record.ops = _count_new_ops(scope_op, ops_before)
+    profiler.records.append(record)
+
+
+def timed(category: str) -> Callable:
+  """Decorator which adds the time spent in the decorated function to the
+  'category' helper time of the generator (if any) being profiled. Recursive
+  calls are only counted once."""
+
+  def decorator(func):
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      record = _current_record.get()
+      if record is None:
+        return func(*args, **kwargs)
+      depth = record._helper_depth.get(category, 0)
+      record._helper_depth[category] = depth + 1
+      start = time.perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        record._helper_depth[category] = depth
+        if depth == 0:
+          record.helper_times[category] = (
+              record.helper_times.get(category, 0.0) + time.perf_counter() -
+              start)
+
+    return wrapper
+
+  return decorator
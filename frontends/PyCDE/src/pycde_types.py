@@ -9,8 +9,9 @@ from .value import (BitsSignal, ChannelValue, ClockSignal, ListValue, SIntValue,
 
 from .circt import ir, support
 from .circt.dialects import esi, hw, sv
+from .profiling import timed
 
-from typing import Union
+from typing import Dict, Optional, Union
 
 
 class _Types:
@@ -19,7 +20,23 @@ class _Types:
   TYPE_SCOPE = "pycde"
 
   def __init__(self):
-    self.registered_aliases = OrderedDict()
+    # Type aliases are registered per MLIR context.
+    self._registered_aliases: Dict[ir.Context, OrderedDict] = {}
+
+  @property
+  def registered_aliases(self) -> OrderedDict:
+    """The aliases registered in the current context."""
+    return self._aliases_in(ir.Context.current)
+
+  def _aliases_in(self, ctxt: ir.Context) -> OrderedDict:
+    return self._registered_aliases.setdefault(ctxt, OrderedDict())
+
+  def _reset(self, ctxt: Optional[ir.Context] = None):
+    """Forget the aliases registered in 'ctxt' (or in all contexts)."""
+    if ctxt is None:
+      self._registered_aliases.clear()
+    else:
+      self._registered_aliases.pop(ctxt, None)
 
   def __getattr__(self, name: str) -> ir.Type:
     return self.wrap(ir.Type.parse(name))
@@ -68,7 +85,8 @@ class _Types:
     return alias
 
   def declare_types(self, mod):
-    if not self.registered_aliases:
+    registered_aliases = self._aliases_in(mod.context)
+    if not registered_aliases:
       return
 
     type_scopes = list()
@@ -98,7 +116,7 @@ class _Types:
                       symbols=ir.ArrayAttr.get([]))
 
     with ir.InsertionPoint(type_scope.body):
-      for (name, type) in self.registered_aliases.items():
+      for (name, type) in registered_aliases.items():
         declared_aliases = [
             op for op in type_scope.body.operations
             if isinstance(op, hw.TypedeclOp) and op.sym_name.value == name
@@ -141,6 +159,7 @@ class PyCDEType(ir.Type):
     return UntypedSignal
 
 
+@timed("type_conversion")
 def Type(type: Union[ir.Type, PyCDEType]):
   if isinstance(type, PyCDEType):
     return type
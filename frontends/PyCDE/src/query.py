@@ -0,0 +1,234 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Select instances in an instance hierarchy by path pattern. For instance:
+
+  system.query("mid/*/pe[3..7]/reg_*", kind="seq.compreg")
+
+A pattern is a '/' separated list of segments, relative to the instance the
+query starts from. Each segment is one of:
+
+  - An instance name glob (e.g. 'reg_*', 'pe?'), matched per `fnmatch`.
+  - An AppID selector: 'name[idx]', 'name[lo..hi]' (inclusive) or 'name[*]'.
+    The name may also be a glob. As with the `inst.name[idx]` accessors, only
+    the AppID names the instance has accessors for are matched, and they're
+    resolved through child instances (see `_InstanceNodes.appid_index`), so the
+    matches may be more than one level down.
+  - '**', which matches zero or more levels of the hierarchy.
+
+Brackets holding anything other than an index, range or '*' are glob character
+classes, e.g. 'pe_[ab]'.
+
+Queries run over the compact node arrays which back the instance hierarchy
+(`_InstanceNodes`) and only the results are turned into `Instance` objects.
+Since every instance of a module has the same children, a name segment is
+matched once per distinct module rather than once per instance."""
+
+from __future__ import annotations
+
+import fnmatch
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+  from .instance import (Instance, ModuleInstance, _InstanceNodes,
+                         _ModuleChildren)
+
+_APPID_SEGMENT = re.compile(
+    r"^(?P<name>[^\[\]]+)\[(?:(?P<any>\*)|(?P<lo>\d+)(?:\.\.(?P<hi>\d+))?)\]$")
+_GLOB_CHARS = set("*?[")
+
+
+class _Segment:
+  """One parsed segment of a query pattern."""
+
+  __slots__ = ["text", "is_any_depth", "name", "is_glob", "appid_range"]
+
+  def __init__(self, text: str):
+    if text == "":
+      raise ValueError("Empty segment in instance query")
+    self.text = text
+    self.is_any_depth = text == "**"
+    self.appid_range: Optional[Tuple[int, int]] = None
+    m = _APPID_SEGMENT.match(text)
+    if m is not None:
+      self.name = m.group("name")
+      if m.group("any") is not None:
+        self.appid_range = (0, None)
+      else:
+        lo = int(m.group("lo"))
+        hi = lo if m.group("hi") is None else int(m.group("hi"))
+        self.appid_range = (lo, hi)
+    else:
+      self.name = text
+    self.is_glob = any(c in _GLOB_CHARS for c in self.name)
+
+  def match_slots(self, children: _ModuleChildren) -> List[int]:
+    """The slots in 'children' which this (name) segment matches."""
+    if not self.is_glob:
+      slot = children.by_name.get(self.name)
+      return [] if slot is None else [slot]
+    return [
+        slot for slot, name in enumerate(children.names)
+        if fnmatch.fnmatchcase(name, self.name)
+    ]
+
+  def match_appids(self, nodes: _InstanceNodes, node: int) -> List[int]:
+    """The nodes which this (AppID) segment matches below 'node', in
+    preorder."""
+    children = nodes.children(node)
+    if children is None:
+      return []
+    if self.is_glob:
+      names = [
+          name for name in children.appid_names
+          if fnmatch.fnmatchcase(name, self.name)
+      ]
+    else:
+      names = [self.name] if self.name in children.appid_names else []
+    index = nodes.appid_index(node)
+    lo, hi = self.appid_range
+    found = [
+        inst_node for name in names if name in index
+        for appid_index, inst_node in index[name].entries
+        if appid_index >= lo and (hi is None or appid_index <= hi)
+    ]
+    if len(names) > 1:
+      found.sort(key=lambda n: _hierarchy_key(nodes, n))
+    return found
+
+
+def _descendants(nodes: _InstanceNodes, node: int) -> List[int]:
+  """'node' and all of its descendants, in preorder."""
+  found = []
+  stack = [node]
+  while stack:
+    n = stack.pop()
+    found.append(n)
+    stack.extend(reversed(nodes.child_nodes(n)))
+  return found
+
+
+def _hierarchy_key(nodes: _InstanceNodes, node: int) -> Tuple[int, ...]:
+  """Sorting by this puts nodes in preorder."""
+  return tuple(nodes.slot[n] for n in nodes.path_nodes(node))
+
+
+def select(nodes: _InstanceNodes,
+           pattern: str,
+           origin: int = 0,
+           module=None,
+           kind: Optional[str] = None,
+           appid=None) -> List[int]:
+  """The ids of the nodes matching 'pattern' (relative to the 'origin' node)
+  and the filters, in preorder. See `query` for the filters."""
+  segments = [_Segment(s) for s in pattern.split("/")] if pattern else []
+  matched = [origin]
+  for segment in segments:
+    if segment.is_any_depth:
+      expanded = set()
+      for node in matched:
+        if node not in expanded:
+          expanded.update(_descendants(nodes, node))
+      matched = list(expanded)
+      continue
+    if segment.appid_range is not None:
+      next_matched = []
+      for node in matched:
+        next_matched.extend(segment.match_appids(nodes, node))
+      matched = next_matched
+      continue
+
+    # Match each module's children once.
+    slot_cache: Dict[int, List[int]] = {}
+    next_matched = []
+    for node in matched:
+      children = nodes.children(node)
+      if children is None:
+        continue
+      key = nodes.module[node]
+      if key not in slot_cache:
+        slot_cache[key] = segment.match_slots(children)
+      if len(slot_cache[key]) > 0:
+        child_nodes = nodes.child_nodes(node)
+        next_matched.extend(child_nodes[slot] for slot in slot_cache[key])
+    matched = next_matched
+
+  keep = _filter(nodes, module, kind, appid)
+  if keep is not None:
+    matched = [n for n in matched if keep(n)]
+  if any(s.is_any_depth for s in segments):
+    matched.sort(key=lambda n: _hierarchy_key(nodes, n))
+  return matched
+
+
+def _filter(nodes: _InstanceNodes, module, kind, appid):
+  """Build a predicate on node ids for the query filters. None if there aren't
+  any."""
+  if module is None and kind is None and appid is None:
+    return None
+
+  from .module import AppID
+  if module is not None and not isinstance(module, str):
+    # Accept either a module class or its builder.
+    module = getattr(module, "_builder", module)
+  if isinstance(appid, AppID):
+    appid = (appid.name, appid.index)
+
+  def entry_matches(children, slot: int) -> bool:
+    if module is not None:
+      if isinstance(module, str):
+        mod_sym = children.module_syms[slot]
+        if mod_sym is None or not fnmatch.fnmatchcase(mod_sym, module):
+          return False
+      elif children.modules[slot] is not module:
+        return False
+    if kind is not None and not fnmatch.fnmatchcase(children.kinds[slot], kind):
+      return False
+    if appid is not None:
+      node_appid = children.appids[slot]
+      if node_appid is None:
+        return False
+      if isinstance(appid, str):
+        if not fnmatch.fnmatchcase(node_appid[0], appid):
+          return False
+      elif node_appid != appid:
+        return False
+    return True
+
+  root = nodes.root
+  # As with segments, filter each module's children once.
+  cache: Dict[Tuple[int, int], bool] = {}
+
+  def keep(node: int) -> bool:
+    parent = nodes.parent[node]
+    if parent < 0:
+      # The root is only selected by the module filter.
+      return kind is None and appid is None and (
+          module is None or module is root.tgt_mod or
+          isinstance(module, str) and fnmatch.fnmatchcase(
+              root._op_cache.get_pyproxy_symbol(root.tgt_mod), module))
+    key = (nodes.module[parent], nodes.slot[node])
+    if key not in cache:
+      cache[key] = entry_matches(nodes.children(parent), nodes.slot[node])
+    return cache[key]
+
+  return keep
+
+
+def query(origin: ModuleInstance,
+          pattern: str,
+          module=None,
+          kind: Optional[str] = None,
+          appid: Union[None, str, object] = None) -> List[Instance]:
+  """The instances matching 'pattern' relative to 'origin', further filtered
+  by:
+
+    - module: the module class instantiated (or its symbol, as a glob).
+    - kind: the op name (as a glob), e.g. 'msft.instance' or 'seq.compreg'.
+    - appid: an `AppID` or an AppID name (as a glob)."""
+  nodes = origin._nodes
+  return [
+      nodes.view(n) for n in select(
+          nodes, pattern, origin._node, module=module, kind=kind, appid=appid)
+  ]
@@ -0,0 +1,158 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""IR size statistics for the modules in a System. See `System.stats` and
+`System.stats_history`."""
+
+from __future__ import annotations
+
+from .support import walk_operations
+from .circt import ir, support
+from .circt.dialects import hw, msft
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+# Ops whose results are registers.
+_REGISTER_OPS = {"seq.compreg", "seq.firreg", "seq.compreg.ce", "sv.reg"}
+
+
+@dataclass
+class ModuleStats:
+  """The size of one module. 'asm_bytes' (the size of the module's printed IR)
+  stands in for the memory the module uses since MLIR doesn't expose the
+  latter; the two grow together."""
+  ops: Counter = field(default_factory=Counter)
+  instances: int = 0
+  register_bits: int = 0
+  ssa_values: int = 0
+  asm_bytes: int = 0
+
+  @property
+  def num_ops(self) -> int:
+    return sum(self.ops.values())
+
+  @property
+  def ops_by_dialect(self) -> Counter:
+    dialects = Counter()
+    for name, count in self.ops.items():
+      dialects[name.split(".", 1)[0]] += count
+    return dialects
+
+
+@dataclass
+class PhaseStats:
+  """The module statistics after a pipeline phase along with the peak resident
+  set size of the process (in KiB, None if unavailable) at that point."""
+  phase: str
+  modules: Dict[str, ModuleStats]
+  peak_rss_kb: Optional[int]
+
+  @property
+  def total(self) -> ModuleStats:
+    return sum_stats(self.modules.values())
+
+
+class _ByteCounter:
+  """A file-like object which only counts what's written to it."""
+
+  def __init__(self):
+    self.count = 0
+
+  def write(self, s):
+    self.count += len(s)
+
+
+def _register_bits(op: ir.OpView) -> int:
+  bits = 0
+  for result in op.results:
+    type = support.type_to_pytype(result.type)
+    if isinstance(type, hw.InOutType):
+      type = type.element_type
+    bits += hw.get_bitwidth(type)
+  return bits
+
+
+def module_stats(mod: ir.OpView) -> ModuleStats:
+  """Compute the statistics for one module op."""
+  stats = ModuleStats()
+  for region in mod.operation.regions:
+    for block in region.blocks:
+      stats.ssa_values += len(block.arguments)
+  for op in walk_operations(mod):
+    name = op.operation.name
+    stats.ops[name] += 1
+    stats.ssa_values += len(op.results)
+    if "moduleName" in op.attributes:
+      stats.instances += 1
+    if name in _REGISTER_OPS:
+      stats.register_bits += _register_bits(op)
+    for region in op.operation.regions:
+      for block in region.blocks:
+        stats.ssa_values += len(block.arguments)
+  counter = _ByteCounter()
+  mod.operation.print(file=counter)
+  stats.asm_bytes = counter.count
+  return stats
+
+
+def collect_stats(top: ir.Module) -> Dict[str, ModuleStats]:
+  """Statistics for each (non-external) module in 'top', by symbol."""
+  stats = {}
+  for op in top.body:
+    if not isinstance(op, (msft.MSFTModuleOp, hw.HWModuleOp)):
+      continue
+    sym = ir.StringAttr(op.attributes["sym_name"]).value
+    stats[sym] = module_stats(op)
+  return stats
+
+
+def sum_stats(stats) -> ModuleStats:
+  total = ModuleStats()
+  for s in stats:
+    total.ops.update(s.ops)
+    total.instances += s.instances
+    total.register_bits += s.register_bits
+    total.ssa_values += s.ssa_values
+    total.asm_bytes += s.asm_bytes
+  return total
+
+
+def peak_rss_kb() -> Optional[int]:
+  if resource is None:
+    return None
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def format_stats(stats: Dict[str, ModuleStats],
+                 sort_by: str = "num_ops",
+                 limit: Optional[int] = None) -> str:
+  """A text table of 'stats' with the biggest modules (by 'sort_by') first."""
+  rows = sorted(stats.items(),
+                key=lambda item: getattr(item[1], sort_by),
+                reverse=True)
+  if limit is not None:
+    rows = rows[:limit]
+  table: List[List[str]] = [[
+      "module", "ops", "instances", "reg bits", "values", "asm bytes"
+  ]]
+  for sym, s in rows:
+    table.append([
+        sym,
+        str(s.num_ops),
+        str(s.instances),
+        str(s.register_bits),
+        str(s.ssa_values),
+        str(s.asm_bytes)
+    ])
+  widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+  return "\n".join("  ".join(
+      cell.ljust(w) if i == 0 else cell.rjust(w)
+      for i, (cell, w) in enumerate(zip(row, widths)))
+                   for row in table)
@@ -1,5 +1,6 @@
 from .circt import support
 from .circt import ir
+from .profiling import timed
 
 import os
 
@@ -41,6 +42,7 @@ _local_files = set([os.path.join(__dir__, x) for x in os.listdir(__dir__)])
 _hidden_filenames = set(["functools.py"])
 
 
+@timed("get_user_loc")
 def get_user_loc() -> ir.Location:
   import traceback
   stack = reversed(traceback.extract_stack())
@@ -73,6 +75,7 @@ class OpOperandConnect(support.OpOperand):
     support.connect(self, val)
 
 
+@timed("type_conversion")
 def _obj_to_value(x, type, result_type=None):
   """Convert a python object to a CIRCT value, given the CIRCT type."""
   if x is None:
@@ -86,6 +89,10 @@ def _obj_to_value(x, type, result_type=None):
   if isinstance(x, Signal):
     return x
 
+  from .module import HWParam
+  if isinstance(x, HWParam):
+    return x.materialize(type)
+
   type = Type(type)
   if isinstance(type, TypeAliasType):
     return _obj_to_value(x, type.inner_type, type)
@@ -182,6 +189,16 @@ def create_type_string(ty):
   return str(ty)
 
 
+def walk_operations(op):
+  """Pre-order walk of all the operations nested (at any depth) inside of 'op'.
+  Does not include 'op' itself."""
+  for region in op.operation.regions:
+    for block in region.blocks:
+      for inner in block:
+        yield inner
+        yield from walk_operations(inner)
+
+
 def attributes_of_type(o, T):
   """Filter the attributes of an object 'o' to only those of type 'T'."""
   return {a: getattr(o, a) for a in dir(o) if isinstance(getattr(o, a), T)}
@@ -0,0 +1,178 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from __future__ import annotations
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+import itertools
+import multiprocessing
+import os
+import pathlib
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+
+@dataclass
+class SweepResult:
+  """Metrics collected while building one point of a parameter sweep. Times are
+  in seconds. If the build failed, 'error' contains the formatted exception and
+  the metrics after the failure are left at zero."""
+  index: int
+  params: Dict[str, Any]
+  output_directory: str
+  generate_time: float = 0.0
+  passes_time: float = 0.0
+  emit_time: float = 0.0
+  package_time: float = 0.0
+  op_counts: Dict[str, int] = field(default_factory=dict)
+  error: Optional[str] = None
+
+  @property
+  def num_ops(self) -> int:
+    """Total number of ops after generation."""
+    return sum(self.op_counts.values())
+
+  @property
+  def total_time(self) -> float:
+    return (self.generate_time + self.passes_time + self.emit_time +
+            self.package_time)
+
+
+class SweepTable(list):
+  """A list of `SweepResult`s (in parameter grid order) which knows how to
+  print itself as a table."""
+
+  COLUMNS = [
+      "index", "params", "generate_time", "passes_time", "emit_time",
+      "package_time", "num_ops", "error"
+  ]
+
+  def rows(self) -> List[List[str]]:
+
+    def fmt(value):
+      if isinstance(value, float):
+        return f"{value:.3f}"
+      if value is None:
+        return ""
+      if isinstance(value, str):
+        # Only the last line of a traceback is useful in a table.
+        return value.strip().split("\n")[-1]
+      return str(value)
+
+    return [[fmt(getattr(r, col)) for col in SweepTable.COLUMNS] for r in self]
+
+  def to_csv(self, path: os.PathLike):
+    import csv
+    with open(path, "w", newline="") as f:
+      writer = csv.writer(f)
+      writer.writerow(SweepTable.COLUMNS)
+      writer.writerows(self.rows())
+
+  def __str__(self) -> str:
+    rows = [SweepTable.COLUMNS] + self.rows()
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join("  ".join(c.ljust(w)
+                               for c, w in zip(row, widths)).rstrip()
+                     for row in rows)
+
+
+def _grid_points(param_grid: Union[Dict[str, Iterable], Iterable[Dict[str,
+                                                                      Any]]]):
+  """Expand a dict of parameter name to values into the cartesian product of
+  the values. A list of dicts is taken to be an explicit list of points."""
+  if isinstance(param_grid, dict):
+    names = list(param_grid.keys())
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*param_grid.values())
+    ]
+  return [dict(point) for point in param_grid]
+
+
+def _count_ops(sys) -> Dict[str, int]:
+  """Count the ops in 'sys' by op name."""
+  from .support import walk_operations
+  counts: Dict[str, int] = {}
+  for op in walk_operations(sys.mod.operation):
+    name = op.operation.name
+    counts[name] = counts.get(name, 0) + 1
+  return counts
+
+
+def _build_point(build_fn: Callable, index: int, params: Dict[str,
+                                                              Any], name: str,
+                 output_directory: str, package: bool) -> SweepResult:
+  """Build, compile, and (optionally) package one point of the sweep. Runs in a
+  worker process."""
+  from .system import System
+
+  result = SweepResult(index, params, output_directory)
+  try:
+    start = time.perf_counter()
+    tops = build_fn(**params)
+    sys = System(tops, name=name, output_directory=output_directory)
+    sys.generate()
+    result.generate_time = time.perf_counter() - start
+    result.op_counts = _count_ops(sys)
+
+    start = time.perf_counter()
+    sys.run_passes()
+    result.passes_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sys.emit_outputs()
+    result.emit_time = time.perf_counter() - start
+
+    if package:
+      start = time.perf_counter()
+      sys.package()
+      result.package_time = time.perf_counter() - start
+  except Exception:
+    result.error = traceback.format_exc()
+  return result
+
+
+def sweep(build_fn: Callable,
+          param_grid: Union[Dict[str, Iterable], Iterable[Dict[str, Any]]],
+          workers: Optional[int] = None,
+          output_directory: Optional[os.PathLike] = None,
+          name: str = "PyCDESweep",
+          package: bool = True) -> SweepTable:
+  """Build one `System` per point in 'param_grid' and return a table of metrics.
+
+  'build_fn' is called with each point's parameters as keyword arguments and
+  must return the top module(s) to pass to `System`. Each point is generated,
+  compiled, and packaged into its own directory
+  ('<output_directory>/<name>_<i>') in a pool of 'workers' processes (default:
+  one per core). Since the workers are started with 'spawn', 'build_fn' must be
+  importable -- i.e. a module-level function. Workers are reused across points
+  so the process-wide state (e.g. the module parameterization cache) is shared
+  between the points each one builds. Set 'workers' to 0 to build all the
+  points in this process.
+
+  'param_grid' is either a dict of parameter name to a list of values (in which
+  case all combinations are built) or an explicit list of parameter dicts.
+  Build failures do not stop the sweep; they are reported in the result's
+  'error' field."""
+
+  if output_directory is None:
+    output_directory = os.path.join(os.getcwd(), name)
+  output_directory = pathlib.Path(output_directory)
+  output_directory.mkdir(parents=True, exist_ok=True)
+
+  points = _grid_points(param_grid)
+  args = [(build_fn, idx, params, f"{name}_{idx}",
+           str(output_directory / f"{name}_{idx}"), package)
+          for idx, params in enumerate(points)]
+
+  if workers == 0:
+    return SweepTable([_build_point(*a) for a in args])
+
+  pool: Executor = ProcessPoolExecutor(
+      max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+  with pool:
+    futures = [pool.submit(_build_point, *a) for a in args]
+    return SweepTable([f.result() for f in futures])
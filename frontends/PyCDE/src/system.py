@@ -8,8 +8,15 @@ from pycde.devicedb import (EntityExtern, PlacementDB, PrimitiveDB,
                             PhysicalRegion)
 
 from .common import _PyProxy
-from .module import Module, ModuleLikeType, ModuleLikeBuilderBase
+from .module import (Module, ModuleLikeType, ModuleLikeBuilderBase,
+                     _context_system_created, _context_system_released,
+                     _system_module_cache)
 from .pycde_types import types
+from .support import walk_operations
+from .transforms import lower_hw_params
+from .partition import (DesignPartition, create_partition_ops,
+                        emit_partition_bundles)
+from .stats import ModuleStats, PhaseStats, collect_stats, peak_rss_kb
 from .instance import Instance, InstanceHierarchyRoot
 
 from . import circt
@@ -17,16 +24,50 @@ from .circt import ir, passmanager, support
 from .circt.dialects import esi, hw, msft
 from .esi_api import PythonApiBuilder
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextvars import ContextVar
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
+import contextlib
 import gc
+import hashlib
+import json
 import os
 import pathlib
+import re
+import shutil
 import sys
+import tempfile
+import threading
+import time
+import weakref
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 _current_system = ContextVar("current_pycde_system")
 
+# Written to the hardware output directory by `emit_outputs`.
+EMIT_MANIFEST = "manifest.json"
+
+# The multithreading setting of each context, as far as `run_passes` knows.
+# MLIR doesn't expose it and enables multithreading by default.
+_context_multithreading: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+@contextlib.contextmanager
+def _multithreading(context: ir.Context, enabled: Optional[bool]):
+  """Turn multithreading in 'context' on or off (unless 'enabled' is None),
+  restoring the previous setting on exit."""
+  if enabled is None:
+    yield
+    return
+  previous = _context_multithreading.get(context, True)
+  context.enable_multithreading(enabled)
+  _context_multithreading[context] = enabled
+  try:
+    yield
+  finally:
+    context.enable_multithreading(previous)
+    _context_multithreading[context] = previous
+
 
 class System:
   """The 'System' contains the user's design and some private bookkeeping. On
@@ -38,9 +79,13 @@ class System:
   output SystemVerilog."""
 
   __slots__ = [
-      "mod", "top_modules", "name", "passed", "_old_system_token", "_op_cache",
+      "mod", "top_modules", "name", "passed", "_old_system_tokens", "_op_cache",
       "_generate_queue", "output_directory", "files", "mod_files",
-      "packaging_funcs", "sw_api_langs", "_instance_roots", "_placedb"
+      "packaging_funcs", "sw_api_langs", "_instance_roots", "_placedb",
+      "_lazy_imports", "_module_cache", "_context", "_packaging_requires",
+      "multithreading", "dedup", "_linked_files", "_partitions",
+      "_prebuilt_modules", "collect_stats", "stats_history", "phase_times",
+      "__weakref__"
   ]
 
   PASSES = """
@@ -49,7 +94,7 @@ class System:
     esi-emit-collateral{{tops={tops} schema-file=schema.capnp}},
     lower-msft-to-hw{{verilog-file={verilog_file}}},
     lower-esi-to-physical, lower-esi-ports, lower-esi-to-hw, convert-fsm-to-sv,
-    lower-seq-to-sv, hw.module(prettify-verilog), hw.module(hw-cleanup),
+    lower-seq-to-sv, hw.module(prettify-verilog, hw-cleanup),
     msft-export-tcl{{tops={tops} tcl-file={tcl_file}}})
   """
 
@@ -57,10 +102,50 @@ class System:
                top_modules: Union[list, Module],
                name: str = "PyCDESystem",
                output_directory: str = None,
-               sw_api_langs: List[str] = None):
+               sw_api_langs: List[str] = None,
+               context: Optional[ir.Context] = None,
+               multithreading: Optional[bool] = None,
+               dedup: bool = False,
+               collect_stats: bool = False):
+    """If 'context' is specified, the System is built in that MLIR context
+    (see `create_context`) instead of the shared default context. The context
+    is entered whenever the System is, so Systems with their own contexts can be
+    built concurrently in different threads. The top modules (and everything
+    they instantiate) must have been defined while that context was active.
+    The context's module parameterization cache is dropped when the System is
+    garbage collected.
+
+    'multithreading' turns MLIR's multithreading (which runs the passes nested
+    under `hw.module` on several modules at once) on or off in the System's
+    context while running the passes, then restores the previous setting. The
+    thread pool uses all the cores available to the process. None leaves the
+    context's setting alone.
+
+    If 'dedup' is set, structurally identical modules are merged after
+    generation. See `dedup_modules`.
+
+    If 'collect_stats' is set, `run_passes` records the statistics of every
+    module (see `stats`) after generation and after each pass phase in
+    `stats_history`."""
     from .module import Module
     self.passed = False
-    self.mod = ir.Module.create()
+    self._context = context
+    if context is not None:
+      # The context's module cache holds classes (and thus the context) alive,
+      # so drop it along with the last System using the context.
+      _context_system_created(context)
+      weakref.finalize(self, _context_system_released, context)
+    self.multithreading = multithreading
+    self.dedup = dedup
+    self.collect_stats = collect_stats
+    self.stats_history: List[PhaseStats] = []
+    # (phase, seconds) for each phase of the last `run_passes`.
+    self.phase_times: List[Tuple[str, float]] = []
+    # Entering a System is per-thread since `compile_async` uses it from a
+    # worker thread.
+    self._old_system_tokens = threading.local()
+    with self:
+      self.mod = ir.Module.create()
     if isinstance(top_modules, Iterable):
       self.top_modules = list(top_modules)
     else:
@@ -74,11 +159,32 @@ class System:
 
     self._placedb: PlacementDB = None
 
+    # Results of lazy `import_mlir` calls which may still hold unused modules.
+    self._lazy_imports: List[_LazyModuleImports] = []
+
+    # Module parameterization cache when the cache is scoped per-System.
+    self._module_cache = _system_module_cache()
+
     # The set of all files generated by PyCDE.
     self.files: Set[os.PathLike] = set()
     # The set of module SV files generated by PyCDE.
     self.mod_files: Set[os.PathLike] = set()
-    self.packaging_funcs: List[Callable] = [self.build_api]
+    # Pre-built files (e.g. from linked IP) to copy into the hardware output
+    # directory. Keyed by their path relative to said directory.
+    self._linked_files: Dict[str, pathlib.Path] = {}
+    # Modules which were already compiled by another System (see
+    # `ip.compile_streaming`) mapped to their Verilog module names and the files
+    # to link for them (as for `_link_files`). They are only instantiated as
+    # external modules.
+    self._prebuilt_modules: Dict[ModuleLikeType,
+                                 Tuple[str, Dict[str, pathlib.Path]]] = {}
+    # Design partitions by name.
+    self._partitions: Dict[str, DesignPartition] = {}
+    self.packaging_funcs: List[Callable] = []
+    # Output files (relative to the output directory) which packaging steps
+    # need. Steps not listed here need all the outputs.
+    self._packaging_requires: Dict[Callable, List[str]] = {}
+    self.add_packaging_step(self.build_api, requires=["hw/services.json"])
     self.sw_api_langs = sw_api_langs
 
     if output_directory is None:
@@ -90,8 +196,38 @@ class System:
     with self:
       [m._builder.circt_mod for m in self.top_modules]
 
-  def add_packaging_step(self, func: Callable):
+  def add_packaging_step(self, func: Callable, requires: List[str] = None):
+    """Add a function to be called with this System by `package`. If 'requires'
+    lists the output files (relative to the output directory) which the step
+    reads, `compile_async` runs it alongside the other packaging steps as soon
+    as they exist. Such steps must not touch the IR. Steps which don't specify
+    'requires' are run one after another once all the outputs are emitted."""
     self.packaging_funcs.append(func)
+    if requires is not None:
+      self._packaging_requires[func] = list(requires)
+
+  def create_partition(
+      self,
+      name: str,
+      parent: Optional[ModuleLikeType] = None) -> DesignPartition:
+    """Create a design partition. Instances created with `partition=` set to
+    it (anywhere under 'parent', which defaults to the top module) are moved
+    into a new module named 'name' -- which must not clash with any other
+    module -- instantiated in 'parent'. Each partition is also emitted as a
+    bundle (see `emit_partition_bundles`) for out-of-context flows."""
+    if parent is None:
+      if len(self.top_modules) != 1:
+        raise ValueError("'parent' must be specified for Systems with more "
+                         "than one top module")
+      parent = self.top_modules[0]
+    if len(parent._builder.generators) == 0:
+      raise TypeError(f"Partition parent '{parent.__name__}' must be a "
+                      "generated module")
+    if name in self._partitions:
+      raise ValueError(f"Partition '{name}' already exists")
+    part = DesignPartition(self, name, parent)
+    self._partitions[name] = part
+    return part
 
   @property
   def hw_output_dir(self):
@@ -104,6 +240,19 @@ class System:
   def _get_ip(self):
     return ir.InsertionPoint(self.mod.body)
 
+  @staticmethod
+  def create_context() -> ir.Context:
+    """Create a new MLIR context with all of the dialects PyCDE needs
+    registered. Suitable for passing to the System constructor."""
+    ctxt = ir.Context()
+    circt.register_dialects(ctxt)
+    ctxt.allow_unregistered_dialects = True
+    return ctxt
+
+  @property
+  def context(self) -> ir.Context:
+    return self.mod.context
+
   @staticmethod
   def set_debug():
     ir._GlobalDebug.flag = True
@@ -131,17 +280,30 @@ class System:
   #     "canonicalize",
   # ]
 
-  def import_mlir(self, module, lowering=None):
-    """Import mlir asm created elsewhere into our space."""
+  def import_mlir(self, module, lowering=None, lazy: bool = False):
+    """Import mlir asm created elsewhere into our space. If 'lazy' is set, the
+    `hw.module`s are only registered by name. The PyCDE class is built and the
+    op moved into this System the first time it is looked up in the returned
+    mapping. Modules which are never used are dropped before lowering."""
 
-    compat_mod = ir.Module.parse(str(module))
-    if lowering is not None:
-      pm = passmanager.PassManager.parse(",".join(lowering))
-      pm.run(compat_mod)
+    with self:
+      compat_mod = ir.Module.parse(str(module))
+      if lowering is not None:
+        pm = passmanager.PassManager.parse(",".join(lowering))
+        pm.run(compat_mod)
+      return self._import_mlir_ops(compat_mod, lazy)
+
+  def _import_mlir_ops(self, compat_mod: ir.Module, lazy: bool):
     ret: Dict[str, Any] = {}
+    if lazy:
+      ret = _LazyModuleImports(self, compat_mod)
+      self._lazy_imports.append(ret)
     for op in compat_mod.body:
       # TODO: handle symbolrefs pointing to potentially renamed symbols.
       if isinstance(op, hw.HWModuleOp):
+        if lazy:
+          ret._register(ir.StringAttr(op.name).value, op)
+          continue
         from .module import import_hw_module
         im = import_hw_module(op)
         self._create_circt_mod(im._builder)
@@ -156,13 +318,19 @@ class System:
         self.body.append(op)
     return ret
 
+  def _drop_lazy_imports(self):
+    """Release the lazily imported modules which were never used."""
+    for lazy_imports in self._lazy_imports:
+      lazy_imports._drop()
+    self._lazy_imports.clear()
+
   def create_physical_region(self, name: str = None):
-    with self._get_ip():
+    with self, self._get_ip():
       physical_region = PhysicalRegion(name)
     return physical_region
 
   def create_entity_extern(self, tag: str, metadata=""):
-    with self._get_ip():
+    with self, self._get_ip():
       entity_extern = EntityExtern(tag, metadata)
     return entity_extern
 
@@ -174,13 +342,27 @@ class System:
     if symbol is None:
       return
 
-    # Build the correct op.
-    op = builder.create_op(self, symbol)
+    prebuilt = self._prebuilt_modules.get(builder.modcls)
+    if prebuilt is not None:
+      verilog_name, files = prebuilt
+      self._link_files(files)
+      op = builder.create_extern_op(self, symbol, verilog_name)
+      install_func(op)
+      return op
+
+    # Build the correct op, or reuse the one generated by the last build.
+    op = None
+    if self.GENERATION_CACHE is not None:
+      op = self.GENERATION_CACHE.reuse(self, builder, symbol)
+    reused = op is not None
+    if not reused:
+      op = builder.create_op(self, symbol)
     # Install the op in the cache.
     install_func(op)
     # Add to the generation queue if the module has a generator callback.
     if len(builder.generators) > 0:
-      self._generate_queue.append(builder)
+      if not reused:
+        self._generate_queue.append(builder)
       file_name = builder.modcls.__name__ + ".sv"
       outfn = self.output_directory / file_name
       self.files.add(outfn)
@@ -196,13 +378,26 @@ class System:
       raise RuntimeError("No PyCDE system currently active!")
     return bb
 
+  def _token_stack(self) -> List[Tuple[Any, contextlib.ExitStack]]:
+    if not hasattr(self._old_system_tokens, "stack"):
+      self._old_system_tokens.stack = []
+    return self._old_system_tokens.stack
+
   def __enter__(self):
-    self._old_system_token = _current_system.set(self)
+    # If this System has its own MLIR context, make it (and a default location
+    # in it) current as well.
+    mlir_scope = contextlib.ExitStack()
+    if self._context is not None:
+      mlir_scope.enter_context(self._context)
+      mlir_scope.enter_context(ir.Location.unknown(self._context))
+    self._token_stack().append((_current_system.set(self), mlir_scope))
 
   def __exit__(self, exc_type, exc_value, traceback):
+    token, mlir_scope = self._token_stack().pop()
+    mlir_scope.close()
     if exc_value is not None:
       return
-    _current_system.reset(self._old_system_token)
+    _current_system.reset(token)
 
   @property
   def body(self):
@@ -211,9 +406,46 @@ class System:
   def print(self, *argv, **kwargs):
     self.mod.operation.print(*argv, **kwargs)
 
+  def dedup_modules(self) -> Dict[str, str]:
+    """Merge structurally identical modules (e.g. different parameterizations
+    which generated the same thing) and point their instances at the survivor.
+    Returns a map of the removed module symbols to their survivors."""
+    from .transforms import dedup_modules
+    self.generate()
+    with self:
+      removed = dedup_modules(self)
+    self._op_cache.reset_instance_hierarchies()
+    return removed
+
+  def outline_repeated(self,
+                       min_ops: int = 8,
+                       min_count: int = 2) -> Dict[str, int]:
+    """Move combinational cones of at least 'min_ops' ops which are repeated at
+    least 'min_count' times (e.g. per-lane logic) into modules of their own and
+    instantiate those instead. Returns a map of the new module symbols to the
+    number of instances of each."""
+    from .transforms import outline_repeated
+    self.generate()
+    with self:
+      outlined = outline_repeated(self, min_ops, min_count)
+    self.generate()
+    return outlined
+
+  def stats(self) -> Dict[str, ModuleStats]:
+    """Op counts (by op name), instance count, register bits, SSA value count,
+    and printed IR size of each module, by symbol. See `stats.format_stats` for
+    a human readable version."""
+    with self:
+      return collect_stats(self.mod)
+
+  def _record_stats(self, phase: str):
+    self.stats_history.append(
+        PhaseStats(phase, collect_stats(self.mod), peak_rss_kb()))
+
   def cleanup(self):
-    pm = passmanager.PassManager.parse("builtin.module(canonicalize)")
-    pm.run(self.mod)
+    with self:
+      pm = passmanager.PassManager.parse("builtin.module(canonicalize)")
+      pm.run(self.mod)
 
   def generate(self, generator_names=[], iters=None):
     """Fully generate the system unless iters is specified. Iters specifies the
@@ -223,15 +455,22 @@ class System:
       while len(self._generate_queue) > 0 and (iters is None or i < iters):
         m = self._generate_queue.pop()
         m.generate()
+        if self.GENERATION_CACHE is not None:
+          self.GENERATION_CACHE.record(self, m)
         i += 1
 
     # Run passes which must get run between generation and instance hierarch
     # browsing.
     gen_left = len(self._generate_queue)
     if gen_left == 0:
+      # The lazy import indexes hold ops too, so drop them first.
+      for lazy_imports in self._lazy_imports:
+        lazy_imports._release_ops()
       self._op_cache.release_ops()
-      pm = passmanager.PassManager.parse("builtin.module(msft-discover-appids)")
-      pm.run(self.mod)
+      with self:
+        pm = passmanager.PassManager.parse(
+            "builtin.module(msft-discover-appids)")
+        pm.run(self.mod)
     return
 
   def get_instance(self,
@@ -241,10 +480,47 @@ class System:
     mod = mod_cls._builder
     key = (mod, instance_name)
     if key not in self._instance_roots:
-      self._instance_roots[key] = InstanceHierarchyRoot(mod, instance_name,
-                                                        self)
+      with self:
+        self._instance_roots[key] = InstanceHierarchyRoot(
+            mod, instance_name, self)
     return self._instance_roots[key]
 
+  def query(self,
+            pattern: str,
+            top: object = None,
+            instance_name: str = None,
+            module=None,
+            kind: Optional[str] = None,
+            appid=None) -> List[Instance]:
+    """Select instances in the instance hierarchy of 'top' (the first top
+    module by default) by path pattern, e.g. "mid/*/pe[3..7]/reg_*". See
+    `pycde.query` for the pattern syntax and filters."""
+    if top is None:
+      top = self.top_modules[0]
+    return self.get_instance(top, instance_name).query(pattern,
+                                                       module=module,
+                                                       kind=kind,
+                                                       appid=appid)
+
+  def add_named_attributes(self,
+                           attributes,
+                           top: object = None,
+                           instance_name: str = None):
+    """Add named attributes to many instances in the instance hierarchy of
+    'top' (the first top module by default) at once. See
+    `ModuleInstance.add_named_attributes`."""
+    if top is None:
+      top = self.top_modules[0]
+    self.get_instance(top, instance_name).add_named_attributes(attributes)
+
+  # The default for `emit_outputs`' 'only_changed' argument.
+  EMIT_ONLY_CHANGED = False
+
+  # If set (to a `pycde.watch.GenerationCache`), modules which were generated
+  # by a previous build and haven't changed since are reused rather than
+  # regenerated.
+  GENERATION_CACHE = None
+
   PASS_PHASES = [
       # First, run all the passes with callbacks into pycde.
       "builtin.module(esi-connect-services)",
@@ -252,15 +528,20 @@ class System:
       # After all of the pycde code has been executed, we have all the types
       # defined so we can go through and output the typedefs delcarations.
       lambda sys: types.declare_types(sys.mod),
-      "builtin.module(lower-hwarith-to-hw, msft-lower-constructs, msft-lower-instances)",
+      lambda sys: sys.dedup_modules() if sys.dedup else None,
+      create_partition_ops,
+      "builtin.module(lower-hwarith-to-hw, msft-lower-constructs, msft-lower-instances{partition})",
       "builtin.module(esi-emit-collateral{{tops={tops} schema-file=schema.capnp}})",
       "builtin.module(lower-msft-to-hw{{verilog-file={verilog_file}}})",
+      lower_hw_params,
       "builtin.module(hw.module(lower-seq-hlmem))",
       "builtin.module(lower-esi-to-physical, lower-esi-ports, lower-esi-to-hw)",
       "builtin.module(convert-fsm-to-sv)",
       "builtin.module(lower-seq-to-sv)",
-      "builtin.module(cse, canonicalize, cse)",
-      "builtin.module(hw.module(prettify-verilog), hw.module(hw-cleanup))",
+      # Per-module cleanups. Nested under `hw.module` so that MLIR can run them
+      # on multiple modules in parallel.
+      "builtin.module(hw.module(cse, canonicalize, cse, prettify-verilog, "
+      "hw-cleanup))",
       "builtin.module(msft-export-tcl{{tops={tops} tcl-file={tcl_file}}})"
   ]
 
@@ -273,43 +554,201 @@ class System:
         [self._op_cache.get_pyproxy_symbol(m) for m in self.top_modules])
     verilog_file = self.name + ".sv"
     tcl_file = self.name + ".tcl"
+    partition = ", msft-partition" if len(self._partitions) > 0 else ""
     self.files.add(self.output_directory / verilog_file)
     self.files.add(self.output_directory / tcl_file)
 
+    self._drop_lazy_imports()
+    if self.collect_stats:
+      with self:
+        self._record_stats("generate")
     self._op_cache.release_ops()
-    for idx, phase in enumerate(self.PASS_PHASES):
-      aplog = None
-      if debug:
-        aplog = open(f"after_phase_{idx}.mlir", "w")
-      try:
-        if isinstance(phase, str):
-          passes = phase.format(tops=tops,
-                                verilog_file=verilog_file,
-                                tcl_file=tcl_file).strip()
-          if aplog is not None:
-            aplog.write(f"// passes ran: {passes}\n")
-            aplog.flush()
-          pm = passmanager.PassManager.parse(passes)
-          pm.run(self.mod)
-        else:
-          phase(self)
-      except RuntimeError as err:
-        sys.stderr.write(f"Exception while executing phase {phase}.\n")
-        raise err
-      self._op_cache.release_ops()
-      if aplog is not None:
-        aplog.write(str(self.mod))
-        aplog.close()
+    self.phase_times = []
+    with _multithreading(self.mod.context, self.multithreading):
+      for idx, phase in enumerate(self.PASS_PHASES):
+        label = f"{idx}: {getattr(phase, '__name__', phase)}"
+        start = time.perf_counter()
+        aplog = None
+        if debug:
+          aplog = open(f"after_phase_{idx}.mlir", "w")
+        try:
+          if isinstance(phase, str):
+            passes = phase.format(tops=tops,
+                                  verilog_file=verilog_file,
+                                  tcl_file=tcl_file,
+                                  partition=partition).strip()
+            label = passes
+            if aplog is not None:
+              aplog.write(f"// passes ran: {passes}\n")
+              aplog.flush()
+            with self:
+              pm = passmanager.PassManager.parse(passes)
+              pm.run(self.mod)
+          else:
+            with self:
+              phase(self)
+          self.phase_times.append((label, time.perf_counter() - start))
+          if self.collect_stats:
+            with self:
+              self._record_stats(label)
+        except RuntimeError as err:
+          sys.stderr.write(f"Exception while executing phase {phase}.\n")
+          raise err
+        self._op_cache.release_ops()
+        if aplog is not None:
+          aplog.write(str(self.mod))
+          aplog.close()
     self.passed = True
 
-  def emit_outputs(self):
+  def emit_outputs(self, only_changed: Optional[bool] = None):
+    """Write the output files. If 'only_changed' is set, leave the output
+    files whose contents are unchanged alone (including their modification
+    times) so downstream tools only see the files which actually changed, and
+    write a manifest of the outputs. Otherwise, all the files are rewritten.
+    Defaults to `EMIT_ONLY_CHANGED`."""
     assert self.passed, "Must call 'run_passes' first"
-    circt.export_split_verilog(self.mod, str(self.hw_output_dir))
-
-  def compile(self):
+    if only_changed is None:
+      only_changed = self.EMIT_ONLY_CHANGED
+    with self:
+      if only_changed:
+        self._emit_changed_outputs()
+      else:
+        # Clear out the linked files' previous copies so that anything in
+        # their place after the export was emitted.
+        for rel in self._linked_files:
+          dst = self.hw_output_dir / rel
+          if dst.exists():
+            dst.unlink()
+        circt.export_split_verilog(self.mod, str(self.hw_output_dir))
+        for rel, src in self._linked_files.items():
+          dst = self.hw_output_dir / rel
+          if dst.exists():
+            raise ValueError(f"Linked file '{src}' conflicts with emitted file "
+                             f"'{rel}'")
+          dst.parent.mkdir(parents=True, exist_ok=True)
+          shutil.copyfile(src, dst)
+    if len(self._partitions) > 0:
+      emit_partition_bundles(self)
+
+  def _link_files(self, files: Dict[str, pathlib.Path]):
+    """Have `emit_outputs` copy 'files' (output path relative to the hardware
+    output directory -> source path) into the output."""
+    for rel, src in files.items():
+      if rel in self._linked_files and self._linked_files[rel] != src:
+        raise ValueError(f"Cannot link both '{self._linked_files[rel]}' and "
+                         f"'{src}' as '{rel}'")
+      self._linked_files[rel] = pathlib.Path(src)
+      self.files.add(self.hw_output_dir / rel)
+      self.mod_files.add(self.hw_output_dir / rel)
+
+  def _emit_changed_outputs(self) -> Dict[str, Any]:
+    """Emit into a scratch directory then hash each output file and copy over
+    only the ones which differ from what's already in the output directory.
+    The export itself is a single native call; only the hashing, comparing,
+    and writing of the files are spread over a thread pool. Files listed in
+    the previous manifest which are no longer emitted are removed. Writes (and
+    returns) a manifest of the files, their hashes, the modules each contains,
+    and whether they changed."""
+    manifest_path = self.hw_output_dir / EMIT_MANIFEST
+    old_files: Dict[str, Any] = {}
+    if manifest_path.exists():
+      try:
+        old_files = json.loads(manifest_path.read_text())["files"]
+      except (ValueError, KeyError):
+        pass
+
+    with tempfile.TemporaryDirectory(prefix="pycde_emit_") as scratch:
+      scratch = pathlib.Path(scratch)
+      circt.export_split_verilog(self.mod, str(scratch))
+      sources = {
+          src.relative_to(scratch).as_posix(): src
+          for src in sorted(scratch.rglob("*"))
+          if src.is_file()
+      }
+      for rel, src in self._linked_files.items():
+        if rel in sources:
+          raise ValueError(f"Linked file '{src}' conflicts with emitted file "
+                           f"'{rel}'")
+        sources[rel] = src
+      rel_paths = list(sources.keys())
+      out_dir = self.hw_output_dir
+      with ThreadPoolExecutor() as pool:
+        entries = list(
+            pool.map(
+                lambda rel: _update_output_file(sources[rel], out_dir / rel),
+                rel_paths))
+
+    files = dict(zip(rel_paths, entries))
+    modules = {
+        mod_name: rel for rel, entry in files.items()
+        for mod_name in entry["modules"]
+    }
+    removed = sorted(rel for rel in old_files if rel not in files)
+    for rel in removed:
+      stale = self.hw_output_dir / rel
+      if stale.exists():
+        stale.unlink()
+
+    manifest = {"files": files, "modules": modules, "removed": removed}
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+  def compile(self, only_changed: Optional[bool] = None):
+    """Generate, run the passes, and emit the outputs. See `emit_outputs` for
+    'only_changed'."""
     self.generate()
     self.run_passes()
-    self.emit_outputs()
+    self.emit_outputs(only_changed)
+
+  def compile_async(self,
+                    package: bool = False,
+                    only_changed: Optional[bool] = None) -> Future:
+    """Generate the design then return a future while the passes, output
+    emission and (if 'package' is set) packaging steps are run on a worker
+    thread. The future's result is this System. Since the generators run in the
+    calling thread before this returns, the caller is free to do other work --
+    so long as it doesn't touch this System's IR -- until the future is
+    done. See `emit_outputs` for 'only_changed'."""
+    self.generate()
+    executor = ThreadPoolExecutor(max_workers=1,
+                                  thread_name_prefix=f"{self.name}_compile")
+    future = executor.submit(self._compile_worker, package, only_changed)
+    executor.shutdown(wait=False)
+    return future
+
+  def _compile_worker(self, package: bool,
+                      only_changed: Optional[bool]) -> System:
+    # A new thread has no MLIR context or location, so enter the System's.
+    with self.mod.context, ir.Location.unknown(self.mod.context), self:
+      self.run_passes()
+      self.emit_outputs(only_changed)
+      if package:
+        self._package_concurrently()
+    return self
+
+  def _package_concurrently(self):
+    """Run the packaging steps which declared their requirements in a thread
+    pool while running the rest in order on this thread."""
+    with ThreadPoolExecutor(
+        thread_name_prefix=f"{self.name}_package") as executor:
+      futures: List[Future] = []
+      for func in self.packaging_funcs:
+        requires = self._packaging_requires.get(func)
+        if requires is None:
+          continue
+        missing = [
+            r for r in requires if not (self.output_directory / r).exists()
+        ]
+        if len(missing) > 0:
+          raise FileNotFoundError(
+              f"Packaging step {func} requires missing files: {missing}")
+        futures.append(executor.submit(func, self))
+
+      for func in self.packaging_funcs:
+        if func not in self._packaging_requires:
+          func(self)
+      for f in futures:
+        f.result()
 
   @property
   def placedb(self):
@@ -319,7 +758,8 @@ class System:
 
   def createdb(self, primdb: PrimitiveDB = None):
     if self._placedb is None:
-      self._placedb = PlacementDB(self, self.mod, primdb)
+      with self:
+        self._placedb = PlacementDB(self, self.mod, primdb)
 
   def build_api(self, _=None):
     """Build the ESI runtime APIs."""
@@ -346,8 +786,137 @@ class System:
   def package(self):
     """Package up the system."""
     assert self.passed, "Must call compile before package"
-    for func in self.packaging_funcs:
-      func(self)
+    with self:
+      for func in self.packaging_funcs:
+        func(self)
+
+
+_module_decl_re = re.compile(rb"^\s*module\s+(\w+)", re.MULTILINE)
+
+
+def _update_output_file(src: pathlib.Path, dst: pathlib.Path) -> Dict[str, Any]:
+  """Copy 'src' to 'dst' if their contents differ. Returns the manifest entry
+  for the file."""
+  contents = src.read_bytes()
+  digest = hashlib.sha256(contents).hexdigest()
+  changed = not dst.exists() or hashlib.sha256(
+      dst.read_bytes()).hexdigest() != digest
+  if changed:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.write_bytes(contents)
+  modules = []
+  if dst.suffix in (".sv", ".v"):
+    modules = [m.decode() for m in _module_decl_re.findall(contents)]
+  return {"sha256": digest, "changed": changed, "modules": modules}
+
+
+def reset(context: Optional[ir.Context] = None):
+  """Drop the process-wide state which PyCDE accumulates across builds: the
+  module parameterization caches, physical region names, type aliases, ESI
+  service implementation registrations and live MLIR operation handles. Meant
+  for long-running processes which build many designs one after another so
+  that memory use stays flat and names don't depend on what was built before.
+
+  If 'context' is specified, only the state for that MLIR context is dropped.
+  (Building each design in its own context -- see `System.create_context` --
+  and resetting it afterwards lets the whole context be freed.) Otherwise, the
+  state for all contexts is dropped. Systems, module classes, and values
+  created (in 'context') before the reset must not be used after it."""
+  from pycde import DefaultContext
+  from .esi import _service_generator_registry
+  from .module import _reset_module_caches
+
+  _reset_module_caches(context)
+  PhysicalRegion._reset(context)
+  types._reset(context)
+  _service_generator_registry._reset(context)
+
+  gc.collect()
+  (context or DefaultContext)._clear_live_operations()
+
+
+class _LazyModuleImports(Mapping):
+  """The result of a lazy `import_mlir`. Maps `hw.module` names to PyCDE module
+  classes, but leaves the ops in the parsed module until they are first looked
+  up. At that point, the class is built and the op -- along with any lazily
+  imported modules which it instantiates -- is moved into the System. The
+  pending ops are indexed by name as they're parsed; since the index holds op
+  references, it is dropped by `release_ops` and rebuilt on the next lookup."""
+
+  def __init__(self, sys: System, mod: ir.Module):
+    self._sys = sys
+    self._mod = mod
+    # Everything which has been imported (including non-modules, which are
+    # imported eagerly).
+    self._imported: Dict[str, Any] = {}
+    # Names of `hw.module`s which are still sitting in `_mod`.
+    self._pending: Set[str] = set()
+    # Index of the pending ops by name. None if it needs to be rebuilt.
+    self._ops: Optional[Dict[str, hw.HWModuleOp]] = {}
+
+  def _register(self, name: str, op: hw.HWModuleOp):
+    self._pending.add(name)
+    self._ops[name] = op
+
+  def _pending_ops(self) -> Dict[str, hw.HWModuleOp]:
+    if self._ops is None:
+      self._ops = {
+          ir.StringAttr(op.name).value: op
+          for op in self._mod.body
+          if isinstance(op, hw.HWModuleOp) and
+          ir.StringAttr(op.name).value in self._pending
+      }
+    return self._ops
+
+  def _release_ops(self):
+    """Drop the references to ops in the index."""
+    self._ops = None
+
+  def __setitem__(self, name: str, value: Any):
+    self._imported[name] = value
+
+  def __getitem__(self, name: str) -> Any:
+    if name in self._pending:
+      self._import(name)
+    return self._imported[name]
+
+  def __contains__(self, name: object) -> bool:
+    # Don't trigger an import just to check membership.
+    return name in self._imported or name in self._pending
+
+  def __iter__(self):
+    return iter(list(self._imported.keys()) + list(self._pending))
+
+  def __len__(self) -> int:
+    return len(self._imported) + len(self._pending)
+
+  def _import(self, name: str):
+    """Move 'name' and all of the pending modules it (transitively) instantiates
+    into the System."""
+    from .module import import_hw_module
+
+    ops = self._pending_ops()
+    to_import = {name}
+    while len(to_import) > 0:
+      found = [ops.pop(mod_name) for mod_name in to_import]
+      instantiated: Set[str] = set()
+      for op in found:
+        for inner in walk_operations(op):
+          if "moduleName" in inner.attributes:
+            instantiated.add(
+                ir.FlatSymbolRefAttr(inner.attributes["moduleName"]).value)
+        mod_name = ir.StringAttr(op.name).value
+        self._pending.remove(mod_name)
+        im = import_hw_module(op)
+        self._sys._create_circt_mod(im._builder)
+        self._imported[mod_name] = im
+      to_import = instantiated & self._pending
+
+  def _drop(self):
+    """Forget about (and free) the modules which were never imported."""
+    self._pending.clear()
+    self._ops = None
+    self._mod = None
 
 
 class _OpCache:
@@ -388,13 +957,20 @@ class _OpCache:
     self._instance_cache.clear()
     self._module_inside_sym_cache.clear()
     self._dyn_insts_in_inst.clear()
+    self.reset_instance_hierarchies()
     gc.collect()
-    num_ops_live = ir.Context.current._clear_live_operations()
+    num_ops_live = self._module.context._clear_live_operations()
     if num_ops_live > 0:
       sys.stderr.write(
           f"Warning: something is holding references to {num_ops_live} " +
           " MLIR ops\n")
 
+  def reset_instance_hierarchies(self):
+    """Drop what the instance hierarchies have looked up about the modules,
+    which may have changed."""
+    for inst_hier in self._instance_hier_obj_cache.values():
+      inst_hier._nodes.reset()
+
   @property
   def symbols(self):
     if self._symbols is None:
@@ -431,6 +1007,20 @@ class _OpCache:
 
     return symbol, install
 
+  def merge_symbol(self, symbol: str, survivor: str):
+    """The module op for 'symbol' has been merged into 'survivor' (and erased).
+    Resolve the _PyProxys which had 'symbol' to 'survivor' instead."""
+    self._symbol_pyproxy.pop(symbol, None)
+    for pyproxy, sym in self._pyproxy_symbols.items():
+      if sym == symbol:
+        self._pyproxy_symbols[pyproxy] = survivor
+    if self._symbols is not None:
+      self._symbols.pop(symbol, None)
+
+  def pyproxy_symbol_items(self) -> List[Tuple[_PyProxy, str]]:
+    """All of the (_PyProxy, symbol) pairs which have been installed."""
+    return list(self._pyproxy_symbols.items())
+
   def get_symbol_pyproxy(self, symbol):
     """Get the _PyProxy for a symbol."""
     if isinstance(symbol, ir.FlatSymbolRefAttr):
@@ -490,31 +1080,42 @@ class _OpCache:
   def create_or_get_dyn_inst(self, inst: Instance) -> msft.DynamicInstanceOp:
     """Get the dynamic instance op corresponding to 'inst'. Returns 'None' if
     the instance doesn't have a static op in the IR."""
-
-    # Check static op existence.
-    inside_of_syms = self.get_sym_ops_in_module(inst.inside_of)
-    if inst.symbol not in inside_of_syms:
-      return None
-
-    if inst not in self._instance_cache:
-      ref = hw.InnerRefAttr.get(ir.StringAttr.get(inst._inside_of_symbol),
-                                inst.symbol)
-      # Check if the dynamic instance op exists.
-      parent_op = inst.parent._dyn_inst
-      insts_in_parent = self.get_dyn_insts_in_inst(parent_op)
-      if ref in insts_in_parent:
-        # If it is, install it into the instance cache
-        inst_op = insts_in_parent[ref]
-        self._instance_cache[inst] = inst_op
-      else:
-        # If not, create a new one and install it into the instance cache and
-        # add it to the insts in parent cache.
-        with inst.parent._get_ip():
-          new_inst = msft.DynamicInstanceOp.create(ref)
+    return self.create_or_get_dyn_insts(inst.parent, [inst])[0]
+
+  def create_or_get_dyn_insts(
+      self, parent: Instance,
+      insts: List[Instance]) -> List[Optional[msft.DynamicInstanceOp]]:
+    """Get the dynamic instance ops for several children of 'parent' at once
+    (None for those without a static op in the IR). The parent's dynamic
+    instance and the lookup tables are only resolved once."""
+
+    inside_of_syms = self.get_sym_ops_in_module(parent.tgt_mod)
+    # Only resolved if one of 'insts' isn't already cached.
+    parent_op = None
+    ip = None
+    ops = []
+    for inst in insts:
+      if inst.symbol not in inside_of_syms:
+        ops.append(None)
+        continue
+      if inst not in self._instance_cache:
+        if parent_op is None:
+          parent_op = parent._dyn_inst
+          insts_in_parent = self.get_dyn_insts_in_inst(parent_op)
+          inside_of_sym = ir.StringAttr.get(
+              self.get_pyproxy_symbol(parent.tgt_mod))
+        ref = hw.InnerRefAttr.get(inside_of_sym, inst.symbol)
+        if ref in insts_in_parent:
+          self._instance_cache[inst] = insts_in_parent[ref]
+        else:
+          if ip is None:
+            ip = ir.InsertionPoint(parent_op.body.blocks[0])
+          with ip:
+            new_inst = msft.DynamicInstanceOp.create(ref)
           self._instance_cache[inst] = new_inst
           insts_in_parent[ref] = new_inst
-
-    return self._instance_cache[inst]
+      ops.append(self._instance_cache[inst])
+    return ops
 
   def get_or_create_inst_from_op(self, op: ir.OpView) -> pi.Instance:
     """Descend the Python instance hierarchy from the CIRCT IR, returning the
@@ -525,7 +1126,7 @@ class _OpCache:
     if isinstance(op, msft.DynamicInstanceOp):
       parent_inst = self.get_or_create_inst_from_op(op.operation.parent.opview)
       instance_ref = hw.InnerRefAttr(op.instanceRef)
-      return parent_inst._children()[instance_ref.name]
+      return parent_inst._child(instance_ref.name)
     raise TypeError(
         "Can only resolve from InstanceHierarchyOp or DynamicInstanceOp")
 
@@ -0,0 +1,410 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+"""Transformations on a System's IR which are implemented in Python."""
+
+from __future__ import annotations
+
+from .circt import ir
+from .circt.dialects import msft
+from .support import walk_operations
+
+import re
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+  from .system import System
+
+# The module attributes which are part of the structure. Everything else (the
+# name, parameters, and file name) may differ between merged modules.
+_STRUCTURAL_MODULE_ATTRS = [
+    "function_type", "argNames", "resultNames", "arg_attrs", "res_attrs",
+    "childAppIDBases"
+]
+
+
+def _sym(mod: ir.OpView) -> str:
+  return ir.StringAttr(mod.operation.attributes["sym_name"]).value
+
+
+def _structural_key(mod: msft.MSFTModuleOp) -> Tuple[str, ...]:
+  """A key which is equal for two modules iff they have the same ports and
+  identical bodies."""
+  attrs = mod.operation.attributes
+  header = tuple(
+      str(attrs[name]) if name in attrs else ""
+      for name in _STRUCTURAL_MODULE_ATTRS)
+  # The module op prints its header (including its name) on the first line and
+  # the body on the rest.
+  body = str(mod).split("\n", 1)[1]
+  return header + (body,)
+
+
+def _externally_referenced(sys: System, mod_syms: Set[str]) -> Set[str]:
+  """The module symbols which are referenced by something other than an
+  instance (e.g. instance hierarchies and dynamic instances)."""
+  referenced = set()
+  for op in sys.mod.body:
+    if isinstance(op, (msft.MSFTModuleOp, msft.MSFTModuleExternOp)):
+      continue
+    for sym in re.findall(r"@([\w$.]+)", str(op)):
+      if sym in mod_syms:
+        referenced.add(sym)
+  return referenced
+
+
+def dedup_modules(sys: System) -> Dict[str, str]:
+  """Merge the generated modules in 'sys' which are structurally identical --
+  same ports and same body, modulo their name and parameters -- into one and
+  point all the instances of the merged modules at the survivor. Repeats until
+  there is nothing left to merge since merging submodules can make their
+  parents identical. The top modules and modules referenced from outside of
+  instances (e.g. placements) are never removed. Returns a map of the removed
+  module symbols to their survivors."""
+
+  tops = set(sys._op_cache.get_pyproxy_symbol(m) for m in sys.top_modules)
+  merged: Dict[str, str] = {}
+  while True:
+    mods: List[msft.MSFTModuleOp] = [
+        op for op in sys.mod.body
+        if isinstance(op, msft.MSFTModuleOp) and len(op.body.blocks) > 0
+    ]
+    keep = tops | _externally_referenced(sys, set(_sym(m) for m in mods))
+
+    # Group by structure. Prefer keeping a module which cannot be removed.
+    survivors: Dict[Tuple[str, ...], str] = {}
+    replacements: Dict[str, str] = {}
+    to_erase: List[msft.MSFTModuleOp] = []
+    for mod in sorted(mods, key=lambda m: _sym(m) not in keep):
+      sym = _sym(mod)
+      key = _structural_key(mod)
+      if key not in survivors:
+        survivors[key] = sym
+      elif sym not in keep:
+        replacements[sym] = survivors[key]
+        to_erase.append(mod)
+    if len(replacements) == 0:
+      break
+
+    # Point the instances at the survivors.
+    for mod in mods:
+      for op in walk_operations(mod):
+        if "moduleName" not in op.attributes:
+          continue
+        tgt = ir.FlatSymbolRefAttr(op.attributes["moduleName"]).value
+        if tgt in replacements:
+          op.attributes["moduleName"] = ir.FlatSymbolRefAttr.get(
+              replacements[tgt])
+
+    for mod in to_erase:
+      if mod.fileName is not None:
+        file_name = sys.output_directory / ir.StringAttr(mod.fileName).value
+        sys.files.discard(file_name)
+        sys.mod_files.discard(file_name)
+      mod.operation.erase()
+    for sym, survivor in replacements.items():
+      sys._op_cache.merge_symbol(sym, survivor)
+      for removed, tgt in merged.items():
+        if tgt == sym:
+          merged[removed] = survivor
+      merged[sym] = survivor
+  return merged
+
+
+def lower_hw_params(sys: System):
+  """Turn the `HWParam` placeholder constants in the (lowered) `hw.module`s
+  into parameter references, declare said parameters on the modules, and set
+  their values on the instances. Must run after `lower-msft-to-hw`."""
+  from .circt.dialects import hw
+  from .module import HWParam
+
+  # Module name -> parameter name -> declared parameter.
+  module_params: Dict[str, Dict[str, hw.ParamDeclAttr]] = {}
+  # Module name -> parameter name -> default value (None if it has none).
+  module_defaults: Dict[str, Dict[str, Optional[int]]] = {}
+  for mod in sys.mod.body:
+    if not isinstance(mod, hw.HWModuleOp):
+      continue
+    placeholders = [
+        op for op in walk_operations(mod)
+        if HWParam.RefAttributeName in op.attributes
+    ]
+    if len(placeholders) == 0:
+      continue
+
+    decls: Dict[str, hw.ParamDeclAttr] = {}
+    defaults: Dict[str, Optional[int]] = {}
+    for op in placeholders:
+      attrs = op.attributes
+      name = ir.StringAttr(attrs[HWParam.RefAttributeName]).value
+      type = op.results[0].type
+      if name in decls:
+        if decls[name].param_type != type:
+          raise TypeError(f"HW parameter '{name}' of '{_sym(mod)}' "
+                          f"is used as both {decls[name].param_type} and "
+                          f"{type}")
+      elif HWParam.DefaultAttributeName in attrs:
+        default = ir.IntegerAttr(attrs[HWParam.DefaultAttributeName]).value
+        decls[name] = hw.ParamDeclAttr.get(name, type, _int_attr(type, default))
+        defaults[name] = default
+      else:
+        decls[name] = hw.ParamDeclAttr.get_nodefault(name, type)
+        defaults[name] = None
+
+      with ir.InsertionPoint(op), op.location:
+        ref = ir.Attribute.parse(f'#hw.param.decl.ref<"{name}"> : {type}')
+        value = hw.ParamValueOp(type, ref)
+      msft.replaceAllUsesWith(op.results[0], value.result)
+      op.operation.erase()
+
+    existing = list(ir.ArrayAttr(mod.attributes["parameters"]))
+    mod.attributes["parameters"] = ir.ArrayAttr.get(existing +
+                                                    list(decls.values()))
+    module_params[_sym(mod)] = decls
+    module_defaults[_sym(mod)] = defaults
+
+  # Set the values on the instances. Instances which weren't created with
+  # values (e.g. through the module class directly) get the defaults.
+  for mod in sys.mod.body:
+    if not isinstance(mod, hw.HWModuleOp):
+      continue
+    for inst in walk_operations(mod):
+      attrs = inst.attributes
+      values = None
+      if HWParam.InstanceValuesAttributeName in attrs:
+        values = ir.DictAttr(attrs[HWParam.InstanceValuesAttributeName])
+        del attrs[HWParam.InstanceValuesAttributeName]
+      if "moduleName" not in attrs:
+        continue
+      tgt = ir.FlatSymbolRefAttr(attrs["moduleName"]).value
+      if tgt not in module_params:
+        continue
+      params = list(ir.ArrayAttr(attrs["parameters"]))
+      for name, decl in module_params[tgt].items():
+        if values is not None and name in values:
+          value = ir.IntegerAttr(values[name]).value
+        else:
+          value = module_defaults[tgt][name]
+        if value is None:
+          inst_name = ir.StringAttr(attrs["instanceName"]).value
+          raise ValueError(f"Instance '{inst_name}' of '{tgt}' in "
+                           f"'{_sym(mod)}' has no value for HW parameter "
+                           f"'{name}', which has no default")
+        params.append(
+            hw.ParamDeclAttr.get(name, decl.param_type,
+                                 _int_attr(decl.param_type, value)))
+      attrs["parameters"] = ir.ArrayAttr.get(params)
+
+
+def _int_attr(type: ir.Type, value: int) -> ir.IntegerAttr:
+  """An integer attribute of 'type', truncating 'value' to its width."""
+  width = ir.IntegerType(type).width
+  return ir.IntegerAttr.get(type, value & ((1 << width) - 1))
+
+
+# The dialects whose (single-result, region-free) ops may be outlined.
+# Sequential ops are left in place so that clocks and resets don't become module
+# ports.
+_OUTLINE_DIALECTS = ("comb.", "hw.", "hwarith.")
+_NOT_OUTLINABLE = {"hw.instance", "hw.output", "hw.constant"}
+# Op attributes which don't affect what an op computes.
+_NONSTRUCTURAL_OP_ATTRS = {"sv.namehint", "name"}
+
+
+def _outlinable(op: ir.OpView) -> bool:
+  op = op.operation
+  return (op.name.startswith(_OUTLINE_DIALECTS) and
+          op.name not in _NOT_OUTLINABLE and len(op.results) == 1 and
+          len(op.regions) == 0)
+
+
+def _defining_op(value: ir.Value):
+  """The op which produces 'value' or None for block arguments."""
+  if ir.OpResult.isinstance(value):
+    return ir.OpResult(value).owner.operation
+  return None
+
+
+class _Cone:
+  """A tree of outlinable ops feeding 'root', with the leaves (other than
+  constants, which are cloned) as inputs. 'recipe' is everything needed to
+  recreate the cone in another module and 'key' is its hashable form."""
+
+  __slots__ = ["module", "root", "ops", "inputs", "recipe", "key"]
+
+  def __init__(self, module: msft.MSFTModuleOp, root: ir.Operation,
+               absorbed: Callable[[ir.Operation], bool]):
+    self.module = module
+    self.root = root
+    self.ops: List[ir.Operation] = []
+    # The input values along with their defining ops (if any).
+    self.inputs: List[Tuple[ir.Value, Optional[ir.Operation]]] = []
+    # Tuples of (op name, attributes, result type, operand refs). An operand
+    # ref is ("op", index into recipe) or ("in", input index).
+    self.recipe: List[Tuple] = []
+    input_idx: Dict[Tuple, int] = {}
+    op_idx: Dict[ir.Operation, int] = {}
+
+    def operand_ref(value: ir.Value) -> Tuple:
+      owner = _defining_op(value)
+      if owner is not None and owner in op_idx:
+        return ("op", op_idx[owner])
+      if owner is not None and owner.name == "hw.constant":
+        return ("op", add(owner))
+      if owner is not None and absorbed(owner):
+        return ("op", visit(owner))
+      if owner is None:
+        value_id = ("arg", ir.BlockArgument(value).arg_number)
+      else:
+        value_id = (owner, ir.OpResult(value).result_number)
+      if value_id not in input_idx:
+        input_idx[value_id] = len(self.inputs)
+        self.inputs.append((value, owner))
+      return ("in", input_idx[value_id])
+
+    def add(op: ir.Operation, operands: Tuple = ()) -> int:
+      attrs = {
+          na.name: na.attr
+          for na in op.attributes
+          if na.name not in _NONSTRUCTURAL_OP_ATTRS
+      }
+      op_idx[op] = len(self.recipe)
+      self.recipe.append((op.name, attrs, op.results[0].type, operands))
+      if op.name != "hw.constant":
+        self.ops.append(op)
+      return op_idx[op]
+
+    def visit(op: ir.Operation) -> int:
+      operands = tuple(operand_ref(v) for v in op.operands)
+      return add(op, operands)
+
+    visit(root)
+    self.key = (tuple((name, tuple(sorted(
+        (k, str(a))
+        for k, a in attrs.items())), str(type), operands)
+                      for name, attrs, type, operands in self.recipe),
+                tuple(str(v.type) for v, _ in self.inputs))
+
+  @property
+  def result_type(self) -> ir.Type:
+    return self.root.results[0].type
+
+
+def _module_cones(mod: msft.MSFTModuleOp, min_ops: int) -> List[_Cone]:
+  """Partition the outlinable ops of 'mod' into cones. An op is the root of a
+  cone unless its result feeds exactly one outlinable op."""
+  block = mod.body.blocks[0]
+  ops = [op.operation for op in block]
+  users: Dict[ir.Operation, int] = {op: 0 for op in ops}
+  sole_user: Dict[ir.Operation, ir.Operation] = {}
+  for op in ops:
+    for value in op.operands:
+      owner = _defining_op(value)
+      if owner is None:
+        continue
+      users[owner] = users.get(owner, 0) + 1
+      sole_user[owner] = op
+
+  def absorbed(op: ir.Operation) -> bool:
+    return (_outlinable(op) and users[op] == 1 and _outlinable(sole_user[op]))
+
+  cones = []
+  for op in ops:
+    if not _outlinable(op) or absorbed(op):
+      continue
+    cone = _Cone(mod, op, absorbed)
+    if len(cone.ops) >= min_ops and len(cone.inputs) > 0:
+      cones.append(cone)
+  return cones
+
+
+def _outlined_module(name: str, cone: _Cone):
+  """A Module class which recreates 'cone' with inputs 'in0', 'in1', ... and
+  the result on 'out'."""
+  from .common import Input, Output
+  from .module import Module, generator
+  from .value import Value
+
+  # Don't capture the cone itself since it refers to ops which are erased.
+  recipe = cone.recipe
+  num_inputs = len(cone.inputs)
+
+  def build(ports):
+    inputs = [getattr(ports, f"in{i}").value for i in range(num_inputs)]
+    results: List[ir.Value] = []
+    for op_name, attrs, type, operands in recipe:
+      op = ir.Operation.create(op_name,
+                               results=[type],
+                               operands=[
+                                   results[idx] if kind == "op" else inputs[idx]
+                                   for kind, idx in operands
+                               ],
+                               attributes=attrs)
+      results.append(op.results[0])
+    ports.out = Value(results[-1])
+
+  modattrs = {f"in{i}": Input(v.type) for i, (v, _) in enumerate(cone.inputs)}
+  modattrs["out"] = Output(cone.result_type)
+  modattrs["build"] = generator(build)
+  return type(name, (Module,), modattrs)
+
+
+def outline_repeated(sys: System,
+                     min_ops: int = 8,
+                     min_count: int = 2) -> Dict[str, int]:
+  """Find the combinational cones (trees of comb/hw ops, constants included)
+  with at least 'min_ops' ops which occur at least 'min_count' times across the
+  generated modules of 'sys', move each one into a new module, and instantiate
+  that module in place of every occurrence. Returns a map of the new module
+  symbols to the number of occurrences replaced."""
+
+  mods: List[msft.MSFTModuleOp] = [
+      op for op in sys.mod.body
+      if isinstance(op, msft.MSFTModuleOp) and len(op.body.blocks) > 0
+  ]
+  groups: Dict[Tuple, List[_Cone]] = {}
+  for mod in mods:
+    for cone in _module_cones(mod, min_ops):
+      groups.setdefault(cone.key, []).append(cone)
+  repeated = [cones for cones in groups.values() if len(cones) >= min_count]
+  # Largest first so the naming is stable and meaningful.
+  repeated.sort(key=lambda cones: (-len(cones[0].ops), -len(cones)))
+
+  used_syms: Dict[str, Set[str]] = {}
+  # Cone roots which have already been replaced by an instance. Other cones may
+  # use them as inputs.
+  replaced: Dict[ir.Operation, ir.Value] = {}
+  outlined: Dict[str, int] = {}
+  for num, cones in enumerate(repeated):
+    modcls = _outlined_module(f"Outlined_{num}", cones[0])
+    sys._create_circt_mod(modcls._builder)
+    mod_sym = sys._op_cache.get_pyproxy_symbol(modcls)
+    for cone in cones:
+      parent_sym = _sym(cone.module)
+      if parent_sym not in used_syms:
+        used_syms[parent_sym] = set(
+            ir.StringAttr(op.attributes["sym_name"]).value
+            for op in cone.module.body.blocks[0]
+            if "sym_name" in op.attributes)
+      inst_name = mod_sym
+      suffix = 0
+      while inst_name in used_syms[parent_sym]:
+        suffix += 1
+        inst_name = f"{mod_sym}_{suffix}"
+      used_syms[parent_sym].add(inst_name)
+
+      with ir.InsertionPoint(cone.root):
+        inst = msft.InstanceOp(
+            [cone.result_type],
+            inst_name,
+            ir.FlatSymbolRefAttr.get(mod_sym),
+            [replaced.get(owner, value) for value, owner in cone.inputs],
+            loc=cone.root.location)
+      msft.replaceAllUsesWith(cone.root.results[0], inst.results[0])
+      replaced[cone.root] = inst.results[0]
+      # Users before definitions. The (shared) constants are left for
+      # canonicalization to clean up.
+      for op in reversed(cone.ops):
+        op.erase()
+    outlined[mod_sym] = len(cones)
+  return outlined
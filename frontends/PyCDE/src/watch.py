@@ -0,0 +1,415 @@
+#  Part of the LLVM Project, under the Apache License v2.0 with LLVM Exceptions.
+#  See https://llvm.org/LICENSE.txt for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import os
+import pathlib
+import runpy
+import sys
+import time
+import traceback
+import types
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def _resolve(module_name: str, qualname: str):
+  """Look up a class by module and qualified name. None if it can't be."""
+  obj = sys.modules.get(module_name)
+  for part in qualname.split("."):
+    if obj is None or part == "<locals>":
+      return None
+    obj = getattr(obj, part, None)
+  return obj
+
+
+def _stable_repr(obj) -> Optional[str]:
+  """A representation of 'obj' which is the same from one run to the next if
+  its value is. None if there isn't one."""
+  from .pycde_types import PyCDEType
+  if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+    return repr(obj)
+  if isinstance(obj, PyCDEType):
+    return f"{type(obj).__name__}({obj._type})"
+  if isinstance(obj, (tuple, list, frozenset, set)):
+    items = [_stable_repr(o) for o in obj]
+    if any(i is None for i in items):
+      return None
+    if isinstance(obj, (frozenset, set)):
+      items.sort()
+    return f"{type(obj).__name__}({', '.join(items)})"
+  if isinstance(obj, dict):
+    items = [(_stable_repr(k), _stable_repr(v)) for k, v in obj.items()]
+    if any(k is None or v is None for k, v in items):
+      return None
+    return "dict(" + ", ".join(f"{k}: {v}" for k, v in sorted(items)) + ")"
+  return None
+
+
+_MISSING = object()
+
+# (symbol, module name, class qualname, port signature, extern declaration) of
+# a module instantiated by a generated module.
+_Child = Tuple[str, str, str, str, str]
+
+
+class _GeneratedModule:
+  """What a module's generator produced in a previous run."""
+
+  __slots__ = ["fingerprint", "children", "asm"]
+
+  def __init__(self, fingerprint: str, children: List[_Child], asm: str):
+    self.fingerprint = fingerprint
+    self.children = children
+    self.asm = asm
+
+
+class GenerationCache:
+  """Keeps the generated module ops from one run of a build script to the
+  next so that modules whose generators didn't change aren't regenerated. Set
+  as `System.GENERATION_CACHE` to use it.
+
+  A module's fingerprint covers its symbol (which includes its parameters),
+  its ports, and the source files of its generator, its class, and the
+  functions, classes and modules its generator refers to by name or captures.
+  Other values it refers to are covered by the source of the Python modules
+  which bind them under that name (so constants imported from another file
+  are tracked) and, if they have a stable representation, their value. If the
+  fingerprint matches the previous run, the modules it instantiates are
+  created (which regenerates them if they changed) and the module op is
+  parsed from the previous run's assembly rather than generated.
+
+  Only modules which instantiate module classes defined at the top level of a
+  Python module (so they can be found again after the script's modules are
+  reimported) and which don't use ESI services or design partitions are
+  kept."""
+
+  def __init__(self):
+    self._modules: Dict[str, _GeneratedModule] = {}
+    self._sources: Dict[str, bytes] = {}
+    # (name, id) -> (object, files of the modules binding it). Per run.
+    self._owners: Dict[Tuple[str, int], Tuple[object, Set[str]]] = {}
+    # The symbols of the modules reused and generated during the current run.
+    self.reused: List[str] = []
+    self.generated: List[str] = []
+
+  def start_run(self):
+    """Forget the file contents (which may have changed), the modules bound
+    values came from, and counts from the last run."""
+    self._sources.clear()
+    self._owners.clear()
+    self.reused = []
+    self.generated = []
+
+  def _source(self, file: Optional[str]) -> bytes:
+    if file is None:
+      return b""
+    if file not in self._sources:
+      try:
+        self._sources[file] = pathlib.Path(file).read_bytes()
+      except OSError:
+        self._sources[file] = b""
+    return self._sources[file]
+
+  @staticmethod
+  def _source_file(obj) -> Optional[str]:
+    if isinstance(obj, types.ModuleType):
+      return getattr(obj, "__file__", None)
+    try:
+      return inspect.getsourcefile(obj)
+    except TypeError:
+      return None
+
+  def _owner_files(self, name: str, obj) -> Set[str]:
+    """The source files of the Python modules which bind 'name' to 'obj'."""
+    key = (name, id(obj))
+    # Keep 'obj' alongside so its id can't be reused during the run.
+    cached = self._owners.get(key)
+    if cached is not None and cached[0] is obj:
+      return cached[1]
+    files = set()
+    for mod in list(sys.modules.values()):
+      mod_dict = getattr(mod, "__dict__", None)
+      if mod_dict is not None and mod_dict.get(name, _MISSING) is obj:
+        file = getattr(mod, "__file__", None)
+        if file is not None:
+          files.add(file)
+    self._owners[key] = (obj, files)
+    return files
+
+  @staticmethod
+  def _ports(builder) -> str:
+    return str(
+        (builder.inputs, builder.outputs, getattr(builder, "parameters", None)))
+
+  def _fingerprint(self, builder, symbol: str) -> Optional[str]:
+    """None if the module can't be reused."""
+    from .module import ModuleBuilder, ModuleLikeType
+    if type(builder) is not ModuleBuilder or len(builder.generators) != 1:
+      return None
+    func = list(builder.generators.values())[0].gen_func
+    files = {self._source_file(func), self._source_file(builder.modcls)}
+    values: List[str] = []
+
+    def add(name: str, obj, is_global: bool) -> bool:
+      # Instantiated modules are checked separately.
+      if isinstance(obj, ModuleLikeType):
+        return True
+      if (isinstance(obj, types.ModuleType) or inspect.isclass(obj) or
+          inspect.isfunction(obj)):
+        files.add(self._source_file(obj))
+        return True
+      value = _stable_repr(obj)
+      if value is not None:
+        values.append(f"{name}={value}")
+      owners = self._owner_files(name, obj)
+      files.update(owners)
+      # A global is always bound somewhere, but a captured local whose value
+      # can't be compared might differ with the same source.
+      return value is not None or is_global or len(owners) > 0
+
+    # The names the generator refers to (including in nested functions).
+    names: Set[str] = set()
+    codes = [func.__code__]
+    while len(codes) > 0:
+      code = codes.pop()
+      names.update(code.co_names)
+      codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+    for name in sorted(names):
+      if name in func.__globals__:
+        add(name, func.__globals__[name], True)
+    for name, cell in zip(func.__code__.co_freevars, func.__closure__ or []):
+      try:
+        contents = cell.cell_contents
+      except ValueError:
+        # Not bound yet.
+        continue
+      if not add(name, contents, False):
+        return None
+
+    h = hashlib.sha256()
+    h.update(symbol.encode())
+    h.update(self._ports(builder).encode())
+    for value in values:
+      h.update(value.encode())
+    for file in sorted(f for f in files if f is not None):
+      h.update(file.encode())
+      h.update(self._source(file))
+    return h.hexdigest()
+
+  def record(self, system, builder):
+    """Keep what 'builder' just generated in 'system'."""
+    from .circt import ir
+    from .circt.dialects import msft
+    from .module import ModuleBuilder
+    from .partition import DesignPartition
+    from .support import walk_operations
+
+    symbol = system._op_cache.get_pyproxy_symbol(builder)
+    if symbol is None:
+      return
+    self.generated.append(symbol)
+    self._modules.pop(symbol, None)
+    fingerprint = self._fingerprint(builder, symbol)
+    if fingerprint is None:
+      return
+
+    op = system._op_cache.get_circt_mod(builder)
+    scratch = ir.Module.create(ir.Location.unknown(system.mod.context))
+    children = []
+    for inner in walk_operations(op):
+      if (inner.operation.name.startswith("esi.") or
+          DesignPartition.AttributeName in inner.attributes):
+        return
+      if "moduleName" not in inner.attributes:
+        continue
+      child_sym = ir.FlatSymbolRefAttr(inner.attributes["moduleName"]).value
+      if any(c[0] == child_sym for c in children):
+        continue
+      child = system._op_cache.get_symbol_pyproxy(child_sym)
+      if not isinstance(child, ModuleBuilder):
+        return
+      cls = child.modcls
+      if _resolve(cls.__module__, cls.__qualname__) is not cls:
+        return
+      # The instance ops only verify against a declaration of the module.
+      decl = msft.MSFTModuleExternOp(child_sym,
+                                     child.inputs,
+                                     child.outputs,
+                                     parameters=[],
+                                     loc=child.loc,
+                                     ip=ir.InsertionPoint(scratch.body))
+      children.append((child_sym, cls.__module__, cls.__qualname__,
+                       self._ports(child), str(decl)))
+    self._modules[symbol] = _GeneratedModule(
+        fingerprint, children, op.operation.get_asm(enable_debug_info=True))
+
+  def reuse(self, system, builder, symbol: str):
+    """If 'builder' is unchanged since it was recorded, create the modules it
+    instantiates in 'system' and return its module op. Otherwise, None."""
+    from .circt import ir
+
+    generated = self._modules.get(symbol)
+    if (generated is None or
+        generated.fingerprint != self._fingerprint(builder, symbol)):
+      return None
+    for child_sym, module_name, qualname, ports, _ in generated.children:
+      child = getattr(_resolve(module_name, qualname), "_builder", None)
+      if child is None or self._ports(child) != ports:
+        return None
+      if system._op_cache.get_pyproxy_symbol(child) is None:
+        system._create_circt_mod(child)
+      if system._op_cache.get_pyproxy_symbol(child) != child_sym:
+        return None
+
+    asm = "\n".join([c[4] for c in generated.children] + [generated.asm])
+    parsed = ir.Module.parse(asm, system.mod.context)
+    op = [
+        o for o in parsed.body
+        if ir.StringAttr(o.attributes["sym_name"]).value == symbol
+    ][0]
+    system.body.append(op)
+    self.reused.append(symbol)
+    return op
+
+
+class _Watcher:
+  """Runs a PyCDE build script over and over in one process, rerunning it
+  whenever it (or one of the modules it imports from alongside it) changes.
+  Modules whose generators didn't change are reused from the last run rather
+  than regenerated (see `GenerationCache`)."""
+
+  def __init__(self, script: str, argv: List[str],
+               watch_dirs: Optional[List[str]]):
+    self.script = pathlib.Path(script).resolve()
+    self.argv = [str(self.script)] + list(argv)
+    if watch_dirs is None:
+      watch_dirs = [str(self.script.parent)]
+    self.watch_dirs = [pathlib.Path(d).resolve() for d in watch_dirs]
+    # The modules which were loaded before the first run. Never reloaded.
+    self.baseline_modules: Set[str] = set(sys.modules.keys())
+    # The user modules imported by the last run. Purged before each rerun.
+    self.user_modules: Set[str] = set()
+    self.mtimes: Dict[pathlib.Path, float] = {}
+    self.generation_cache = GenerationCache()
+
+  def _is_watched(self, path: pathlib.Path) -> bool:
+    return any(d == path.parent or d in path.parents for d in self.watch_dirs)
+
+  def _user_module_files(self) -> Dict[str, pathlib.Path]:
+    """The modules imported since startup which live in the watched
+    directories."""
+    files: Dict[str, pathlib.Path] = {}
+    for name, mod in list(sys.modules.items()):
+      if name in self.baseline_modules:
+        continue
+      file = getattr(mod, "__file__", None)
+      if file is None:
+        continue
+      path = pathlib.Path(file).resolve()
+      if self._is_watched(path):
+        files[name] = path
+    return files
+
+  def _snapshot(self) -> Dict[pathlib.Path, float]:
+    mtimes = {}
+    for path in [self.script] + list(set(self._user_module_files().values())):
+      try:
+        mtimes[path] = os.stat(path).st_mtime
+      except OSError:
+        mtimes[path] = 0.0
+    return mtimes
+
+  def changed(self) -> List[pathlib.Path]:
+    """The watched files which have changed since the last run."""
+    changed = []
+    for path, mtime in self.mtimes.items():
+      try:
+        new_mtime = os.stat(path).st_mtime
+      except OSError:
+        new_mtime = 0.0
+      if new_mtime != mtime:
+        changed.append(path)
+    return changed
+
+  def run(self) -> bool:
+    """Run the script once in this process. Returns False if it raised."""
+    from pycde import reset
+    from pycde.system import System
+
+    # Drop the user's modules (so they get re-imported with any changes) and
+    # everything PyCDE has accumulated from the last run.
+    for name in self.user_modules:
+      sys.modules.pop(name, None)
+    reset()
+
+    old_argv = sys.argv
+    old_path = list(sys.path)
+    old_emit_only_changed = System.EMIT_ONLY_CHANGED
+    old_generation_cache = System.GENERATION_CACHE
+    sys.argv = self.argv
+    # As when running the script directly, its directory comes first on the
+    # module search path.
+    sys.path.insert(0, str(self.script.parent))
+    System.EMIT_ONLY_CHANGED = True
+    System.GENERATION_CACHE = self.generation_cache
+    self.generation_cache.start_run()
+    start = time.perf_counter()
+    ok = True
+    try:
+      runpy.run_path(str(self.script), run_name="__main__")
+    except SystemExit as e:
+      ok = e.code in (None, 0)
+    except Exception:
+      traceback.print_exc()
+      ok = False
+    finally:
+      sys.argv = old_argv
+      sys.path[:] = old_path
+      System.EMIT_ONLY_CHANGED = old_emit_only_changed
+      System.GENERATION_CACHE = old_generation_cache
+      self.user_modules = set(self._user_module_files().keys())
+      self.mtimes = self._snapshot()
+
+    status = "done" if ok else "FAILED"
+    sys.stderr.write(f"[pycde watch] {self.script.name}: {status} in "
+                     f"{time.perf_counter() - start:.2f}s (generated "
+                     f"{len(self.generation_cache.generated)} modules, reused "
+                     f"{len(self.generation_cache.reused)})\n")
+    sys.stderr.flush()
+    return ok
+
+
+def watch(script: str,
+          argv: List[str] = [],
+          watch_dirs: Optional[List[str]] = None,
+          interval: float = 0.5,
+          once: bool = False) -> bool:
+  """Run the PyCDE build script 'script' (with 'argv' as its arguments) then
+  rerun it each time it or any module it imports from 'watch_dirs' (default:
+  the script's directory) changes. PyCDE, CIRCT, and the MLIR context stay
+  loaded between runs; the state PyCDE accumulates is dropped with `reset`.
+  Only the modules whose generators changed are regenerated.
+  Output files are only rewritten if their contents change so tools downstream
+  only see the modules which changed as being touched. Runs until interrupted
+  unless 'once' is set. Returns whether the last run succeeded."""
+
+  watcher = _Watcher(script, argv, watch_dirs)
+  ok = watcher.run()
+  if once:
+    return ok
+  try:
+    while True:
+      time.sleep(interval)
+      changed = watcher.changed()
+      if len(changed) == 0:
+        continue
+      sys.stderr.write("[pycde watch] changed: " +
+                       ", ".join(p.name for p in changed) + "\n")
+      ok = watcher.run()
+  except KeyboardInterrupt:
+    pass
+  return ok
@@ -0,0 +1,67 @@
+# RUN: %PYTHON% %s 2>&1 | FileCheck %s
+
+from pycde import (AppID, Clock, Input, Output, Module, System, generator,
+                   types)
+
+NUM_PES = 64
+
+
+class PE(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = ports.x.reg(ports.clk, appid=AppID("reg", 0))
+
+
+class Array(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    v = ports.x
+    for i in range(NUM_PES):
+      v = PE(clk=ports.clk, x=v, appid=AppID("pe", i)).y
+    ports.y = v
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Array(clk=ports.clk, x=ports.x).y
+
+
+s = System([Top], name="AppIDIndex")
+s.generate()
+top = s.get_instance(Top)
+
+# The PEs are found by looking through the 'Array' instance.
+pes = [top.pe[i] for i in range(NUM_PES)]
+assert all(pe.appid.index == i for i, pe in enumerate(pes))
+# CHECK: <instance: [Array, {{.+}}]> pe[63]
+print(pes[-1], pes[-1].appid)
+# CHECK: 64
+print(len(list(top.pe)))
+# CHECK: <instance: [Array, {{.+}}, {{.+}}]> reg[0]
+print(top.pe[5].reg[0], top.pe[5].reg[0].appid)
+
+try:
+  top.pe[NUM_PES]
+except IndexError as e:
+  # CHECK: pe[64] not found
+  print(e)
+
+# Instances are views of nodes in the hierarchy, so looking up the same instance
+# twice gives equal objects.
+array_inst = list(top.children.values())[0]
+assert top.pe[3] == array_inst.children[top.pe[3].name]
+assert top.pe[3].parent == array_inst
+assert len({top.pe[3], top.pe[3]}) == 1
@@ -0,0 +1,43 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Input, Output, Module, System, generator, types
+
+import sys
+import threading
+
+
+class Top(Module):
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = ports.x
+
+
+steps = []
+
+
+def count_lines(sys: System):
+  lines = (sys.hw_output_dir / "Top.sv").read_text().count("\n")
+  steps.append(("count_lines", lines > 0, threading.current_thread().name))
+
+
+def last_step(sys: System):
+  steps.append(("last_step", sys.passed, threading.current_thread().name))
+
+
+s = System([Top], name="Top", output_directory=sys.argv[1])
+s.add_packaging_step(count_lines, requires=["hw/Top.sv"])
+s.add_packaging_step(last_step)
+future = s.compile_async(package=True)
+# Generation is done before compile_async returns.
+assert len(s._generate_queue) == 0
+assert future.result() is s
+
+# CHECK: ('count_lines', True, 'Top_package
+# CHECK: ('last_step', True, 'Top_compile
+for step in sorted(steps):
+  print(step)
+assert (s.output_directory / "runtime").exists()
@@ -0,0 +1,91 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Input, Output, Module, System, generator, modparams, types
+
+import sys
+
+
+@modparams
+def Buf(width: int, tag: str):
+  # 'tag' doesn't affect the generated body.
+
+  class Buf(Module):
+    x = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      ports.y = ports.x
+
+  return Buf
+
+
+@modparams
+def Pair(tag: str):
+  # Once the Bufs are merged, the Pairs become identical as well.
+
+  class Pair(Module):
+    x = Input(types.i8)
+    y = Output(types.i8)
+
+    @generator
+    def build(ports):
+      ports.y = Buf(8, tag)(x=ports.x).y
+
+  return Pair
+
+
+class Inv(Module):
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = ~ports.x
+
+
+class Top(Module):
+  x = Input(types.i8)
+  a = Output(types.i8)
+  b = Output(types.i8)
+  c = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.a = Pair("a")(x=ports.x).y
+    ports.b = Pair("b")(x=ports.x).y
+    ports.c = Inv(x=ports.x).y
+
+
+s = System([Top], name="Dedup", output_directory=sys.argv[1], dedup=True)
+s.generate()
+
+
+def pair_module():
+  inst = s.get_instance(Top)["Pair_1"]
+  return s._op_cache.get_pyproxy_symbol(inst.tgt_mod)
+
+
+# Look the instance up before and after the hierarchy changes.
+# CHECK: before dedup: Pair_tagb
+print(f"before dedup: {pair_module()}")
+merged = s.dedup_modules()
+# CHECK: after dedup: Pair_taga
+print(f"after dedup: {pair_module()}")
+# CHECK: Buf_tagb_width8 -> Buf_taga_width8
+# CHECK: Pair_tagb -> Pair_taga
+for removed, survivor in sorted(merged.items()):
+  print(f"{removed} -> {survivor}")
+
+# CHECK-LABEL: msft.module @Top
+# CHECK: msft.instance {{.*}} @Pair_taga(
+# CHECK: msft.instance {{.*}} @Pair_taga(
+# CHECK: msft.instance {{.*}} @Inv(
+# CHECK-NOT: msft.module @Pair_tagb
+# CHECK-NOT: msft.module @Buf_tagb_width8
+s.print()
+
+s.compile()
+assert not (s.hw_output_dir / "Pair_tagb.sv").exists()
+assert (s.hw_output_dir / "Pair_taga.sv").exists()
@@ -0,0 +1,52 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Input, Output, Module, System, generator, types
+
+import json
+import sys
+
+
+def build(inc: int):
+
+  class Inc(Module):
+    x = Input(types.i8)
+    y = Output(types.i8)
+
+    @generator
+    def build(ports):
+      ports.y = ports.x ^ types.i8(inc)
+
+  class Top(Module):
+    x = Input(types.i8)
+    y = Output(types.i8)
+
+    @generator
+    def build(ports):
+      ports.y = Inc(x=ports.x).y
+
+  s = System([Top], name="Top", output_directory=sys.argv[1])
+  s.compile(only_changed=True)
+  manifest = json.loads((s.hw_output_dir / "manifest.json").read_text())
+  for mod in ["Inc", "Top"]:
+    file = manifest["modules"][mod]
+    print(mod, file, manifest["files"][file]["changed"])
+
+
+# CHECK-LABEL: first
+# CHECK: Inc Inc.sv True
+# CHECK: Top Top.sv True
+print("first")
+build(1)
+
+# CHECK-LABEL: unchanged
+# CHECK: Inc Inc.sv False
+# CHECK: Top Top.sv False
+print("unchanged")
+build(1)
+
+# CHECK-LABEL: inc_changed
+# CHECK: Inc Inc.sv True
+# CHECK: Top Top.sv False
+print("inc_changed")
+build(2)
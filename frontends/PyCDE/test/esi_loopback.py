@@ -0,0 +1,45 @@
+# RUN: %PYTHON% %s 2>&1 | FileCheck %s
+
+from pycde.esi_runtime_common import (IntType, Loopback, ReadPort,
+                                      ReadWritePort, StructType, VoidType,
+                                      WritePort)
+
+i8 = IntType(8, False)
+backend = Loopback()
+child = backend.get_child("top")
+
+rw = ReadWritePort(["echo"], child, "cosim", read_type=i8, write_type=i8)
+# CHECK: 5
+print(rw(5))
+rw.write(1)
+rw.write(2)
+# CHECK: 1 2 None
+print(rw.read(None), rw.read(None), rw.read(None))
+
+void = ReadWritePort(["void"],
+                     child,
+                     "cosim",
+                     read_type=VoidType(),
+                     write_type=VoidType())
+# CHECK: ()
+print(void())
+
+reader = ReadPort(["to_host"],
+                  child,
+                  "cosim",
+                  read_type=StructType([("a", i8)]))
+backend.inject(reader, {"a": 3})
+# CHECK: {'a': 3}
+print(reader.read())
+
+doubler = Loopback(responder=lambda path, msg: (path, msg * 2))
+rw = ReadWritePort(["dbl"], doubler, "cosim", read_type=i8, write_type=i8)
+# CHECK: ('.dbl', 8)
+print(rw(4))
+
+writer = WritePort(["out"], backend, "cosim", write_type=i8)
+try:
+  writer.write(256)
+except ValueError as e:
+  # CHECK: '256' cannot be converted to 'uint8'
+  print(e)
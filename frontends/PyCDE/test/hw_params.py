@@ -0,0 +1,86 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Input, Output, Module, System, generator, modparams, types
+
+import sys
+
+
+@modparams(hw_params=["coeff"])
+def Scale(width: int, coeff: int = 1):
+
+  class Scale(Module):
+    x = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      ports.y = ports.x ^ types.int(width)(coeff)
+
+  return Scale
+
+
+class Top(Module):
+  x = Input(types.i8)
+  a = Output(types.i8)
+  b = Output(types.i8)
+  c = Output(types.i4)
+  d = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.a = Scale(8, 3)(x=ports.x).y
+    ports.b = Scale(8, coeff=5)(x=ports.x).y
+    ports.c = Scale(4, 7)(x=ports.x[0:4]).y
+    # Instantiated through the module class, so 'coeff' is left at its default.
+    ports.d = Scale(8, 3).module(x=ports.x).y
+
+
+# Only one module per width.
+assert Scale(8, 3).module is Scale(8, 200).module
+assert Scale(8, 3).module is not Scale(4, 3).module
+
+s = System([Top], name="HWParams", output_directory=sys.argv[1])
+s.compile()
+
+# CHECK-LABEL: hw.module @Top
+# CHECK: hw.instance "Scale" {{.*}}@Scale_width8<{{.*}}coeff: i8 = 3>
+# CHECK: hw.instance "Scale_1" {{.*}}@Scale_width8<{{.*}}coeff: i8 = 5>
+# CHECK: hw.instance "Scale_2" {{.*}}@Scale_width4<{{.*}}coeff: i4 = 7>
+# CHECK: hw.instance "Scale_3" {{.*}}@Scale_width8<{{.*}}coeff: i8 = 1>
+# CHECK-LABEL: hw.module @Scale_width8<{{.*}}coeff: i8 = 1>
+# CHECK: [[COEFF:%.+]] = hw.param.value i8 = #hw.param.decl.ref<"coeff">
+# CHECK: comb.xor %x, [[COEFF]]
+# CHECK-LABEL: hw.module @Scale_width4<{{.*}}coeff: i4 = 1>
+s.print()
+
+
+@modparams(hw_params=["amount"])
+def Shift(width: int, amount: int):
+
+  class Shift(Module):
+    x = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      ports.y = ports.x ^ types.int(width)(amount)
+
+  return Shift
+
+
+class NoDefault(Module):
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Shift(8, 2).module(x=ports.x).y
+
+
+s = System([NoDefault], name="NoDefault", output_directory=sys.argv[1])
+try:
+  s.compile()
+except ValueError as e:
+  # CHECK: Instance 'Shift' of 'Shift_width8' in 'NoDefault' has no value for HW parameter 'amount', which has no default
+  print(e)
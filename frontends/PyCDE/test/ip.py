@@ -0,0 +1,72 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Clock, Input, Output, Module, System, generator, types
+from pycde.ip import export_ip, import_ip
+
+import sys
+
+
+class Inc(Module):
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = ports.x ^ types.i8(1)
+
+
+class Block(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Inc(x=ports.x).y.reg(ports.clk)
+
+
+ip = export_ip(Block, f"{sys.argv[1]}/block_ip")
+# CHECK: Block {{.*}}'hw/Block.sv'
+# CHECK-SAME: 'hw/Inc.sv'
+print(ip.name, ip.files)
+
+BlockIP = import_ip(f"{sys.argv[1]}/block_ip")
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = BlockIP(clk=ports.clk, x=ports.x).y
+
+
+s = System([Top], name="Top", output_directory=f"{sys.argv[1]}/top")
+s.compile()
+assert (s.hw_output_dir / "Block.sv").exists()
+assert (s.hw_output_dir / "Inc.sv").exists()
+# CHECK-LABEL: module Top
+# CHECK: Block Block
+print((s.hw_output_dir / "Top.sv").read_text())
+
+
+class Clash(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    # Emits an 'Inc.sv' of its own, as does the IP.
+    ports.y = BlockIP(clk=ports.clk, x=Inc(x=ports.x).y).y
+
+
+s = System([Clash], name="Clash", output_directory=f"{sys.argv[1]}/clash")
+try:
+  s.compile(only_changed=False)
+except ValueError as e:
+  # CHECK: Linked file '{{.+}}/block_ip/hw/Inc.sv' conflicts with emitted file 'Inc.sv'
+  print(e)
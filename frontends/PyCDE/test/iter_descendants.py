@@ -0,0 +1,64 @@
+# RUN: %PYTHON% %s 2>&1 | FileCheck %s
+
+from pycde import (Clock, Input, Output, Module, System, generator, modparams,
+                   types)
+from pycde.instance import ModuleInstance, RegInstance
+
+import sys
+
+DEPTH = 300
+
+
+@modparams
+def Level(depth: int):
+
+  class Level(Module):
+    clk = Clock()
+    x = Input(types.i8)
+    y = Output(types.i8)
+
+    @generator
+    def build(ports):
+      v = ports.x.reg(ports.clk, name="r")
+      if depth > 0:
+        v = Level(depth - 1)(clk=ports.clk, x=v, instance_name="l").y
+      ports.y = v
+
+  return Level
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Level(DEPTH - 1)(clk=ports.clk, x=ports.x, instance_name="l").y
+
+
+s = System([Top], name="IterDescendants")
+s.generate()
+top = s.get_instance(Top)
+
+# The traversal doesn't recurse, so it isn't limited by the stack depth.
+sys.setrecursionlimit(150)
+
+# CHECK: 600
+print(len(list(top.iter_descendants())))
+# CHECK: 300 300
+print(len(list(top.iter_descendants(kind=RegInstance))),
+      len(list(top.iter_descendants(kind="seq.compreg"))))
+# CHECK: ['l', 'l.r', 'l.l']
+print([".".join(i.path_names) for i in top.iter_descendants(max_depth=2)])
+# CHECK: ['l', 'l.l']
+print([
+    ".".join(i.path_names)
+    for i in top.iter_descendants(kind=ModuleInstance,
+                                  prune=lambda i: len(i.path_names) >= 2)
+])
+
+count = [0]
+top.walk(lambda i: count.__setitem__(0, count[0] + 1))
+# CHECK: 601
+print(count[0])
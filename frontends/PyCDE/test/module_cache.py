@@ -0,0 +1,58 @@
+# RUN: %PYTHON% %s 2>&1 | FileCheck %s
+
+from pycde import Input, Module, System, generator, modparams, types
+from pycde.module import configure_module_cache, module_cache
+
+
+@modparams
+def Passthrough(width):
+
+  class Passthrough(Module):
+    x = Input(types.int(width))
+
+    @generator
+    def build(ports):
+      pass
+
+  return Passthrough
+
+
+configure_module_cache(maxsize=2)
+p1 = Passthrough(1)
+assert Passthrough(1) is p1
+Passthrough(2)
+Passthrough(3)
+# The LRU entry (width=1) should have been evicted.
+assert Passthrough(1) is not p1
+# CHECK: <ModuleCache hits: 1 misses: 4 size: 2 maxsize: 2>
+print(module_cache())
+
+# Lists and tuples convert to the same attribute so they should hit.
+configure_module_cache(maxsize=None)
+Passthrough([1, 2])
+assert Passthrough((1, 2)) is Passthrough([1, 2])
+# But 'True' and '1' don't.
+assert Passthrough(True) is not Passthrough(1)
+
+configure_module_cache(scope="system")
+global_size = len(module_cache())
+s = System([p1])
+with s:
+  Passthrough(8)
+  Passthrough(8)
+  # CHECK: <ModuleCache hits: 1 misses: 1 size: 1 maxsize: None>
+  print(module_cache())
+assert len(module_cache()) == global_size
+
+# The size applies to the existing per-System caches as well.
+configure_module_cache(scope="system", maxsize=4)
+with s:
+  # CHECK: <ModuleCache hits: 1 misses: 1 size: 1 maxsize: 4>
+  print(module_cache())
+configure_module_cache(scope="system", maxsize=None)
+
+try:
+  configure_module_cache(scope="thread")
+except ValueError as e:
+  # CHECK: Module cache scope must be one of ['global', 'system', 'context'], not 'thread'
+  print(e)
@@ -0,0 +1,95 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+# RUN: FileCheck %s --input-file %t/hw/BulkAttrs.tcl --check-prefix=OUTPUT
+
+from pycde import (Clock, Input, Output, Module, System, generator, types)
+
+import sys
+
+
+class Leaf(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = ports.x.reg(ports.clk, name="r")
+
+
+class Cluster(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    v = ports.x
+    for i in range(4):
+      v = Leaf(clk=ports.clk, x=v, instance_name=f"leaf{i}").y
+    ports.y = v
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    v = ports.x
+    for i in range(2):
+      v = Cluster(clk=ports.clk, x=v, instance_name=f"cluster{i}").y
+    ports.y = v
+
+
+s = System([Top], name="BulkAttrs", output_directory=sys.argv[1])
+s.generate()
+top = s.get_instance(Top)
+
+# Instances, '/' separated paths, and name lists can be mixed.
+s.add_named_attributes([
+    (top["cluster0"]["leaf0"], "FOO", "ON"),
+    ("cluster0/leaf1", "FOO", "OFF", ["mem", "bank"]),
+    (["cluster1", "leaf3"], "BAR", "1"),
+    ("cluster1", "BAZ", "2"),
+])
+# A table of columns.
+top.add_named_attributes({
+    "path": [f"cluster1/leaf{i}/r" for i in range(4)],
+    "name": ["KEEP"] * 4,
+    "value": ["TRUE"] * 4,
+})
+# Paths are relative to the instance.
+top["cluster0"].add_named_attributes([("leaf2", "FOO", "X")])
+# Missing subpaths in a table (NaN, as in a DataFrame) are ignored.
+top.add_named_attributes({
+    "path": ["cluster0/leaf3"],
+    "name": ["FOO"],
+    "value": ["Y"],
+    "subpath": [float("nan")],
+})
+
+try:
+  s.add_named_attributes([("cluster0/leaf0", "FOO")])
+except ValueError as e:
+  # CHECK: Named attribute rows must be (target, name, value) or (target, name, value, subpath), not ('cluster0/leaf0', 'FOO')
+  print(e)
+
+try:
+  s.add_named_attributes([("cluster2/leaf0", "FOO", "ON")])
+except KeyError as e:
+  # CHECK: No instance 'cluster2'
+  print(e)
+
+s.compile()
+
+# OUTPUT-LABEL: proc BulkAttrs_config { parent }
+# OUTPUT-DAG: set_instance_assignment -name FOO ON -to $parent|cluster0|leaf0
+# OUTPUT-DAG: set_instance_assignment -name FOO OFF -to $parent|cluster0|leaf1|mem|bank
+# OUTPUT-DAG: set_instance_assignment -name FOO X -to $parent|cluster0|leaf2
+# OUTPUT-DAG: set_instance_assignment -name FOO Y -to $parent|cluster0|leaf3
+# OUTPUT-DAG: set_instance_assignment -name BAR 1 -to $parent|cluster1|leaf3
+# OUTPUT-DAG: set_instance_assignment -name BAZ 2 -to $parent|cluster1
+# OUTPUT-DAG: set_instance_assignment -name KEEP TRUE -to $parent|cluster1|leaf0|r
+# OUTPUT-DAG: set_instance_assignment -name KEEP TRUE -to $parent|cluster1|leaf3|r
@@ -0,0 +1,61 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Input, Output, Module, System, generator, types
+
+import sys
+
+
+def mix(a, b, c):
+  # A tree of nine comb ops per lane.
+  x = (a ^ b) & c
+  y = (b & c) ^ (a | c)
+  return ~((x | y) ^ (a & b))
+
+
+class Lanes(Module):
+  a = Input(types.i8)
+  b = Input(types.i8)
+  c = Input(types.i8)
+  x = Output(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.x = mix(ports.a, ports.b, ports.c)
+    ports.y = mix(ports.c, ports.a, ports.b)
+
+
+class Top(Module):
+  a = Input(types.i8)
+  b = Input(types.i8)
+  c = Input(types.i8)
+  x = Output(types.i8)
+  y = Output(types.i8)
+  z = Output(types.i8)
+
+  @generator
+  def build(ports):
+    lanes = Lanes(a=ports.a, b=ports.b, c=ports.c)
+    ports.x = lanes.x
+    ports.y = lanes.y
+    ports.z = mix(ports.b, ports.c, ports.a)
+
+
+s = System([Top], name="Outline", output_directory=sys.argv[1])
+s.generate()
+# CHECK: Outlined_0 3
+for sym, count in s.outline_repeated(min_ops=8).items():
+  print(sym, count)
+
+# CHECK-LABEL: msft.module @Lanes
+# CHECK: msft.instance @Outlined_0 @Outlined_0(%a, %b, %c)
+# CHECK: msft.instance @Outlined_0_1 @Outlined_0(%c, %a, %b)
+# CHECK-NOT: comb.xor
+# CHECK: msft.output
+# CHECK-LABEL: msft.module @Outlined_0
+# CHECK-COUNT-9: comb.
+# CHECK: msft.output
+s.print()
+
+s.compile()
@@ -0,0 +1,67 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Clock, Input, Output, Module, System, generator, types
+from pycde.common import PortError
+
+import json
+import sys
+
+
+class Inc(Module):
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = (ports.x ^ types.i8(1)).as_uint() + 1
+
+
+class Lane(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    inc = Inc(x=ports.x, partition=compute)
+    ports.y = inc.y.as_bits(8).reg(ports.clk)
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Lane(clk=ports.clk, x=ports.x).y
+
+
+s = System([Top], name="Partition", output_directory=sys.argv[1])
+compute = s.create_partition("compute")
+s.compile()
+
+# CHECK-LABEL: hw.module @compute
+# CHECK: hw.instance "{{.*}}Inc" @Inc
+# CHECK-LABEL: hw.module @Top
+# CHECK: hw.instance "compute" @compute
+s.print()
+
+manifest = json.loads((s.output_directory / "partitions" / "compute" /
+                       "partition.json").read_text())
+# CHECK: compute ['Inc', 'compute'] True
+print(manifest["top"], manifest["modules"], manifest["changed"])
+assert "hw/Inc.sv" in manifest["files"]
+assert (s.output_directory / "partitions" / "compute" / "hw" /
+        "compute.sv").exists()
+
+# The name would be shadowed by the partition argument.
+try:
+
+  class Partitioned(Module):
+    partition = Input(types.i1)
+
+except PortError as e:
+  # CHECK: 'partition' is reserved and cannot be used as an input port name
+  print(e)
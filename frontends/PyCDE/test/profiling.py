@@ -0,0 +1,52 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Clock, Input, Output, Module, System, generator, types
+from pycde.constructs import Wire
+from pycde.profiling import GeneratorProfiler
+
+import sys
+
+
+class Adder(Module):
+  a = Input(types.i8)
+  b = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = (ports.a.as_uint() + ports.b.as_uint()).as_bits(8)
+
+
+class Acc(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    acc = Wire(types.i8)
+    sum = Adder(a=ports.x, b=acc).y
+    acc.assign(sum.reg(ports.clk))
+    ports.y = acc
+
+
+s = System([Acc], name="Profiling", output_directory=sys.argv[1])
+with GeneratorProfiler() as prof:
+  s.generate()
+
+records = {r.name: r for r in prof.records}
+assert records["Acc"].backedges >= 1
+assert records["Adder"].ops["hwarith.add"] == 1
+assert all(r.wall_time > 0 for r in prof.records)
+
+# CHECK: generator{{ +}}kind{{ +}}wall ms{{ +}}ops{{ +}}backedges{{ +}}allocs{{ +}}loc ms{{ +}}type ms{{ +}}top ops
+# CHECK-DAG: Acc{{ +}}module
+# CHECK-DAG: Adder{{ +}}module
+print(prof.table(sort_by="num_ops"))
+
+folded = f"{sys.argv[1]}/generators.folded"
+prof.write_collapsed(folded)
+# CHECK-DAG: generate;Acc {{[0-9]+}}
+# CHECK-DAG: generate;Acc;get_user_loc {{[0-9]+}}
+print(open(folded).read())
@@ -0,0 +1,106 @@
+# RUN: %PYTHON% %s 2>&1 | FileCheck %s
+
+from pycde import (AppID, Clock, Input, Output, Module, System, generator,
+                   types)
+
+
+class PE(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    a = ports.x.reg(ports.clk, name="reg_a")
+    ports.y = a.reg(ports.clk, name="reg_b")
+
+
+class Mid(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    v = ports.x
+    for i in range(10):
+      v = PE(clk=ports.clk,
+             x=v,
+             instance_name=f"pe_inst{i}",
+             appid=AppID("pe", i)).y
+    ports.y = v
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    a = Mid(clk=ports.clk, x=ports.x, instance_name="mid0").y
+    ports.y = Mid(clk=ports.clk, x=a, instance_name="mid1").y
+
+
+s = System([Top], name="QueryTest")
+s.generate()
+
+
+def show(insts):
+  print(len(insts), [".".join(i.path_names) for i in insts])
+
+
+# CHECK: 2 ['mid0', 'mid1']
+show(s.query("*"))
+# CHECK: 6 ['mid0.pe_inst3', 'mid0.pe_inst4', 'mid0.pe_inst5', 'mid1.pe_inst3', 'mid1.pe_inst4', 'mid1.pe_inst5']
+show(s.query("mid*/pe[3..5]"))
+# CHECK: 2 ['mid1.pe_inst7.reg_a', 'mid1.pe_inst7.reg_b']
+show(s.query("mid1/pe[7]/reg_*"))
+# CHECK: 4 ['mid0.pe_inst0.reg_b', 'mid0.pe_inst9.reg_b', 'mid1.pe_inst0.reg_b', 'mid1.pe_inst9.reg_b']
+show(s.query("*/pe_inst[!1-8]/reg_b"))
+
+# '**' matches any number of levels.
+# CHECK: 40
+print(len(s.query("**", kind="seq.compreg")))
+# CHECK: 20
+print(len(s.query("**", module=PE)))
+# CHECK: 2 ['mid0', 'mid1']
+show(s.query("**", module="Mid"))
+# CHECK: 2 ['mid0.pe_inst2', 'mid1.pe_inst2']
+show(s.query("**", appid=AppID("pe", 2), module=PE))
+
+# Queries relative to an instance.
+mid1 = s.get_instance(Top)["mid1"]
+# CHECK: 2 ['mid1.pe_inst1.reg_a', 'mid1.pe_inst1.reg_b']
+show(mid1.query("pe[1]/*"))
+
+# Results are regular instances.
+reg = s.query("mid0/pe[0]/reg_a")[0]
+# CHECK: <instance: [mid0, pe_inst0, reg_a]>
+print(reg)
+
+# CHECK: 0 []
+show(s.query("mid2/**"))
+
+# AppID segments resolve like the 'inst.pe[i]' accessors: Top has none for
+# 'pe' since both Mids expose it.
+# CHECK: 0 []
+show(s.query("pe[0]"))
+
+
+class Wrap(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Mid(clk=ports.clk, x=ports.x, instance_name="mid").y
+
+
+wrapped = System([Wrap], name="QueryWrap")
+wrapped.generate()
+# But they do look through a single child instance which exposes the name.
+# CHECK: 2 ['mid.pe_inst3', 'mid.pe_inst4']
+show(wrapped.query("pe[3..4]"))
+assert wrapped.query("pe[3]") == [wrapped.get_instance(Wrap).pe[3]]
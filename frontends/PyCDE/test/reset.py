@@ -0,0 +1,49 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+import pycde
+from pycde import Input, Module, System, generator, modparams, types
+from pycde.module import module_cache
+
+import sys
+
+
+@modparams
+def Passthrough(width):
+
+  class Passthrough(Module):
+    x = Input(types.int(width))
+
+    @generator
+    def build(ports):
+      pass
+
+  return Passthrough
+
+
+def build(idx: int):
+  types.int(8, "byte")
+  s = System([Passthrough(8)],
+             name="Reset",
+             output_directory=f"{sys.argv[1]}/{idx}")
+  region_ref = str(s.create_physical_region().get_ref()[1])
+  s.compile()
+  return region_ref
+
+
+# CHECK: @region_0
+# CHECK: <ModuleCache hits: 0 misses: 1 size: 1 maxsize: None>
+print(build(0))
+print(module_cache())
+
+# Without a reset, the second build gets a fresh region name.
+# CHECK: @region_1
+print(build(1))
+
+# After one, it builds exactly like the first.
+pycde.reset()
+assert len(types.registered_aliases) == 0
+# CHECK: @region_0
+# CHECK: <ModuleCache hits: 0 misses: 1 size: 1 maxsize: None>
+print(build(2))
+print(module_cache())
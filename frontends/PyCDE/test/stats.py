@@ -0,0 +1,51 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Clock, Input, Output, Module, System, generator, types
+from pycde.stats import format_stats
+
+import sys
+
+
+class Inc(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = (ports.x ^ types.i8(1)).reg(ports.clk)
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    a = Inc(clk=ports.clk, x=ports.x).y
+    ports.y = Inc(clk=ports.clk, x=a).y
+
+
+s = System([Top],
+           name="Stats",
+           output_directory=sys.argv[1],
+           collect_stats=True)
+s.generate()
+stats = s.stats()
+assert stats["Top"].instances == 2
+assert stats["Inc"].register_bits == 8
+assert stats["Inc"].ops["comb.xor"] == 1
+assert stats["Inc"].ops_by_dialect["seq"] == 1
+# CHECK: module{{ +}}ops{{ +}}instances{{ +}}reg bits{{ +}}values{{ +}}asm bytes
+# CHECK-NEXT: Inc
+# CHECK-NEXT: Top{{ +}}3{{ +}}2{{ +}}0
+print(format_stats(stats))
+
+s.compile()
+# CHECK: generate
+# CHECK: lower-seq-to-sv
+for phase in s.stats_history:
+  print(phase.phase, phase.total.num_ops)
+assert s.stats_history[-1].modules["Inc"].register_bits == 8
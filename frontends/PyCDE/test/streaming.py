@@ -0,0 +1,65 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Clock, Input, Output, Module, generator, types
+from pycde.ip import compile_streaming
+
+import sys
+
+
+class Inc(Module):
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = ports.x ^ types.i8(1)
+
+
+class Lane(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Inc(x=ports.x).y.reg(ports.clk)
+
+
+class Lanes(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Lane(clk=ports.clk, x=Lane(clk=ports.clk, x=ports.x).y).y
+
+
+class Top(Module):
+  clk = Clock()
+  x = Input(types.i8)
+  y = Output(types.i8)
+  z = Output(types.i8)
+
+  @generator
+  def build(ports):
+    ports.y = Lanes(clk=ports.clk, x=ports.x).y
+    ports.z = Inc(x=ports.x).y
+
+
+s = compile_streaming(Top, [Lane, Lanes], sys.argv[1], name="Streaming")
+lane_sv = s.output_directory / "partitions" / "Lane" / "hw" / "Lane.sv"
+# The subtree System's own output file must not have overwritten the module.
+assert "module Lane" in lane_sv.read_text()
+
+# Everything but the top was compiled by the subtree Systems.
+# CHECK-LABEL: hw.module @Top
+# CHECK: hw.instance "Lanes" @Lanes
+# CHECK: hw.instance "Inc" @Inc
+# CHECK-DAG: hw.module.extern @Lanes
+# CHECK-DAG: hw.module.extern @Inc
+s.print()
+
+for f in ["Top.sv", "Lanes.sv", "Lane.sv", "Inc.sv"]:
+  assert (s.hw_output_dir / f).exists(), f
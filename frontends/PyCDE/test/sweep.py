@@ -0,0 +1,51 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Clock, Input, Output, Module, generator, sweep, types
+
+import sys
+
+
+def build_pipe(width: int, depth: int):
+
+  class Pipe(Module):
+    clk = Clock()
+    x = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      v = ports.x
+      for _ in range(depth):
+        v = v.reg(ports.clk)
+      ports.y = v
+
+  return Pipe
+
+
+if __name__ == "__main__":
+  grid = {"width": [4, 8], "depth": [1, 3]}
+  results = sweep(build_pipe,
+                  grid,
+                  workers=2,
+                  output_directory=sys.argv[1],
+                  package=False)
+
+  # CHECK: 0 {'width': 4, 'depth': 1} None 1
+  # CHECK: 1 {'width': 4, 'depth': 3} None 3
+  # CHECK: 2 {'width': 8, 'depth': 1} None 1
+  # CHECK: 3 {'width': 8, 'depth': 3} None 3
+  for r in results:
+    print(r.index, r.params, r.error, r.op_counts["seq.compreg"])
+
+  # CHECK: index params generate_time passes_time
+  print(" ".join(str(results).split("\n")[0].split()))
+
+  # CHECK: failures: 1
+  points = [{"width": 4, "depth": 1}, {"width": 4}]
+  results = sweep(build_pipe,
+                  points,
+                  workers=0,
+                  output_directory=sys.argv[1],
+                  package=False)
+  print(f"failures: {len([r for r in results if r.error is not None])}")
@@ -0,0 +1,79 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde import Input, Output, Module, System, generator, modparams, types
+from pycde.circt import ir
+
+import gc
+import sys
+import threading
+
+
+@modparams
+def Adder(width):
+
+  class Adder(Module):
+    a = Input(types.int(width))
+    b = Input(types.int(width))
+    y = Output(types.int(width))
+
+    @generator
+    def build(ports):
+      ports.y = (ports.a.as_uint() + ports.b.as_uint()).as_bits(width)
+
+  return Adder
+
+
+results = {}
+
+
+def build(width: int):
+  # Each thread builds its System in its own context. The module classes must
+  # be created in that context as well.
+  ctxt = System.create_context()
+  with ctxt, ir.Location.unknown():
+    top = Adder(width)
+  s = System([top],
+             name=f"Adder{width}",
+             output_directory=f"{sys.argv[1]}/{width}",
+             context=ctxt)
+  s.compile()
+  results[width] = s
+
+
+threads = [threading.Thread(target=build, args=(w,)) for w in [4, 8, 16]]
+for t in threads:
+  t.start()
+for t in threads:
+  t.join()
+
+# CHECK-LABEL: hw.module @Adder_width4(%a: i4, %b: i4) -> (y: i4)
+# CHECK-LABEL: hw.module @Adder_width8(%a: i8, %b: i8) -> (y: i8)
+# CHECK-LABEL: hw.module @Adder_width16(%a: i16, %b: i16) -> (y: i16)
+contexts = set()
+for width in sorted(results.keys()):
+  s = results[width]
+  contexts.add(s.context)
+  s.print()
+assert len(contexts) == 3
+
+# A context's module cache is kept until the last System using it goes away.
+ctxt = System.create_context()
+with ctxt, ir.Location.unknown():
+  top = Adder(32)
+first = System([top],
+               name="First",
+               output_directory=f"{sys.argv[1]}/first",
+               context=ctxt)
+second = System([top],
+                name="Second",
+                output_directory=f"{sys.argv[1]}/second",
+                context=ctxt)
+del first
+gc.collect()
+with ctxt, ir.Location.unknown():
+  assert Adder(32) is top
+del second
+gc.collect()
+with ctxt, ir.Location.unknown():
+  assert Adder(32) is not top
@@ -57,3 +57,60 @@ system.generate()
 # CHECK:   %0 = comb.and %a, %b : i1
 # CHECK:   hw.output %0 : i1
 system.print()
+
+# -----
+
+import contextlib
+import io
+
+from pycde import Input, Output, System, generator, Module, types
+
+lazy_mlir = """
+hw.module @add(%a: i1, %b: i1) -> (out: i1) {
+  %0 = comb.add %a, %b : i1
+  hw.output %0 : i1
+}
+
+hw.module @add_wrapper(%a: i1, %b: i1) -> (out: i1) {
+  %0 = hw.instance "add" @add(a: %a: i1, b: %b: i1) -> (out: i1)
+  hw.output %0 : i1
+}
+
+hw.module @unused(%a: i1, %b: i1) -> (out: i1) {
+  %0 = comb.xor %a, %b : i1
+  hw.output %0 : i1
+}
+"""
+
+
+class LazyTop(Module):
+  a = Input(types.i1)
+  b = Input(types.i1)
+  out = Output(types.i1)
+
+  @generator
+  def generate(ports):
+    ports.out = lazy_imports["add_wrapper"](a=ports.a, b=ports.b).out
+
+
+system = System([LazyTop])
+lazy_imports = system.import_mlir(lazy_mlir, lazy=True)
+# CHECK: lazy imports: ['add', 'add_wrapper', 'unused']
+print(f"lazy imports: {sorted(lazy_imports)}")
+# The pending 'unused' op is still indexed, but that shouldn't trip the live op
+# check.
+# CHECK: generate stderr: ''
+stderr = io.StringIO()
+with contextlib.redirect_stderr(stderr):
+  system.generate()
+print(f"generate stderr: {stderr.getvalue()!r}")
+
+# CHECK-LABEL: msft.module @LazyTop {} (%a: i1, %b: i1) -> (out: i1)
+# CHECK:         hw.instance "add_wrapper" @add_wrapper
+# CHECK-DAG:   hw.module @add_wrapper(%a: i1, %b: i1) -> (out: i1)
+# CHECK-DAG:   hw.module @add(%a: i1, %b: i1) -> (out: i1)
+# CHECK-NOT:   hw.module @unused
+system.print()
+system.run_passes()
+# CHECK: 'unused' in lazy imports: False
+print(f"'unused' in lazy imports: {'unused' in lazy_imports}")
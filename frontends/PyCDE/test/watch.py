@@ -0,0 +1,92 @@
+# RUN: rm -rf %t
+# RUN: %PYTHON% %s %t 2>&1 | FileCheck %s
+
+from pycde.watch import _Watcher
+
+import os
+import pathlib
+import sys
+import textwrap
+
+work_dir = pathlib.Path(sys.argv[1])
+work_dir.mkdir(parents=True)
+out_dir = work_dir / "out"
+
+(work_dir / "blocks.py").write_text(
+    textwrap.dedent("""
+    from pycde import Input, Output, Module, generator, types
+
+    class Inc(Module):
+      x = Input(types.i8)
+      y = Output(types.i8)
+
+      @generator
+      def build(ports):
+        ports.y = (ports.x.as_uint() + 1).as_bits(8)
+    """))
+(work_dir / "consts.py").write_text(
+    textwrap.dedent("""
+    import types
+    CFG = types.SimpleNamespace(step=3)
+    """))
+script = work_dir / "build.py"
+script.write_text(
+    textwrap.dedent("""
+    from pycde import Input, Output, Module, System, generator, types
+    import sys
+    from blocks import Inc
+    from consts import CFG
+
+    class Top(Module):
+      x = Input(types.i8)
+      y = Output(types.i8)
+
+      @generator
+      def build(ports):
+        ports.y = (Inc(x=ports.x).y.as_uint() + CFG.step).as_bits(8)
+
+    s = System([Top], name="Top", output_directory=sys.argv[1])
+    s.compile()
+    """))
+
+
+def mtimes():
+  hw_dir = out_dir / "hw"
+  return {p.name: os.stat(p).st_mtime_ns for p in hw_dir.glob("*.sv")}
+
+
+watcher = _Watcher(str(script), [str(out_dir)], None)
+# CHECK: [pycde watch] build.py: done
+assert watcher.run()
+before = mtimes()
+assert "blocks" in watcher.user_modules
+assert sorted(watcher.generation_cache.generated) == ["Inc", "Top"]
+
+# Change only the imported module. It must be picked up and regenerated, but
+# the Top module must be reused and its output not rewritten.
+blocks = work_dir / "blocks.py"
+blocks.write_text(blocks.read_text().replace("+ 1", "+ 2"))
+os.utime(blocks, ns=(0, 0))
+assert watcher.changed() == [blocks.resolve()]
+# CHECK: [pycde watch] build.py: done
+assert watcher.run()
+assert watcher.generation_cache.generated == ["Inc"]
+assert watcher.generation_cache.reused == ["Top"]
+after = mtimes()
+assert after["Top.sv"] == before["Top.sv"]
+assert after["Inc.sv"] != before["Inc.sv"]
+# CHECK: 'h2
+print((out_dir / "hw" / "Inc.sv").read_text())
+
+# Change a value Top imports from another file. Top must be regenerated and
+# Inc reused.
+consts = work_dir / "consts.py"
+consts.write_text(consts.read_text().replace("step=3", "step=4"))
+os.utime(consts, ns=(0, 0))
+assert watcher.changed() == [consts.resolve()]
+# CHECK: [pycde watch] build.py: done
+assert watcher.run()
+assert watcher.generation_cache.generated == ["Top"]
+assert watcher.generation_cache.reused == ["Inc"]
+# CHECK: 'h4
+print((out_dir / "hw" / "Top.sv").read_text())
@@ -99,6 +99,8 @@ PYBIND11_MODULE(_circt, m) {
 
   m.def("export_split_verilog", [](MlirModule mod, std::string directory) {
     auto cDirectory = mlirStringRefCreateFromCString(directory.c_str());
+    // Only touches the filesystem and the IR, so let other Python threads run.
+    py::gil_scoped_release release;
     mlirExportSplitVerilog(mod, cDirectory);
   });
 